@@ -1,33 +1,51 @@
 import csv
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from django.contrib import admin
-from django.http import HttpResponse, HttpResponseRedirect
-from django.urls import path
+from django.core.exceptions import FieldDoesNotExist, PermissionDenied
+from django.db.models.query import QuerySet
+from django.http import HttpResponseRedirect, StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import format_html
 from import_export import resources
 from import_export.admin import ImportExportMixin
 
+from predictions.jobs import enqueue_job, requeue_jobs
 from predictions.logic import (
-    calculate_game_predictions,
+    bump_object_versions,
     calculate_prediction,
-    calculate_tournament_predictions,
+    fill_raw_predictions_picks,
+    get_not_null_performances_for_game,
+    get_deleted_standings_keys,
     get_predictors_comments,
-    process_raw_predictions,
-    reset_game_predictions,
+    get_ranked_performances,
+    get_standings_keys,
+    mark_game_performances_changed,
+    mark_stale_predictions,
     reset_prediction,
-    reset_tournament_predictions,
+    sync_prediction_scopes,
+    update_deleted_standings,
+    update_standings,
 )
 from predictions.models import (
+    Alias,
     Game,
+    Job,
     Performance,
+    PointsScheme,
     Prediction,
     PredictionEvent,
     Predictor,
     RawPrediction,
+    RequestSample,
     Season,
     Team,
     Tournament,
+    VkProfile,
 )
+from predictions.request_stats import get_request_stats
 
 
 admin.site.site_header = "Административный сайт SOVABET"
@@ -35,26 +53,81 @@ admin.site.site_title = "SOVABET"
 admin.site.index_title = "Администрирование SOVABET"
 
 
+class Echo:
+    """File-like object that returns what is written to it,
+    so that csv.writer can feed a streaming response.
+    """
+
+    def write(self, value):
+        return value
+
+
+def message_job_enqueued(modeladmin, request, job):
+    url = reverse("admin:predictions_job_change", args=(job.pk, ))
+    modeladmin.message_user(
+        request,
+        format_html(
+            'Задача «{}» поставлена в очередь. <a href="{}">Статус</a>',
+            job.get_kind_display(),
+            url,
+        ),
+    )
+
+
 # Admin actions
 
 @admin.action(description="Сделать выбранные записи активными")
 def make_active(modeladmin, request, queryset):
     queryset.update(is_active=True)
+    if queryset.model is Prediction:
+        update_standings(*get_standings_keys(queryset))
+    if queryset.model in (Season, Tournament, Game):
+        bump_object_versions(queryset)
     modeladmin.message_user(request, 'Выбранные записи сделаны активными')
 
 
 @admin.action(description="Сделать выбранные записи неактивными")
 def make_inactive(modeladmin, request, queryset):
     queryset.update(is_active=False)
+    if queryset.model is Prediction:
+        update_standings(*get_standings_keys(queryset))
+    if queryset.model in (Season, Tournament, Game):
+        bump_object_versions(queryset)
     modeladmin.message_user(request, 'Выбранные записи сделаны неактивными')
 
 
 @admin.action(description="Обработать выбранные сырые прогнозы")
 def process_selected_raw_predictions(modeladmin, request, queryset):
-    successful, total = process_raw_predictions(queryset)
-    modeladmin.message_user(
-        request, f"Создано прогнозов: {successful} из {total}"
+    raw_prediction_ids = [
+        str(pk) for pk in queryset.values_list("pk", flat=True)
+    ]
+    job = enqueue_job(
+        Job.Kind.PROCESS_RAW_PREDICTIONS,
+        payload={"raw_prediction_ids": raw_prediction_ids},
     )
+    message_job_enqueued(modeladmin, request, job)
+
+
+@admin.action(description="Пересчитать изменённые прогнозы выбранных игр")
+def calculate_selected_stale_games(modeladmin, request, queryset):
+    game_ids = [str(pk) for pk in queryset.values_list("pk", flat=True)]
+    job = enqueue_job(Job.Kind.CALCULATE_STALE, payload={"game_ids": game_ids})
+    message_job_enqueued(modeladmin, request, job)
+
+
+@admin.action(description="Распознать призёров в тексте выбранных сырых прогнозов")
+def fill_selected_raw_predictions_picks(modeladmin, request, queryset):
+    count = fill_raw_predictions_picks(queryset)
+    modeladmin.message_user(request, f"Распознано сырых прогнозов: {count}")
+
+
+@admin.action(
+    description="Повторно поставить в очередь выбранные задачи с ошибкой"
+    " или зависшие"
+)
+def requeue_selected_jobs(modeladmin, request, queryset):
+    count = requeue_jobs(queryset)
+    modeladmin.message_user(request, f"Поставлено в очередь задач: {count}")
 
 
 @admin.action(
@@ -62,15 +135,15 @@ def process_selected_raw_predictions(modeladmin, request, queryset):
 )
 def create_csv_from_vk(modeladmin, request, queryset):
     filename = f"comments_from_vk_{int(datetime.utcnow().timestamp())}.csv"
-    response = HttpResponse(content_type="text/csv")
+    writer = csv.writer(Echo())
+    # Comments are fetched before the response is returned: the response
+    # is iterated in the event loop under ASGI, where queries and VK
+    # requests can't be made
+    rows = get_predictors_comments(queryset.order_by("started_at"))
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in rows), content_type="text/csv"
+    )
     response["Content-Disposition"] = f"attachment; filename={filename}"
-
-    output = get_predictors_comments(queryset.order_by("started_at"))
-
-    writer = csv.writer(response)
-    for line in output:
-        writer.writerow(line)
-
     return response
 
 
@@ -90,6 +163,60 @@ class ActiveFilterAdminMixin:
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
+class VersionedAdminMixin:
+    """Bumps versions of the saved or deleted object and of its old
+    and new parents, which invalidates their cached pages. When the
+    object is renamed or deleted, the pages that show its name
+    are invalidated too.
+
+    Versions are bumped once, after the object and its inlines
+    are saved, so saving the object doesn't overwrite them.
+    """
+    parent_fields = ("tournament", "season")
+
+    def get_old_parents(self, form) -> list:
+        """Returns unsaved instances of the parents the object left."""
+        parents = []
+        for name in self.parent_fields:
+            old_id = form.initial.get(name)
+            if name in form.changed_data and old_id:
+                model = form.instance._meta.get_field(name).related_model
+                parents.append(model(pk=old_id))
+        return parents
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        obj = form.instance
+        bump_object_versions(
+            [obj, *self.get_old_parents(form)],
+            [obj] if change and "name" in form.changed_data else [],
+        )
+
+    def get_deleted_predictions(self, objects) -> QuerySet[Prediction]:
+        """Returns predictions deleted in cascade with the objects."""
+        try:
+            field = Prediction._meta.get_field(self.model._meta.model_name)
+        except FieldDoesNotExist:
+            return Prediction.objects.none()
+        return Prediction.objects.filter(**{f"{field.name}__in": objects})
+
+    def delete_model(self, request, obj):
+        bump_object_versions([obj], [obj])
+        standings_keys = get_deleted_standings_keys(
+            self.get_deleted_predictions([obj])
+        )
+        super().delete_model(request, obj)
+        update_deleted_standings(*standings_keys)
+
+    def delete_queryset(self, request, queryset):
+        bump_object_versions(queryset, queryset)
+        standings_keys = get_deleted_standings_keys(
+            self.get_deleted_predictions(queryset)
+        )
+        super().delete_queryset(request, queryset)
+        update_deleted_standings(*standings_keys)
+
+
 # Model resources
 
 class BaseAbstractResource(resources.ModelResource):
@@ -106,6 +233,10 @@ class TournamentResource(BaseAbstractResource):
         model = Tournament
         fields = ("id", "name", "info", "season")
 
+    def after_save_instance(self, instance, using_transactions, dry_run):
+        if not dry_run:
+            sync_prediction_scopes(instance.games.values_list("pk", flat=True))
+
 
 class TeamResource(BaseAbstractResource):
 
@@ -120,6 +251,10 @@ class GameResource(BaseAbstractResource):
         model = Game
         fields = ("id", "name", "info", "tournament", "vk_post_id")
 
+    def after_save_instance(self, instance, using_transactions, dry_run):
+        if not dry_run:
+            sync_prediction_scopes([instance.pk])
+
 
 class PredictorResource(BaseAbstractResource):
 
@@ -162,6 +297,7 @@ class RawPredictionResource(BaseAbstractResource):
 
     class Meta:
         model = RawPrediction
+        exclude = ("prediction", )
 
 
 # Admin models
@@ -179,7 +315,7 @@ class BaseAbstractAdmin(ActiveFilterAdminMixin, admin.ModelAdmin):
         abstract = True
 
 
-class StartedAtAdmin(BaseAbstractAdmin):
+class StartedAtAdmin(VersionedAdminMixin, BaseAbstractAdmin):
     list_display = ("__str__", "started_at", "id", "is_active")
     list_display_links = ("__str__", "started_at", "id")
     fields = (
@@ -202,15 +338,58 @@ class SeasonAdmin(StartedAtAdmin):
     pass
 
 
+@admin.register(PointsScheme)
+class PointsSchemeAdmin(BaseAbstractAdmin):
+    list_display = (
+        "__str__",
+        "winner",
+        "runner_up",
+        "third_place",
+        "awarded",
+        "id",
+        "is_active",
+    )
+    fields = (
+        "id",
+        "name",
+        "info",
+        "winner",
+        "runner_up",
+        "third_place",
+        "awarded",
+        "is_active",
+        "created_at",
+        "updated_at",
+    )
+    list_editable = ()
+    actions = ()
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and form.changed_data:
+            # Standings show the points of the scheme
+            bump_object_versions(obj.tournaments.all())
+            count = mark_stale_predictions(
+                Prediction.objects.filter(tournament__points_scheme=obj)
+            )
+            if count:
+                self.message_user(
+                    request, f"Прогнозов требует пересчёта: {count}"
+                )
+
+
 @admin.register(Tournament)
 class TournamentAdmin(ImportExportMixin, StartedAtAdmin):
-    list_display = ("__str__", "started_at", "id", "season", "is_active")
+    list_display = (
+        "__str__", "started_at", "id", "season", "points_scheme", "is_active"
+    )
     search_fields = ("id", "name", "info", "season__name", "season__info")
     fields = (
         "id",
         "name",
         "info",
         "season",
+        "points_scheme",
         "started_at",
         "is_active",
         "created_at",
@@ -218,28 +397,57 @@ class TournamentAdmin(ImportExportMixin, StartedAtAdmin):
     )
     active_filter = {
         "season": Season,
+        "points_scheme": PointsScheme,
     }
     resource_class = TournamentResource
     change_form_template = "predictions/tournament_changeform.html"
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and "season" in form.changed_data:
+            sync_prediction_scopes(obj.games.values_list("pk", flat=True))
+        if change and "points_scheme" in form.changed_data:
+            count = mark_stale_predictions(
+                Prediction.objects.filter(tournament=obj)
+            )
+            if count:
+                self.message_user(
+                    request, f"Прогнозов требует пересчёта: {count}"
+                )
+
     def response_change(self, request, obj):
         if "_calculate" in request.POST:
-            calculate_tournament_predictions(obj)
-            self.message_user(
-                request, "Результаты прогнозов на игры турнира рассчитаны."
-            )
+            job = enqueue_job(Job.Kind.CALCULATE_TOURNAMENT, obj.pk)
+            message_job_enqueued(self, request, job)
             return HttpResponseRedirect(".")
         if "_reset" in request.POST:
-            reset_tournament_predictions(obj)
-            self.message_user(
-                request, "Результаты прогнозов на игры турнира сброшены."
-            )
+            job = enqueue_job(Job.Kind.RESET_TOURNAMENT, obj.pk)
+            message_job_enqueued(self, request, job)
             return HttpResponseRedirect(".")
         return super().response_change(request, obj)
 
 
+class AliasInline(admin.TabularInline):
+    model = Alias
+    fields = ("name", "is_active")
+    extra = 0
+
+
+class TeamAliasInline(AliasInline):
+    fk_name = "team"
+
+
+class GameAliasInline(AliasInline):
+    fk_name = "game"
+
+
+class PredictorAliasInline(AliasInline):
+    fk_name = "predictor"
+
+
 @admin.register(Team)
-class TeamAdmin(ImportExportMixin, BaseAbstractAdmin):
+class TeamAdmin(ImportExportMixin, VersionedAdminMixin, BaseAbstractAdmin):
+    inlines = (TeamAliasInline, )
     resource_class = TeamResource
 
 
@@ -262,38 +470,71 @@ class GameAdmin(ImportExportMixin, StartedAtAdmin):
         "name",
         "info",
         "vk_post_id",
+        "vk_last_comment_id",
+        "vk_last_comment_at",
         "tournament",
         "started_at",
         "is_active",
+        "is_stale",
+        "created_at",
+        "updated_at",
+    )
+    readonly_fields = (
+        "id",
+        "vk_last_comment_id",
+        "vk_last_comment_at",
+        "is_stale",
         "created_at",
         "updated_at",
     )
+    list_filter = ("is_stale", )
     active_filter = {
         "tournament": Tournament,
     }
-    inlines = (PerformanceInLine, )
+    inlines = (PerformanceInLine, GameAliasInline)
     resource_class = GameResource
     change_form_template = "predictions/game_changeform.html"
-    actions = (make_active, make_inactive, create_csv_from_vk)
+    actions = (
+        make_active,
+        make_inactive,
+        create_csv_from_vk,
+        calculate_selected_stale_games,
+    )
 
-    def response_change(self, request, obj):
-        if "_calculate" in request.POST:
-            calculate_game_predictions(obj)
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and "tournament" in form.changed_data:
+            sync_prediction_scopes([obj.pk])
+
+    def save_related(self, request, form, formsets, change):
+        if not change:
+            return super().save_related(request, form, formsets, change)
+        ranked_performances = get_ranked_performances(
+            get_not_null_performances_for_game(form.instance)
+        )
+        super().save_related(request, form, formsets, change)
+        count = mark_game_performances_changed(
+            form.instance, ranked_performances
+        )
+        if count:
             self.message_user(
-                request, "Результаты прогнозов на игру рассчитаны."
+                request, f"Прогнозов требует пересчёта: {count}"
             )
+
+    def response_change(self, request, obj):
+        if "_calculate" in request.POST:
+            job = enqueue_job(Job.Kind.CALCULATE_GAME, obj.pk)
+            message_job_enqueued(self, request, job)
             return HttpResponseRedirect(".")
         if "_reset" in request.POST:
-            reset_game_predictions(obj)
-            self.message_user(
-                request, "Результаты прогнозов на игру сброшены."
-            )
+            job = enqueue_job(Job.Kind.RESET_GAME, obj.pk)
+            message_job_enqueued(self, request, job)
             return HttpResponseRedirect(".")
         return super().response_change(request, obj)
 
 
 @admin.register(Predictor)
-class PredictorAdmin(ImportExportMixin, BaseAbstractAdmin):
+class PredictorAdmin(ImportExportMixin, VersionedAdminMixin, BaseAbstractAdmin):
     list_display = ("__str__", "id", "vk_id", "is_active")
     search_fields = ("id", "name", "info", "vk_id")
     fields = (
@@ -305,6 +546,7 @@ class PredictorAdmin(ImportExportMixin, BaseAbstractAdmin):
         "created_at",
         "updated_at",
     )
+    inlines = (PredictorAliasInline, )
     resource_class = PredictorResource
 
 
@@ -329,6 +571,7 @@ class PredictionAdmin(ActiveFilterAdminMixin, admin.ModelAdmin):
         "third_places",
         "prize_winners",
         "is_active",
+        "is_stale",
         "created_at",
         "updated_at",
     )
@@ -338,9 +581,11 @@ class PredictionAdmin(ActiveFilterAdminMixin, admin.ModelAdmin):
         "runners_up",
         "third_places",
         "prize_winners",
+        "is_stale",
         "created_at",
         "updated_at",
     )
+    list_filter = ("is_stale", )
     active_filter = {
         "predictor": Predictor,
         "game": Game,
@@ -350,6 +595,32 @@ class PredictionAdmin(ActiveFilterAdminMixin, admin.ModelAdmin):
     actions = (make_active, make_inactive)
     change_form_template = "predictions/prediction_changeform.html"
 
+    def save_model(self, request, obj, form, change):
+        game_ids, predictor_ids = get_standings_keys(
+            Prediction.objects.filter(pk=obj.pk)
+        )
+        super().save_model(request, obj, form, change)
+        game_ids.add(obj.game_id)
+        predictor_ids.add(obj.predictor_id)
+        update_standings(game_ids, predictor_ids)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if change and (
+            "game" in form.changed_data
+            or any(formset.has_changed() for formset in formsets)
+        ):
+            mark_stale_predictions(Prediction.objects.filter(pk=form.instance.pk))
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        update_standings([obj.game_id], [obj.predictor_id])
+
+    def delete_queryset(self, request, queryset):
+        game_ids, predictor_ids = get_standings_keys(queryset)
+        super().delete_queryset(request, queryset)
+        update_standings(game_ids, predictor_ids)
+
     def response_change(self, request, obj):
         if "_calculate" in request.POST:
             calculate_prediction(obj)
@@ -400,6 +671,9 @@ class RawPredictionAdmin(
         ("Информация о прогнозисте", {
             "fields": ("name", "vk_id")
         }),
+        ("Комментарий VK", {
+            "fields": ("vk_post_id", "vk_comment_id")
+        }),
         ("Информация о прогнозе", {
             "fields": (
                 "timestamp",
@@ -409,13 +683,26 @@ class RawPredictionAdmin(
                 "runner_up",
                 "third_place",
                 "note",
+                "prediction",
             )
         }),
     )
-    readonly_fields = ("id", "created_at", "updated_at")
+    readonly_fields = (
+        "id",
+        "created_at",
+        "updated_at",
+        "vk_post_id",
+        "vk_comment_id",
+        "prediction",
+    )
     ordering = ("-created_at", )
     resource_class = RawPredictionResource
-    actions = (make_active, make_inactive, process_selected_raw_predictions)
+    actions = (
+        make_active,
+        make_inactive,
+        fill_selected_raw_predictions_picks,
+        process_selected_raw_predictions,
+    )
     # change_list_template = "predictions/rawpredictions_changelist.html"
 
     def get_urls(self):
@@ -426,8 +713,143 @@ class RawPredictionAdmin(
         return extra_urls + urls
 
     def process_raw_predictions(self, request):
-        successful, total = process_raw_predictions()
-        self.message_user(
-            request, f"Создано прогнозов: {successful} из {total}"
-        )
+        job = enqueue_job(Job.Kind.PROCESS_RAW_PREDICTIONS)
+        message_job_enqueued(self, request, job)
         return HttpResponseRedirect("../")
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        "__str__",
+        "kind",
+        "object_id",
+        "status",
+        "progress_display",
+        "created_at",
+        "finished_at",
+    )
+    list_filter = ("status", "kind")
+    search_fields = ("id", "object_id", "message")
+    fields = (
+        "id",
+        "kind",
+        "object_id",
+        "payload",
+        "status",
+        "progress",
+        "total",
+        "message",
+        "created_at",
+        "updated_at",
+        "started_at",
+        "finished_at",
+    )
+    readonly_fields = fields
+    ordering = ("-created_at", )
+    actions = (requeue_selected_jobs, )
+
+    @admin.display(description="прогресс")
+    def progress_display(self, obj):
+        if not obj.total:
+            return "—"
+        return f"{obj.progress} из {obj.total}"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Alias)
+class AliasAdmin(ActiveFilterAdminMixin, admin.ModelAdmin):
+    list_display = ("name", "team", "game", "predictor", "is_active")
+    list_editable = ("is_active", )
+    search_fields = ("name", "team__name", "game__name", "predictor__name")
+    fields = ("name", "team", "game", "predictor", "is_active")
+    active_filter = {
+        "team": Team,
+        "game": Game,
+        "predictor": Predictor,
+    }
+    actions = (make_active, make_inactive)
+
+
+@admin.register(VkProfile)
+class VkProfileAdmin(admin.ModelAdmin):
+    list_display = ("vk_id", "name", "fetched_at")
+    search_fields = ("vk_id", "name")
+    readonly_fields = ("fetched_at", )
+    ordering = ("name", )
+
+
+@admin.register(RequestSample)
+class RequestSampleAdmin(admin.ModelAdmin):
+    list_display = (
+        "view_name",
+        "method",
+        "status_code",
+        "duration_display",
+        "queries",
+        "sql_duration_display",
+        "created_at",
+    )
+    list_filter = ("method", "status_code", "view_name")
+    search_fields = ("view_name", )
+    readonly_fields = (
+        "view_name",
+        "method",
+        "status_code",
+        "duration",
+        "queries",
+        "sql_duration",
+        "slow_queries",
+        "created_at",
+    )
+    ordering = ("-created_at", )
+    change_list_template = "predictions/requestsample_changelist.html"
+
+    @admin.display(description="время, мс", ordering="duration")
+    def duration_display(self, obj):
+        return f"{obj.duration:.1f}"
+
+    @admin.display(description="время SQL, мс", ordering="sql_duration")
+    def sql_duration_display(self, obj):
+        return f"{obj.sql_duration:.1f}"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        urls = super().get_urls()
+        extra_urls = [
+            path(
+                "report/",
+                self.admin_site.admin_view(self.report_view),
+                name="predictions_requestsample_report",
+            ),
+        ]
+        return extra_urls + urls
+
+    def report_view(self, request):
+        """Shows latency, query count and SQL time percentiles by view."""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        try:
+            hours = max(int(request.GET.get("hours", 24)), 1)
+        except ValueError:
+            hours = 24
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Статистика запросов по представлениям",
+            "hours": hours,
+            "stats": get_request_stats(timezone.now() - timedelta(hours=hours)),
+        }
+        return TemplateResponse(
+            request, "predictions/requestsample_report.html", context
+        )
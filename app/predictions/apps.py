@@ -5,3 +5,12 @@ class PredictionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'predictions'
     verbose_name = 'Прогнозы'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from predictions.request_stats import install_query_recorder
+        from sovabet.settings import REQUEST_STATS_ENABLED
+
+        if REQUEST_STATS_ENABLED:
+            connection_created.connect(install_query_recorder)
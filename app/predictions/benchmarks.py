@@ -0,0 +1,297 @@
+"""Benchmarks of scoring, raw prediction processing, standings and pages.
+
+Each benchmark runs in a savepoint which is rolled back afterwards,
+so every repeat sees the same data and the database is left as it was.
+"""
+
+import json
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable
+from urllib.error import HTTPError, URLError
+from urllib.request import urlopen
+
+from django.db import connection, transaction
+from django.db.models.aggregates import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from predictions.logic import (
+    calculate_game_predictions,
+    calculate_tournament_predictions,
+    get_ranked_standings_for_object,
+    get_standings_for_object,
+    process_raw_predictions,
+)
+from predictions.models import Game, Season, Tournament
+from predictions.request_stats import get_percentile
+
+
+DUMMY_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+}
+LOCMEM_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "benchmarks",
+    },
+}
+
+
+TIME_NOISE = 0.005
+
+
+class QueryCounter:
+    """Counts executed queries. Unlike connection.queries it is not
+    reset by the test client at the start of a request.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    seconds: float
+    queries: int
+    peak_memory: int
+
+
+def measure(name: str, func: Callable[[], object], repeat: int) -> BenchmarkResult:
+    """Runs func repeat times and returns the best wall time,
+    the number of queries of the last run and the peak memory
+    of a separate traced run.
+    """
+    seconds = None
+    for _ in range(repeat):
+        queries = QueryCounter()
+        with transaction.atomic(), connection.execute_wrapper(queries):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+    with transaction.atomic():
+        tracemalloc.start()
+        try:
+            func()
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        transaction.set_rollback(True)
+
+    return BenchmarkResult(name, seconds, queries.count, peak_memory)
+
+
+def get_biggest(model, count_field: str):
+    return model.objects\
+        .annotate(count=Count(count_field))\
+        .order_by("-count")\
+        .first()
+
+
+def get_page_paths() -> list[str]:
+    """Returns paths of the home page and the pages of the biggest
+    season, tournament and game.
+    """
+    paths = [reverse("predictions:home")]
+    for model in (Season, Tournament, Game):
+        obj = get_biggest(model, "predictions")
+        if obj:
+            paths.append(obj.get_absolute_url())
+    return paths
+
+
+def get_benchmarks() -> dict[str, Callable[[], object]]:
+    """Returns benchmarks by name, run against the biggest season,
+    tournament and game of the database.
+    """
+    season = get_biggest(Season, "predictions")
+    tournament = get_biggest(Tournament, "predictions")
+    game = get_biggest(Game, "predictions")
+    if not (season and tournament and game):
+        return {}
+
+    client = Client()
+    benchmarks = {
+        "calculate_game_predictions":
+            lambda: calculate_game_predictions(game),
+        "calculate_tournament_predictions":
+            lambda: calculate_tournament_predictions(tournament),
+        "process_raw_predictions": process_raw_predictions,
+    }
+    for obj in (season, tournament, game):
+        model_name = obj._meta.model_name
+        # Aggregated from predictions, as standings are rebuilt
+        benchmarks[f"standings_{model_name}"] = \
+            lambda obj=obj: list(get_standings_for_object(obj))
+        # Read from the Standing table, as the pages do
+        benchmarks[f"ranked_standings_{model_name}"] = \
+            lambda obj=obj: list(get_ranked_standings_for_object(obj))
+
+    for obj in (season, tournament, game):
+        model_name = obj._meta.model_name
+        url = reverse(
+            f"predictions:{model_name}_detail", kwargs={"pk": obj.pk}
+        )
+        benchmarks[f"view_{model_name}"] = \
+            lambda url=url: client.get(url)
+    return benchmarks
+
+
+def run_benchmarks(
+    repeat: int = 3,
+    names: list[str] | None = None,
+    callback: Callable[[BenchmarkResult], None] | None = None,
+) -> list[BenchmarkResult]:
+    """Runs the benchmarks and returns their results.
+
+    Pages are rendered with the dummy cache backend, so they are built
+    from scratch every time. Cached pages are measured separately
+    with an in-memory cache as view_*_cached.
+    """
+    results = []
+    with override_settings(ALLOWED_HOSTS=["testserver"]):
+        benchmarks = get_benchmarks()
+        for name, func in benchmarks.items():
+            if names and name not in names:
+                continue
+            with override_settings(CACHES=DUMMY_CACHES):
+                result = measure(name, func, repeat)
+            results.append(result)
+            if callback:
+                callback(result)
+
+        for name, func in benchmarks.items():
+            if not name.startswith("view_"):
+                continue
+            name = f"{name}_cached"
+            if names and name not in names:
+                continue
+            with override_settings(CACHES=LOCMEM_CACHES):
+                func()
+                result = measure(name, func, repeat)
+            results.append(result)
+            if callback:
+                callback(result)
+    return results
+
+
+def load_baseline(path: str | Path) -> dict[str, BenchmarkResult]:
+    with open(path, encoding="utf-8") as file:
+        data = json.load(file)
+    return {
+        name: BenchmarkResult(name=name, **values)
+        for name, values in data.items()
+    }
+
+
+def save_baseline(path: str | Path, results: list[BenchmarkResult]) -> None:
+    data = {}
+    for result in results:
+        values = asdict(result)
+        del values["name"]
+        data[result.name] = values
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(data, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def find_regressions(
+    results: list[BenchmarkResult],
+    baseline: dict[str, BenchmarkResult],
+    tolerance: float = 0.2,
+) -> list[str]:
+    """Returns descriptions of results worse than the baseline.
+
+    Time and memory may grow within the tolerance, time also within
+    a few milliseconds of noise. The number of queries may not grow.
+    """
+    regressions = []
+    for result in results:
+        base = baseline.get(result.name)
+        if base is None:
+            continue
+        if result.seconds > base.seconds * (1 + tolerance) + TIME_NOISE:
+            regressions.append(
+                f"{result.name}: время {base.seconds:.3f} → {result.seconds:.3f} с"
+            )
+        if result.queries > base.queries:
+            regressions.append(
+                f"{result.name}: запросов {base.queries} → {result.queries}"
+            )
+        if result.peak_memory > base.peak_memory * (1 + tolerance):
+            regressions.append(
+                f"{result.name}: память {base.peak_memory} → {result.peak_memory} Б"
+            )
+    return regressions
+
+
+@dataclass
+class LoadResult:
+    name: str
+    requests: int
+    errors: int
+    seconds: float
+    latencies: list[float]
+
+    @property
+    def requests_per_second(self) -> float:
+        return self.requests / self.seconds if self.seconds else 0
+
+    def get_latency(self, percent: float) -> float:
+        return get_percentile(sorted(self.latencies), percent)
+
+
+def run_http_load(
+    name: str,
+    base_url: str,
+    paths: list[str],
+    requests: int,
+    concurrency: int,
+    timeout: float = 30,
+) -> LoadResult:
+    """Requests the paths of a running server in turn from concurrent
+    clients and returns the throughput and the latencies in ms.
+    """
+    lock = threading.Lock()
+    counter = iter(range(requests))
+    latencies = []
+    errors = 0
+
+    def client():
+        nonlocal errors
+        while True:
+            with lock:
+                number = next(counter, None)
+            if number is None:
+                return
+            url = base_url.rstrip("/") + paths[number % len(paths)]
+            started = time.perf_counter()
+            try:
+                with urlopen(url, timeout=timeout) as response:
+                    response.read()
+                failed = False
+            except (HTTPError, URLError, OSError):
+                failed = True
+            latency = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(latency)
+                errors += failed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(client)
+    seconds = time.perf_counter() - started
+    return LoadResult(name, len(latencies), errors, seconds, latencies)
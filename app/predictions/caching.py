@@ -0,0 +1,102 @@
+"""Cache keys of public pages and standings fragments.
+
+Keys include the version of the object, which is bumped whenever
+scoring or activation changes data under it, so a changed object
+never hits a stale entry.
+"""
+
+from datetime import datetime
+from typing import Any, Iterable
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models.aggregates import Count, Max
+from django.http import HttpResponse
+
+from predictions.models import Game, Season, Tournament
+from predictions.scoring import ScoringPoints
+from sovabet.settings import PAGE_CACHE_TIMEOUT
+
+
+def get_object_cache_key(prefix: str, object: Season | Tournament | Game) -> str:
+    return (
+        f"predictions:{prefix}:{object._meta.model_name}"
+        f":{object.pk}:{object.version}"
+    )
+
+
+def get_page_cache_key(object: Season | Tournament | Game) -> str:
+    return get_object_cache_key("page", object)
+
+
+def get_standings_cache_key(
+    object: Season | Tournament | Game,
+    points: Iterable[tuple[ScoringPoints, list[str]]],
+) -> str:
+    """Returns the key of the standings fragment, which also changes
+    with the points schemes described under the standings.
+    """
+    schemes = "_".join(
+        "-".join(f"{value:g}" for value in scheme_points)
+        for scheme_points, _ in points
+    )
+    return f"{get_object_cache_key('standings', object)}:{schemes}"
+
+
+def get_home_cache_key() -> str:
+    """Returns the key of the home page, which changes with any
+    tournament or season of the list.
+
+    The key is built from the latest times of changes, which only
+    grow: a sum of versions could repeat after a tournament is deleted
+    and another one is created.
+    """
+    values = Tournament.objects.aggregate(
+        count=Count("pk"),
+        tournaments_changed_at=Max("changed_at"),
+        tournaments_updated_at=Max("updated_at"),
+        seasons_changed_at=Max("season__changed_at"),
+        seasons_updated_at=Max("season__updated_at"),
+    )
+    count = values.pop("count")
+    times = ":".join(
+        f"{value.timestamp():f}" if value else "" for value in values.values()
+    )
+    return f"predictions:page:home:{count}:{times}"
+
+
+def get_cached_page(key: str) -> HttpResponse | None:
+    content = cache.get(key)
+    if content is None:
+        return None
+    return HttpResponse(content)
+
+
+def cache_page(key: str, response: HttpResponse) -> HttpResponse:
+    """Renders the response if needed and caches its content."""
+    if hasattr(response, "render"):
+        response.render()
+    if response.status_code == 200:
+        cache.set(key, response.content, PAGE_CACHE_TIMEOUT)
+    return response
+
+
+def get_object_validators(
+    model: type[Season | Tournament | Game], pk: Any
+) -> tuple[str, datetime] | None:
+    """Returns the ETag and the last modification time of the object's
+    page without loading the object. Returns None if there is no object.
+    """
+    try:
+        values = model.objects\
+            .filter(pk=pk)\
+            .values_list("version", "changed_at", "updated_at")\
+            .first()
+    except ValidationError:
+        return None
+    if values is None:
+        return None
+    version, changed_at, updated_at = values
+    etag = f'"{model._meta.model_name}-{pk}-{version}"'
+    last_modified = max(filter(None, (changed_at, updated_at)))
+    return etag, last_modified
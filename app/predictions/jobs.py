@@ -0,0 +1,188 @@
+"""Database-backed queue of background jobs."""
+
+import traceback
+from datetime import timedelta
+from typing import Any, Callable
+
+from django.db import transaction
+from django.db.models.query import QuerySet
+from django.db.models.query_utils import Q
+from django.utils import timezone
+
+from predictions.logic import (
+    calculate_game_predictions,
+    calculate_stale_predictions,
+    calculate_tournament_predictions,
+    process_raw_predictions,
+    reset_game_predictions,
+    reset_tournament_predictions,
+)
+from predictions.models import Game, Job, RawPrediction, Tournament
+from sovabet.settings import JOB_TIMEOUT_MINUTES
+
+
+# Job handlers
+
+def get_progress_callback(job: Job) -> Callable[[int, int], None]:
+    def set_progress(progress: int, total: int) -> None:
+        Job.objects.filter(pk=job.pk).update(
+            progress=progress, total=total, updated_at=timezone.now()
+        )
+    return set_progress
+
+
+def calculate_tournament(job: Job) -> str:
+    tournament = Tournament.objects.get(pk=job.object_id)
+    calculate_tournament_predictions(
+        tournament, progress=get_progress_callback(job)
+    )
+    return "Результаты прогнозов на игры турнира рассчитаны."
+
+
+def reset_tournament(job: Job) -> str:
+    tournament = Tournament.objects.get(pk=job.object_id)
+    _, count = reset_tournament_predictions(
+        tournament, progress=get_progress_callback(job)
+    )
+    return f"Результаты прогнозов на игры турнира сброшены. Прогнозов: {count}"
+
+
+def calculate_game(job: Job) -> str:
+    game = Game.objects.get(pk=job.object_id)
+    calculate_game_predictions(game)
+    get_progress_callback(job)(1, 1)
+    return "Результаты прогнозов на игру рассчитаны."
+
+
+def reset_game(job: Job) -> str:
+    game = Game.objects.get(pk=job.object_id)
+    _, count = reset_game_predictions(game)
+    get_progress_callback(job)(1, 1)
+    return f"Результаты прогнозов на игру сброшены. Прогнозов: {count}"
+
+
+def process_raw(job: Job) -> str:
+    raw_prediction_ids = job.payload.get("raw_prediction_ids")
+    if raw_prediction_ids is None:
+        raw_predictions = None
+    else:
+        raw_predictions = RawPrediction.objects.filter(
+            pk__in=raw_prediction_ids
+        )
+    successful, total = process_raw_predictions(
+        raw_predictions, progress=get_progress_callback(job)
+    )
+    return f"Создано прогнозов: {successful} из {total}"
+
+
+def calculate_stale(job: Job) -> str:
+    game_ids = job.payload.get("game_ids")
+    games = None if game_ids is None else Game.objects.filter(pk__in=game_ids)
+    count = calculate_stale_predictions(
+        games, progress=get_progress_callback(job)
+    )
+    return f"Пересчитано изменённых прогнозов: {count}"
+
+
+JOB_HANDLERS = {
+    Job.Kind.CALCULATE_TOURNAMENT: calculate_tournament,
+    Job.Kind.RESET_TOURNAMENT: reset_tournament,
+    Job.Kind.CALCULATE_GAME: calculate_game,
+    Job.Kind.RESET_GAME: reset_game,
+    Job.Kind.PROCESS_RAW_PREDICTIONS: process_raw,
+    Job.Kind.CALCULATE_STALE: calculate_stale,
+}
+
+
+# Queue
+
+def enqueue_job(
+    kind: Job.Kind, object_id: Any = "", payload: dict | None = None
+) -> Job:
+    """Puts a job into the queue.
+
+    If the same job is already waiting in the queue, returns it instead.
+    """
+    payload = payload or {}
+    job = Job.objects.filter(
+        kind=kind,
+        object_id=str(object_id),
+        payload=payload,
+        status=Job.Status.PENDING,
+    ).first()
+    if job is None:
+        job = Job.objects.create(
+            kind=kind, object_id=str(object_id), payload=payload
+        )
+    return job
+
+
+def get_abandoned_jobs_filter() -> Q:
+    """Returns a filter of running jobs left by a crashed worker:
+    started and last updated more than JOB_TIMEOUT_MINUTES ago.
+
+    Running jobs update their progress, so a long job that is still
+    making progress is not abandoned.
+    """
+    timeout = timezone.now() - timedelta(minutes=JOB_TIMEOUT_MINUTES)
+    return Q(
+        status=Job.Status.RUNNING,
+        started_at__lt=timeout,
+        updated_at__lt=timeout,
+    )
+
+
+def claim_job() -> Job | None:
+    """Takes the oldest pending or abandoned job and marks it as running.
+
+    Concurrent workers skip the jobs locked by each other.
+    """
+    with transaction.atomic():
+        job = Job.objects\
+            .select_for_update(skip_locked=True)\
+            .filter(Q(status=Job.Status.PENDING) | get_abandoned_jobs_filter())\
+            .order_by("created_at")\
+            .first()
+        if job is None:
+            return None
+        job.status = Job.Status.RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=["status", "started_at", "updated_at"])
+    return job
+
+
+def run_job(job: Job) -> None:
+    """Runs the job and saves its status and message."""
+    handler = JOB_HANDLERS[job.kind]
+    try:
+        message = handler(job)
+    except Exception:
+        job.status = Job.Status.FAILED
+        job.message = traceback.format_exc()
+    else:
+        job.status = Job.Status.DONE
+        job.message = message
+    job.finished_at = timezone.now()
+    job.save(
+        update_fields=["status", "message", "finished_at", "updated_at"]
+    )
+
+
+def requeue_jobs(jobs: QuerySet[Job]) -> int:
+    """Puts the failed and abandoned jobs back into the queue.
+
+    Jobs that are running now or are done are left as they are.
+    Returns the number of requeued jobs.
+    """
+    jobs = jobs.filter(
+        Q(status=Job.Status.FAILED) | get_abandoned_jobs_filter()
+    )
+    return jobs.update(
+        status=Job.Status.PENDING,
+        progress=0,
+        total=0,
+        message="",
+        started_at=None,
+        finished_at=None,
+        updated_at=timezone.now(),
+    )
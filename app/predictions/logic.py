@@ -2,15 +2,17 @@
 
 
 import uuid
-from collections import namedtuple
-from datetime import datetime
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
 from enum import Enum
-from typing import Any
+from typing import Any, Callable, Iterable, Iterator
 
-from django.core.exceptions import MultipleObjectsReturned, ObjectDoesNotExist
+import numpy as np
+from django.db import IntegrityError, transaction
 from django.db.models.aggregates import Count, Sum
+from django.db.models.expressions import F
 from django.db.models.query import QuerySet
-from django.db.models.query_utils import Q
+from django.utils import timezone
 from django.utils.timezone import make_aware
 
 from predictions.models import (
@@ -22,32 +24,67 @@ from predictions.models import (
     RawPrediction,
     Result,
     Season,
+    Standing,
     Team,
     Tournament,
+    VkProfile,
 )
-from predictions.vk_api import get_vk_api, get_vk_comments
+from predictions.parsing import (
+    fill_raw_prediction_picks,
+    get_team_indexes,
+    parse_picks,
+)
+from predictions.resolver import NameResolver
+from predictions.scoring import (
+    DEFAULT_POINTS,
+    NO_TEAM,
+    ScoringPoints,
+    score_events,
+)
+from predictions.vk_api import get_posts_vk_comments, get_vk_users
+from sovabet.settings import VK_PROFILE_TTL_DAYS
 
 
 # Helper classes
 
 class Points(Enum):
-    WINNER_MATCHED = 4
-    RUNNER_UP_MATCHED = 3
-    THIRD_PLACE_MATCHED = 3
-    TEAM_WAS_AWARDED = 2
+    WINNER_MATCHED = DEFAULT_POINTS.winner
+    RUNNER_UP_MATCHED = DEFAULT_POINTS.runner_up
+    THIRD_PLACE_MATCHED = DEFAULT_POINTS.third_place
+    TEAM_WAS_AWARDED = DEFAULT_POINTS.awarded
     NO_MATCHES = 0
 
 
-RankedPerformances = namedtuple(
-    "RankedPerformances",
+RankedPerformance = namedtuple(
+    "RankedPerformance",
     [
-        "winner",
-        "runner_up",
-        "third_place",
+        "result",
+        "team_id",
+        "points",
     ]
 )
 
 
+class RankedPerformances(
+    namedtuple(
+        "RankedPerformances",
+        [
+            "winner",
+            "runner_up",
+            "third_place",
+        ]
+    )
+):
+    """Podium of the game.
+
+    Each place is a RankedPerformance or None if the place is not set.
+    """
+    __slots__ = ()
+
+
+ProgressCallback = Callable[[int, int], None]
+
+
 # Get different querysets
 
 def get_season_tournaments(
@@ -119,69 +156,243 @@ def get_prediction_events(prediction: Prediction) -> QuerySet[PredictionEvent]:
     return prediction_events
 
 
+def get_game_prediction_events(game: Game) -> QuerySet[PredictionEvent]:
+    """Returns a queryset with PredictionEvent instances
+    for all predictions of the game.
+    """
+    prediction_events = PredictionEvent.objects.filter(
+        prediction__game=game
+    ).order_by("prediction", "result")
+    return prediction_events
+
+
 def get_not_null_performances_for_game(game: Game) -> QuerySet[Performance]:
     """Returns a queryset with Performance instances
     that have a non-empty result field.
     """
     performances = Performance.objects.filter(
         game=game, result__isnull=False
-    ).order_by("result")
+    ).select_related("team").order_by("result")
     return performances
 
 
 def get_ranked_performances(
-    performances: QuerySet[Performance]
+    performances: QuerySet[Performance],
+    points: ScoringPoints = DEFAULT_POINTS,
 ) -> RankedPerformances:
+    """Returns the podium of the game built from a single query."""
+    points = {
+        Result.WINNER: points.winner,
+        Result.RUNNER_UP: points.runner_up,
+        Result.THIRD_PLACE: points.third_place,
+    }
+    places = dict.fromkeys(points)
 
-    prep_performances = []
+    for result, team_id in performances.values_list("result", "team_id"):
+        if result in places and places[result] is None:
+            places[result] = RankedPerformance(
+                result=result,
+                team_id=team_id,
+                points=points[result],
+            )
 
-    # winner
-    performance = performances.filter(result=Result.WINNER).first()
-    prep_performances.append(
-        {
-            "performance": performance,
-            "points": Points.WINNER_MATCHED.value,
-        }
-    )
+    return RankedPerformances(*places.values())
+
+
+# Points schemes
 
-    # runner up
-    performance = performances.filter(result=Result.RUNNER_UP).first()
-    prep_performances.append(
-        {
-            "performance": performance,
-            "points": Points.RUNNER_UP_MATCHED.value,
-        }
+def get_tournaments_points(tournament_ids: Iterable) -> dict[Any, ScoringPoints]:
+    """Returns points of the tournaments by their ids with a single query.
+
+    Tournaments without an active points scheme get the default points.
+    Scoring runs load the points once and pass them down, so scoring
+    makes no queries for the points of each game or prediction.
+    """
+    points = dict.fromkeys(tournament_ids, DEFAULT_POINTS)
+    schemes = Tournament.objects.filter(
+        pk__in=points,
+        points_scheme__isnull=False,
+        points_scheme__is_active=True,
+    ).values_list(
+        "pk",
+        "points_scheme__winner",
+        "points_scheme__runner_up",
+        "points_scheme__third_place",
+        "points_scheme__awarded",
     )
+    for tournament_id, *values in schemes:
+        points[tournament_id] = ScoringPoints(*values)
+    return points
 
-    # third place
-    performance = performances.filter(result=Result.THIRD_PLACE).first()
-    prep_performances.append(
-        {
-            "performance": performance,
-            "points": Points.THIRD_PLACE_MATCHED.value,
-        }
+
+def get_tournament_points(tournament_id) -> ScoringPoints:
+    return get_tournaments_points([tournament_id])[tournament_id]
+
+
+def get_points_for_object(
+    object: Season | Tournament | Game
+) -> list[tuple[ScoringPoints, list[str]]]:
+    """Returns the points the standings of an object are scored with,
+    paired with the names of the tournaments scored with them.
+
+    Tournaments of a season with the same points share one pair,
+    so a season with one scheme gets one pair.
+    """
+    if object.__class__ == Season:
+        tournaments = get_season_tournaments(object).values_list("pk", "name")
+    elif object.__class__ == Tournament:
+        tournaments = [(object.pk, object.name)]
+    elif object.__class__ == Game:
+        tournaments = [(object.tournament_id, object.tournament.name)]
+    else:
+        tournaments = []
+
+    points = get_tournaments_points(pk for pk, _ in tournaments)
+    tournament_names = defaultdict(list)
+    for pk, name in tournaments:
+        tournament_names[points[pk]].append(name)
+    return list(tournament_names.items()) or [(DEFAULT_POINTS, [])]
+
+
+# Versions
+
+def bump_versions(
+    game_ids: Iterable = (),
+    tournament_ids: Iterable = (),
+    season_ids: Iterable = (),
+) -> None:
+    """Increments versions of the games, tournaments and seasons
+    and of their parents, which invalidates their cached pages,
+    and sets the time of the change.
+    """
+    game_ids = set(game_ids)
+    tournament_ids = set(tournament_ids) | set(
+        Game.objects
+        .filter(pk__in=game_ids)
+        .values_list("tournament_id", flat=True)
     )
+    season_ids = set(season_ids) | set(
+        Tournament.objects
+        .filter(pk__in=tournament_ids)
+        .values_list("season_id", flat=True)
+    )
+    now = timezone.now()
+    Game.objects.filter(pk__in=game_ids)\
+        .update(version=F("version") + 1, changed_at=now)
+    Tournament.objects.filter(pk__in=tournament_ids)\
+        .update(version=F("version") + 1, changed_at=now)
+    Season.objects.filter(pk__in=season_ids)\
+        .update(version=F("version") + 1, changed_at=now)
+
+
+def get_name_dependent_ids(
+    object: Season | Tournament | Game | Team | Predictor
+) -> tuple[set, set, set]:
+    """Returns ids of the games, tournaments and seasons whose pages
+    show the name of the object, besides the object itself and its
+    parents: tournaments of a season, games of a tournament, games
+    of a team and games predicted by a predictor.
+    """
+    game_ids = set()
+    tournament_ids = set()
+    if isinstance(object, Season):
+        tournament_ids = set(
+            Tournament.objects
+            .filter(season=object)
+            .values_list("pk", flat=True)
+        )
+    elif isinstance(object, Tournament):
+        game_ids = set(
+            Game.objects
+            .filter(tournament=object)
+            .values_list("pk", flat=True)
+        )
+    elif isinstance(object, Team):
+        game_ids = set(
+            Performance.objects
+            .filter(team=object)
+            .values_list("game_id", flat=True)
+        )
+    elif isinstance(object, Predictor):
+        game_ids = set(
+            Prediction.objects
+            .filter(predictor=object)
+            .values_list("game_id", flat=True)
+        )
+    return game_ids, tournament_ids, set()
 
-    return RankedPerformances(*prep_performances)
 
+def bump_object_versions(
+    objects: Iterable[Season | Tournament | Game],
+    named_objects: Iterable[Season | Tournament | Game | Team | Predictor] = (),
+) -> None:
+    """Increments versions of the objects and of their parents.
 
-def get_standings_for_object(
+    Versions of the objects whose pages show the names of named_objects
+    are incremented too, after a rename or before a deletion.
+    """
+    ids = defaultdict(set)
+    for object in objects:
+        ids[object.__class__].add(object.pk)
+    game_ids, tournament_ids, season_ids = ids[Game], ids[Tournament], ids[Season]
+    for object in named_objects:
+        dependent_game_ids, dependent_tournament_ids, dependent_season_ids = \
+            get_name_dependent_ids(object)
+        game_ids |= dependent_game_ids
+        tournament_ids |= dependent_tournament_ids
+        season_ids |= dependent_season_ids
+    bump_versions(game_ids, tournament_ids, season_ids)
+
+
+# Standings
+
+STANDINGS_FIELDS = (
+    "count",
+    "prize_winners",
+    "third_places",
+    "runners_up",
+    "winners",
+    "total_points",
+)
+
+STANDINGS_ORDERING = (
+    "-total_points",
+    "count",
+    "-winners",
+    "-runners_up",
+    "-third_places",
+    "-prize_winners",
+    "predictor__name",
+)
+
+
+def get_standings_scope(
     object: Season | Tournament | Game
-) -> QuerySet[Prediction] | None:
-    """Returns standings for an object of a certain class.
+) -> dict[str, Any] | None:
+    """Returns a filter of standings rows for an object of a certain class.
     Else returns None.
     """
     if object.__class__ == Season:
-        object_fltr = Q(game__tournament__season=object)
+        return {"season_id": object.pk}
     elif object.__class__ == Tournament:
-        object_fltr = Q(game__tournament=object)
+        return {"tournament_id": object.pk}
     elif object.__class__ == Game:
-        object_fltr = Q(game=object)
-    else:
-        return None
+        return {"game_id": object.pk}
+    return None
+
+
+def aggregate_standings(
+    scope: dict[str, Any], predictor_ids: Iterable | None = None
+) -> QuerySet[Prediction]:
+    """Aggregates active predictions of the scope by predictor.
 
-    standings = Prediction.objects\
-        .filter(object_fltr, is_active=True)\
+    If predictor_ids is given, only these predictors are aggregated.
+    """
+    predictions = Prediction.objects.filter(**scope, is_active=True)
+    if predictor_ids is not None:
+        predictions = predictions.filter(predictor_id__in=predictor_ids)
+
+    standings = predictions\
         .values("predictor__id", "predictor__name", "predictor__vk_id")\
         .annotate(
             count=Count("pk"),
@@ -190,23 +401,283 @@ def get_standings_for_object(
             runners_up=Sum("runners_up"),
             winners=Sum("winners"),
             total_points=Sum("total_points"),
-        ).order_by(
-            "-total_points",
-            "count",
-            "-winners",
-            "-runners_up",
-            "-third_places",
-            "-prize_winners",
+        ).order_by(*STANDINGS_ORDERING)
+    return standings
+
+
+def get_standings_for_object(
+    object: Season | Tournament | Game
+) -> QuerySet[Prediction] | None:
+    """Returns standings aggregated from predictions
+    for an object of a certain class.
+    Else returns None.
+    """
+    scope = get_standings_scope(object)
+    if scope is None:
+        return None
+    return aggregate_standings(scope)
+
+
+def get_ranked_standings_for_object(
+    object: Season | Tournament | Game
+) -> QuerySet[Standing] | None:
+    """Returns precomputed standings for an object of a certain class.
+    Else returns None.
+    """
+    scope = get_standings_scope(object)
+    if scope is None:
+        return None
+
+    standings = Standing.objects\
+        .filter(**scope)\
+        .values(
+            "position",
+            "predictor__id",
             "predictor__name",
-        )
+            "predictor__vk_id",
+            *STANDINGS_FIELDS,
+        ).order_by("position")
     return standings
 
 
+def rank_standings(scope: dict[str, Any]) -> None:
+    """Recalculates positions of all standings rows of the scope."""
+    standings = Standing.objects\
+        .filter(**scope)\
+        .order_by(*STANDINGS_ORDERING)\
+        .only("pk", "position")
+
+    changed_standings = []
+    for position, standing in enumerate(standings, start=1):
+        if standing.position != position:
+            standing.position = position
+            changed_standings.append(standing)
+    Standing.objects.bulk_update(changed_standings, ["position"])
+
+
+def update_scope_standings(
+    scope: dict[str, Any], predictor_ids: Iterable | None = None
+) -> None:
+    """Updates standings rows of the scope from predictions and re-ranks
+    the scope.
+
+    If predictor_ids is given, only rows of these predictors are
+    recalculated.
+    """
+    standings = Standing.objects.filter(**scope)
+    if predictor_ids is not None:
+        standings = standings.filter(predictor_id__in=predictor_ids)
+    stale_standings = {
+        standing.predictor_id: standing for standing in standings
+    }
+
+    new_standings = []
+    changed_standings = []
+    for row in aggregate_standings(scope, predictor_ids):
+        standing = stale_standings.pop(row["predictor__id"], None)
+        if standing is None:
+            standing = Standing(**scope, predictor_id=row["predictor__id"])
+            new_standings.append(standing)
+        else:
+            changed_standings.append(standing)
+        for field in STANDINGS_FIELDS:
+            setattr(standing, field, row[field])
+
+    Standing.objects.filter(
+        pk__in=[standing.pk for standing in stale_standings.values()]
+    ).delete()
+    Standing.objects.bulk_update(changed_standings, STANDINGS_FIELDS)
+    Standing.objects.bulk_create(new_standings)
+    rank_standings(scope)
+
+
+def update_standings(
+    game_ids: Iterable, predictor_ids: Iterable | None = None
+) -> None:
+    """Updates standings of the games and of their tournaments
+    and seasons.
+
+    If predictor_ids is None, all predictors of the games are updated.
+    Versions of the games, tournaments and seasons are bumped.
+    """
+    game_ids = set(game_ids)
+    games = Game.objects\
+        .filter(pk__in=game_ids)\
+        .values_list("pk", "tournament_id", "tournament__season_id")
+
+    if predictor_ids is None:
+        game_predictor_ids = None
+        predictor_ids = Prediction.objects\
+            .filter(game_id__in=game_ids)\
+            .values_list("predictor_id", flat=True)
+    else:
+        game_predictor_ids = predictor_ids = set(predictor_ids)
+
+    tournament_ids = set()
+    season_ids = set()
+    with transaction.atomic():
+        for game_id, tournament_id, season_id in games:
+            update_scope_standings({"game_id": game_id}, game_predictor_ids)
+            tournament_ids.add(tournament_id)
+            season_ids.add(season_id)
+        for tournament_id in tournament_ids:
+            update_scope_standings(
+                {"tournament_id": tournament_id}, predictor_ids
+            )
+        for season_id in season_ids:
+            update_scope_standings({"season_id": season_id}, predictor_ids)
+        bump_versions(game_ids, tournament_ids, season_ids)
+
+
+def sync_prediction_scopes(game_ids: Iterable) -> int:
+    """Copies tournaments and seasons of the games to their predictions
+    after a game has moved to another tournament or a tournament
+    to another season. Standings of the old and new scopes are updated.
+
+    Returns the number of updated predictions.
+    """
+    games = Game.objects\
+        .filter(pk__in=set(game_ids))\
+        .values_list("pk", "tournament_id", "tournament__season_id")
+
+    updated = 0
+    with transaction.atomic():
+        for game_id, tournament_id, season_id in games:
+            predictions = Prediction.objects\
+                .filter(game_id=game_id)\
+                .exclude(tournament_id=tournament_id, season_id=season_id)
+            old_scopes = set(
+                predictions.values_list("tournament_id", "season_id")
+            )
+            if not old_scopes:
+                continue
+            updated += predictions.update(
+                tournament_id=tournament_id, season_id=season_id
+            )
+
+            predictor_ids = set(
+                Prediction.objects
+                .filter(game_id=game_id)
+                .values_list("predictor_id", flat=True)
+            )
+            old_tournament_ids = set()
+            old_season_ids = set()
+            for old_tournament_id, old_season_id in old_scopes:
+                old_tournament_ids.add(old_tournament_id)
+                old_season_ids.add(old_season_id)
+            for old_tournament_id in old_tournament_ids - {tournament_id}:
+                update_scope_standings(
+                    {"tournament_id": old_tournament_id}, predictor_ids
+                )
+            for old_season_id in old_season_ids - {season_id}:
+                update_scope_standings(
+                    {"season_id": old_season_id}, predictor_ids
+                )
+            bump_versions(
+                tournament_ids=old_tournament_ids, season_ids=old_season_ids
+            )
+            update_standings([game_id], predictor_ids)
+    return updated
+
+
+def get_standings_keys(
+    predictions: QuerySet[Prediction]
+) -> tuple[set, set]:
+    """Returns ids of games and predictors whose standings
+    depend on the predictions.
+    """
+    game_ids = set()
+    predictor_ids = set()
+    for game_id, predictor_id in predictions.values_list(
+        "game_id", "predictor_id"
+    ):
+        game_ids.add(game_id)
+        predictor_ids.add(predictor_id)
+    return game_ids, predictor_ids
+
+
+def get_deleted_standings_keys(
+    predictions: QuerySet[Prediction]
+) -> tuple[set, set, set, set]:
+    """Returns ids of games, tournaments, seasons and predictors whose
+    standings depend on the predictions, read before the predictions
+    are deleted with their games or predictors.
+    """
+    keys = (set(), set(), set(), set())
+    for values in predictions.values_list(
+        "game_id", "tournament_id", "season_id", "predictor_id"
+    ):
+        for ids, id in zip(keys, values):
+            ids.add(id)
+    return keys
+
+
+def update_deleted_standings(
+    game_ids: Iterable,
+    tournament_ids: Iterable,
+    season_ids: Iterable,
+    predictor_ids: Iterable,
+) -> None:
+    """Updates standings of the predictors in the scopes left after
+    their predictions were deleted, and re-ranks the scopes, where
+    deleted rows leave gaps. Scopes that were deleted are skipped.
+    """
+    predictor_ids = set(predictor_ids)
+    scopes = {
+        "game_id": Game.objects.filter(pk__in=game_ids),
+        "tournament_id": Tournament.objects.filter(pk__in=tournament_ids),
+        "season_id": Season.objects.filter(pk__in=season_ids),
+    }
+    ids = {}
+    with transaction.atomic():
+        for field, objects in scopes.items():
+            ids[field] = set(objects.values_list("pk", flat=True))
+            for id in ids[field]:
+                update_scope_standings({field: id}, predictor_ids)
+        bump_versions(*ids.values())
+
+
+def rebuild_standings() -> int:
+    """Rebuilds all standings from scratch.
+
+    Returns the number of created standings rows.
+    """
+    scopes = [
+        {"season_id": pk}
+        for pk in Season.objects.values_list("pk", flat=True)
+    ] + [
+        {"tournament_id": pk}
+        for pk in Tournament.objects.values_list("pk", flat=True)
+    ] + [
+        {"game_id": pk}
+        for pk in Game.objects.values_list("pk", flat=True)
+    ]
+
+    with transaction.atomic():
+        Standing.objects.all().delete()
+        for scope in scopes:
+            standings = [
+                Standing(
+                    **scope,
+                    predictor_id=row["predictor__id"],
+                    position=position,
+                    **{field: row[field] for field in STANDINGS_FIELDS},
+                )
+                for position, row in enumerate(
+                    aggregate_standings(scope), start=1
+                )
+            ]
+            Standing.objects.bulk_create(standings)
+        now = timezone.now()
+        Season.objects.update(version=F("version") + 1, changed_at=now)
+        Tournament.objects.update(version=F("version") + 1, changed_at=now)
+        Game.objects.update(version=F("version") + 1, changed_at=now)
+    return Standing.objects.count()
+
+
 # Processing raw predictions
 
-def write_note_and_save(raw_prediction: RawPrediction, note: str) -> None:
-    raw_prediction.note = note
-    raw_prediction.save()
+RAW_PREDICTIONS_BATCH_SIZE = 500
 
 
 def is_valid_uuid(value: Any) -> bool:
@@ -218,281 +689,850 @@ def is_valid_uuid(value: Any) -> bool:
         return False
 
 
-def get_game_by_uuid_or_name(uuid_or_name: str) -> Game | None:
-    if is_valid_uuid(uuid_or_name):
-        game_fltr = Q(pk=uuid_or_name)
-    else:
-        game_fltr = Q(name__iexact=uuid_or_name)
-    try:
-        game = Game.objects.get(game_fltr)
-    except (MultipleObjectsReturned, ObjectDoesNotExist):
-        return None
-    else:
-        return game
+def get_raw_prediction_datetime(
+    raw_prediction: RawPrediction
+) -> datetime | None:
+    if raw_prediction.timestamp:
+        return make_aware(datetime.utcfromtimestamp(raw_prediction.timestamp))
+    return None
 
 
-def get_predictor_or_create(name: str, vk_id: int = None) -> Predictor | None:
-    if vk_id:
-        try:
-            predictor_by_vk_id = Predictor.objects.get(vk_id=vk_id)
-        except ObjectDoesNotExist:
-            pass
-        else:
-            return predictor_by_vk_id
-    predictors_by_name = Predictor.objects.filter(name__iexact=name)
-    predictors_count = predictors_by_name.count()
-    if predictors_count == 1:
-        return predictors_by_name[0]
-    elif predictors_count > 1:
-        return None
-    else:
-        try:
-            new_predictor = Predictor.objects.create(name=name, vk_id=vk_id)
-        except Exception:
-            new_predictor = None
-        return new_predictor
+def fill_raw_predictions_picks(
+    raw_predictions: QuerySet[RawPrediction]
+) -> int:
+    """Parses prize winner picks from the text of raw predictions
+    without picks. Returns the number of filled raw predictions.
+    """
+    raw_predictions = list(raw_predictions.filter(
+        winner="", runner_up="", third_place=""
+    ))
+    resolver = NameResolver()
+    games = {rp.game: resolver.get_game(rp.game) for rp in raw_predictions}
+    team_indexes = get_team_indexes(game for game in games.values() if game)
+    filled = [
+        rp for rp in raw_predictions
+        if games[rp.game]
+        and fill_raw_prediction_picks(rp, team_indexes[games[rp.game].pk])
+    ]
+    RawPrediction.objects.bulk_update(
+        filled,
+        ["winner", "runner_up", "third_place", "note"],
+        batch_size=RAW_PREDICTIONS_BATCH_SIZE,
+    )
+    return len(filled)
 
 
-def create_prediction_event(
-    team_name: str, prediction: Prediction, result: Result
-) -> None:
-    if team_name:
-        try:
-            team = Team.objects.get(name__iexact=team_name)
-        except (MultipleObjectsReturned, ObjectDoesNotExist):
-            return None
-        else:
-            PredictionEvent.objects.create(
-                prediction=prediction,
-                team=team,
-                result=result,
-            )
+def get_unknown_team_note(team_name: str, resolver: NameResolver) -> str:
+    """Returns the note of a raw prediction left for review because
+    of a team name that is neither a team name nor an alias.
+    """
+    note = f"Требует проверки: не найдена команда «{team_name}»"
+    team = resolver.suggest_team(team_name)
+    if team:
+        note += (
+            f", возможно, «{team.name}»."
+            " Исправьте название или добавьте псевдоним"
+        )
+    return note + "!"
 
 
-def process_raw_predictions(
-    raw_predictions: QuerySet[RawPrediction] = None
-) -> tuple[int, int]:
-    """Processes raw predictions.
-    Creates predictions based on them.
+ProcessedRawPrediction = namedtuple(
+    "ProcessedRawPrediction", ("raw_prediction", "prediction", "events")
+)
 
-    Returns a tuple with two int values:
-    - number of successfully processed;
-    - total number of original raw predictions.
-    """
-    if raw_predictions:
-        raw_predictions = raw_predictions.filter(is_active=True)
-    else:
-        raw_predictions = RawPrediction.objects.filter(is_active=True)
 
-    total_rp = len(raw_predictions)
-    successful_rp = 0
+def process_raw_predictions_batch(
+    raw_predictions: list[RawPrediction],
+    resolver: NameResolver | None = None,
+) -> tuple[int, set, set]:
+    """Processes a batch of raw predictions in one transaction.
 
+    Games, predictors and teams are resolved by the resolver's names
+    and aliases, predictions and their events are created in bulk.
+    Raw predictions naming an unknown team are left for review.
+    Each created prediction is linked to its raw prediction, so raw
+    predictions that already have a prediction are not processed again.
+
+    Returns a tuple with the number of successfully processed raw
+    predictions, ids of games and ids of predictors of new predictions.
+    """
+    resolver = resolver or NameResolver()
+    games = {}
+    predictors = {}
+    new_predictors = []
     for rp in raw_predictions:
-        game = get_game_by_uuid_or_name(rp.game)
+        if rp.prediction_id:
+            continue
+        game = resolver.get_game(rp.game)
         if game is None:
-            write_note_and_save(
-                rp,
-                "Ошибка: не найдена связанная игра!"
-            )
+            continue
+        games[rp.pk] = game
+        predictor, is_new = resolver.get_predictor(rp.name, rp.vk_id)
+        if predictor:
+            predictors[rp.pk] = predictor
+        if is_new:
+            new_predictors.append(predictor)
+    new_predictor_ids = {predictor.pk for predictor in new_predictors}
+    existing_predictions = set(
+        Prediction.objects.filter(
+            game__in={game.pk for game in games.values()},
+            predictor__in={
+                predictor.pk for predictor in predictors.values()
+            } - new_predictor_ids,
+        ).values_list("game_id", "predictor_id")
+    )
+
+    processed = []
+    for rp in raw_predictions:
+        if rp.prediction_id:
+            rp.is_active = False
+            rp.note = "Прогноз уже создан"
+            continue
+
+        game = games.get(rp.pk)
+        if game is None:
+            rp.note = "Ошибка: не найдена связанная игра!"
             continue
 
-        predictor = get_predictor_or_create(rp.name, rp.vk_id)
+        predictor = predictors.get(rp.pk)
         if predictor is None:
-            write_note_and_save(
-                rp,
-                "Ошибка: не найден прогнозист, и не создан новый!"
-            )
+            rp.note = "Ошибка: не найден прогнозист, и не создан новый!"
             continue
 
-        prediction = Prediction.objects.filter(game=game, predictor=predictor)
-        if prediction:
-            write_note_and_save(
-                rp,
+        if (game.pk, predictor.pk) in existing_predictions:
+            rp.note = (
                 "Ошибка: прогноз от этого пользователя на эту игру"
                 " уже существует!"
             )
             continue
 
+        teams = {}
+        unknown_team_name = None
+        for team_name, result in (
+            (rp.winner, Result.WINNER),
+            (rp.runner_up, Result.RUNNER_UP),
+            (rp.third_place, Result.THIRD_PLACE),
+        ):
+            if not team_name:
+                continue
+            teams[result] = resolver.get_team(team_name)
+            if teams[result] is None:
+                unknown_team_name = team_name
+                break
+        if unknown_team_name:
+            rp.note = get_unknown_team_note(unknown_team_name, resolver)
+            continue
+        existing_predictions.add((game.pk, predictor.pk))
+
         is_active = True
-        if rp.timestamp:
-            rp_datetime = make_aware(datetime.utcfromtimestamp(rp.timestamp))
-            if game.started_at < rp_datetime:
-                is_active = False
+        rp_datetime = get_raw_prediction_datetime(rp)
+        if rp_datetime and game.started_at and game.started_at < rp_datetime:
+            is_active = False
+        prediction = Prediction(
+            game=game,
+            tournament_id=game.tournament_id,
+            season_id=game.tournament.season_id,
+            predictor=predictor,
+            is_active=is_active,
+            datetime=rp_datetime,
+        )
+        prediction_events = [
+            PredictionEvent(prediction=prediction, team=team, result=result)
+            for result, team in teams.items()
+        ]
+        processed.append(
+            ProcessedRawPrediction(rp, prediction, prediction_events)
+        )
+
+        rp.is_active = False
+        rp.prediction = prediction
+        rp.note = "Создан"
+        if not is_active:
+            rp.note += ". Неактивен"
+
+    predictions = [item.prediction for item in processed]
+    used_predictors = {prediction.predictor_id for prediction in predictions}
+    new_used_predictors = [
+        predictor for predictor in new_predictors
+        if predictor.pk in used_predictors
+    ]
+    with transaction.atomic():
         try:
-            prediction = Prediction.objects.create(
-                game=game,
-                predictor=predictor,
-                is_active=is_active,
-                datetime=rp_datetime,
-            )
-        except Exception as error:
-            write_note_and_save(
-                rp,
-                f"Ошибка: не удалось создать прогноз! {error}"
+            with transaction.atomic():
+                Predictor.objects.bulk_create(new_used_predictors)
+                Prediction.objects.bulk_create(predictions)
+                PredictionEvent.objects.bulk_create(
+                    [event for item in processed for event in item.events]
+                )
+        except IntegrityError:
+            processed = save_processed_raw_predictions(
+                processed, new_used_predictors
             )
+            predictions = [item.prediction for item in processed]
+            used_predictors = {
+                prediction.predictor_id for prediction in predictions
+            }
+
+        now = timezone.now()
+        for rp in raw_predictions:
+            rp.updated_at = now
+        RawPrediction.objects.bulk_update(
+            raw_predictions, ["is_active", "note", "prediction", "updated_at"]
+        )
+
+    for predictor in new_predictors:
+        if predictor.pk not in used_predictors:
+            resolver.forget_predictor(predictor)
+    return (
+        len(predictions),
+        {prediction.game_id for prediction in predictions},
+        used_predictors,
+    )
+
+
+def save_processed_raw_predictions(
+    processed: list[ProcessedRawPrediction],
+    new_predictors: list[Predictor],
+) -> list[ProcessedRawPrediction]:
+    """Saves predictions of raw predictions one by one, each with
+    a savepoint, when the batch could not be saved in bulk.
+
+    Raw predictions whose prediction could not be saved stay active
+    with the error in the note. Returns the saved ones.
+    """
+    unsaved_predictors = set(new_predictors)
+    saved = []
+    for item in processed:
+        rp, prediction = item.raw_prediction, item.prediction
+        predictor = prediction.predictor
+        try:
+            with transaction.atomic():
+                if predictor in unsaved_predictors:
+                    predictor.save(force_insert=True)
+                prediction.save(force_insert=True)
+                PredictionEvent.objects.bulk_create(item.events)
+        except IntegrityError as error:
+            rp.is_active = True
+            rp.prediction = None
+            rp.note = f"Ошибка: прогноз не сохранён! {error}"
             continue
+        unsaved_predictors.discard(predictor)
+        saved.append(item)
+    return saved
 
-        create_prediction_event(rp.winner, prediction, Result.WINNER)
-        create_prediction_event(rp.runner_up, prediction, Result.RUNNER_UP)
-        create_prediction_event(rp.third_place, prediction, Result.THIRD_PLACE)
 
-        rp.is_active = False
-        note = "Создан"
-        if not is_active:
-            note += ". Неактивен"
-        write_note_and_save(rp, note)
-        successful_rp += 1
+def process_raw_predictions(
+    raw_predictions: QuerySet[RawPrediction] = None,
+    progress: ProgressCallback | None = None,
+) -> tuple[int, int]:
+    """Processes raw predictions in batches.
+    Creates predictions based on them.
+
+    If progress is given, it is called with the number of processed
+    and the total number of raw predictions after each batch.
+
+    Returns a tuple with two int values:
+    - number of successfully processed;
+    - total number of original raw predictions.
+    """
+    if raw_predictions is not None:
+        raw_predictions = raw_predictions.filter(is_active=True)
+    else:
+        raw_predictions = RawPrediction.objects.filter(is_active=True)
+
+    raw_prediction_ids = list(raw_predictions.values_list("pk", flat=True))
+    total_rp = len(raw_prediction_ids)
+    successful_rp = 0
+    game_ids = set()
+    predictor_ids = set()
+    resolver = NameResolver()
+
+    for start in range(0, total_rp, RAW_PREDICTIONS_BATCH_SIZE):
+        batch_ids = raw_prediction_ids[
+            start:start + RAW_PREDICTIONS_BATCH_SIZE
+        ]
+        batch = RawPrediction.objects.in_bulk(batch_ids)
+        successful, batch_game_ids, batch_predictor_ids = \
+            process_raw_predictions_batch(
+                [batch[pk] for pk in batch_ids if pk in batch], resolver
+            )
+        successful_rp += successful
+        game_ids |= batch_game_ids
+        predictor_ids |= batch_predictor_ids
+        if progress:
+            progress(start + len(batch_ids), total_rp)
+
+    if game_ids:
+        update_standings(game_ids, predictor_ids)
 
     return (successful_rp, total_rp)
 
 
-def get_profiles(response: dict) -> dict[int, str]:
-    profiles = response.get("profiles", [])
-    return {
-        profile.get("id"):
-        f"{profile.get('first_name')} {profile.get('last_name')}"
-        for profile in profiles
+def get_profile_name(profile: dict[str, Any]) -> str:
+    return f"{profile.get('first_name')} {profile.get('last_name')}"
+
+
+def get_vk_profile_names(vk_ids: Iterable[int]) -> dict[int, str]:
+    """Returns names of VK users by id from the profile cache.
+
+    Users missing from the cache or cached more than VK_PROFILE_TTL_DAYS
+    ago are requested with one batched users.get call and cached.
+    If the call fails, expired names are used. Communities (negative
+    ids) have no names.
+    """
+    vk_ids = {vk_id for vk_id in vk_ids if vk_id and vk_id > 0}
+    profiles = VkProfile.objects.in_bulk(vk_ids)
+    expired_before = timezone.now() - timedelta(days=VK_PROFILE_TTL_DAYS)
+    names = {
+        vk_id: profile.name for vk_id, profile in profiles.items()
+        if profile.fetched_at >= expired_before
     }
 
+    missing_ids = vk_ids - names.keys()
+    users = get_vk_users(sorted(missing_ids)) if missing_ids else None
+    if users:
+        now = timezone.now()
+        new_profiles = []
+        for user in users:
+            vk_id = user.get("id")
+            name = get_profile_name(user)[:100]
+            names[vk_id] = name
+            profile = profiles.get(vk_id)
+            if profile:
+                profile.name = name
+                profile.fetched_at = now
+            else:
+                new_profiles.append(
+                    VkProfile(vk_id=vk_id, name=name, fetched_at=now)
+                )
+        VkProfile.objects.bulk_update(
+            [profiles[vk_id] for vk_id in missing_ids if vk_id in profiles],
+            ["name", "fetched_at"],
+        )
+        VkProfile.objects.bulk_create(new_profiles, ignore_conflicts=True)
+
+    for vk_id in missing_ids - names.keys():
+        if vk_id in profiles:
+            names[vk_id] = profiles[vk_id].name
+    return names
+
 
 def get_comments(response: dict) -> list[dict[str, Any]]:
     comments = response.get("items", [])
     return comments
 
 
-def get_predictors_comments(games: QuerySet[Game]) -> list[list[Any]]:
-    output = [
-        [
-            "game",
-            "name",
-            "vk_id",
-            "timestamp",
-            "text",
-            "winner",
-            "runner_up",
-            "third_place",
-            "id",
-        ]
-    ]
+def iter_predictors_comments(games: QuerySet[Game]) -> Iterator[list[Any]]:
+    """Yields the header and then comment rows of the games' posts
+    as soon as comments of each post are fetched.
 
-    api = get_vk_api()
+    Rows are produced by queries and VK requests made between them,
+    so the iterator must not feed a StreamingHttpResponse: under ASGI,
+    Django 4.0 iterates the response in the event loop, where queries
+    raise SynchronousOnlyOperation. Views use get_predictors_comments.
+    """
+    yield [
+        "game",
+        "name",
+        "vk_id",
+        "timestamp",
+        "text",
+        "winner",
+        "runner_up",
+        "third_place",
+        "id",
+    ]
 
-    for game in games:
-        if not game.vk_post_id:
-            continue
+    games_by_post_id = {
+        game.vk_post_id: game for game in games if game.vk_post_id
+    }
+    team_indexes = get_team_indexes(games_by_post_id.values())
 
-        response = get_vk_comments(game.vk_post_id, api=api)
+    for post_id, response in get_posts_vk_comments(
+        games_by_post_id, extended=False
+    ):
         if response:
-            profiles = get_profiles(response)
+            game = games_by_post_id[post_id]
             comments = get_comments(response)
+            names = get_vk_profile_names(
+                comment.get("from_id") for comment in comments
+            )
             for comment in comments:
                 vk_id = comment.get("from_id")
+                picks = parse_picks(
+                    comment.get("text") or "", team_indexes[game.pk]
+                )
                 comment_items = [
                     game.name,
-                    profiles.get(vk_id),
+                    names.get(vk_id),
                     vk_id,
                     comment.get("date"),
                     comment.get("text"),
+                    *picks.names,
+                    "",
                 ]
-                output.append(comment_items)
+                yield comment_items
+
+
+def get_predictors_comments(games: QuerySet[Game]) -> list[list[Any]]:
+    """Returns the rows of iter_predictors_comments fetched eagerly,
+    post by post, safe to stream under both WSGI and ASGI.
+    """
+    return list(iter_predictors_comments(games))
 
-    return output
+
+def get_new_raw_predictions(
+    game: Game,
+    comments: list[dict[str, Any]],
+    names: dict[int, str],
+    known_vk_ids: set[int],
+) -> list[RawPrediction]:
+    """Returns unsaved raw predictions from comments newer than
+    the game's last seen comment.
+
+    Only the first comment of each user is taken, users
+    from known_vk_ids are skipped.
+    """
+    raw_predictions = []
+    for comment in comments:
+        vk_id = comment.get("from_id")
+        if (
+            game.vk_last_comment_id
+            and comment.get("id") <= game.vk_last_comment_id
+        ) or vk_id in known_vk_ids:
+            continue
+        known_vk_ids.add(vk_id)
+        raw_predictions.append(
+            RawPrediction(
+                name=names.get(vk_id) or "",
+                vk_id=vk_id,
+                timestamp=comment.get("date"),
+                text=comment.get("text") or "",
+                game=game.name,
+                vk_post_id=game.vk_post_id,
+                vk_comment_id=comment.get("id"),
+            )
+        )
+    return raw_predictions
+
+
+def sync_vk_comments(games: QuerySet[Game]) -> int:
+    """Fetches comments newer than each game's last seen comment
+    and saves them as raw predictions.
+
+    A user gets at most one raw prediction per post, so renaming
+    a game doesn't import its comments again. Names of the
+    commenters of all posts are resolved at once via the profile cache,
+    prize winner picks are parsed from the comment text.
+    Returns the number of new raw predictions.
+    """
+    games_by_post_id = {
+        game.vk_post_id: game for game in games if game.vk_post_id
+    }
+    start_comment_ids = {
+        post_id: game.vk_last_comment_id
+        for post_id, game in games_by_post_id.items()
+        if game.vk_last_comment_id
+    }
+
+    comments_by_post_id = {}
+    for post_id, response in get_posts_vk_comments(
+        games_by_post_id, extended=False, start_comment_ids=start_comment_ids
+    ):
+        comments = get_comments(response) if response else []
+        if comments:
+            comments_by_post_id[post_id] = comments
+    names = get_vk_profile_names(
+        comment.get("from_id")
+        for comments in comments_by_post_id.values()
+        for comment in comments
+    )
+    team_indexes = get_team_indexes(
+        games_by_post_id[post_id] for post_id in comments_by_post_id
+    )
+
+    created = 0
+    for post_id, comments in comments_by_post_id.items():
+        game = games_by_post_id[post_id]
+        known_vk_ids = set(
+            RawPrediction.objects.filter(
+                vk_post_id=post_id,
+                vk_id__in={comment.get("from_id") for comment in comments},
+            ).values_list("vk_id", flat=True)
+        )
+        raw_predictions = get_new_raw_predictions(
+            game, comments, names, known_vk_ids
+        )
+        for raw_prediction in raw_predictions:
+            fill_raw_prediction_picks(raw_prediction, team_indexes[game.pk])
+        last_comment = max(comments, key=lambda comment: comment.get("id"))
+
+        with transaction.atomic():
+            RawPrediction.objects.bulk_create(raw_predictions)
+            game.vk_last_comment_id = last_comment.get("id")
+            game.vk_last_comment_at = make_aware(
+                datetime.utcfromtimestamp(last_comment.get("date"))
+            )
+            game.save(
+                update_fields=["vk_last_comment_id", "vk_last_comment_at"]
+            )
+        created += len(raw_predictions)
+
+    return created
 
 
 # Results manipulation
 
-def save_prediction_results(
-    prediction: Prediction,
-    prediction_results: dict[str | int, float | int] = {},
+PREDICTION_RESULTS_FIELDS = (
+    "total_points",
+    "winners",
+    "runners_up",
+    "third_places",
+    "prize_winners",
+    "updated_at",
+)
+
+
+def score_predictions(
+    predictions: list[Prediction],
+    events: list[PredictionEvent],
+    ranked_performances: RankedPerformances,
+    points: ScoringPoints = DEFAULT_POINTS,
 ) -> None:
-    prediction.total_points = prediction_results.get("total_points", 0.0)
-    prediction.winners = prediction_results.get(1, 0)
-    prediction.runners_up = prediction_results.get(2, 0)
-    prediction.third_places = prediction_results.get(3, 0)
-    prediction.prize_winners = prediction_results.get("prize_winners", 0)
-    prediction.save()
+    """Sets points of the prediction events and results of the
+    predictions of one game in memory with the scoring kernel.
+
+    events are the prediction events of the predictions. Only teams
+    of ranked_performances are taken, the points are the given ones.
+    """
+    team_codes = {}
+
+    def get_team_code(team_id) -> int:
+        return team_codes.setdefault(team_id, len(team_codes))
+
+    podium = [
+        get_team_code(place.team_id) if place else NO_TEAM
+        for place in ranked_performances
+    ]
+    prediction_codes = {
+        prediction.pk: code for code, prediction in enumerate(predictions)
+    }
+    scores = score_events(
+        np.fromiter(
+            (prediction_codes[event.prediction_id] for event in events),
+            dtype=np.int64,
+            count=len(events),
+        ),
+        np.fromiter(
+            (get_team_code(event.team_id) for event in events),
+            dtype=np.int64,
+            count=len(events),
+        ),
+        np.fromiter(
+            (event.result for event in events),
+            dtype=np.int64,
+            count=len(events),
+        ),
+        podium,
+        points,
+    )
+
+    for event, event_points in zip(events, scores.points.tolist()):
+        event.points = event_points
+    results = dict(zip(
+        scores.prediction_ids.tolist(),
+        zip(scores.total_points.tolist(), scores.counters.tolist()),
+    ))
+    for code, prediction in enumerate(predictions):
+        total_points, counters = results.get(code, (0.0, (0, 0, 0, 0)))
+        prediction.total_points = total_points
+        prediction.winners, prediction.runners_up, prediction.third_places, \
+            prediction.prize_winners = counters
 
 
 def calculate_prediction(
-    prediction: Prediction, ranked_performances: RankedPerformances = None
+    prediction: Prediction,
+    ranked_performances: RankedPerformances = None,
+    standings: bool = True,
+    points: ScoringPoints | None = None,
 ) -> None:
+    """Calculates the prediction with the points of its tournament
+    unless points are given.
+    """
+    if points is None:
+        points = get_tournament_points(prediction.tournament_id)
     if not ranked_performances:
         performances = get_not_null_performances_for_game(prediction.game)
-        ranked_performances = get_ranked_performances(performances)
-
-    prediction_events = get_prediction_events(prediction)
-    events = [
-        event for event in prediction_events
-    ]
-    for event in events:
-        event.points = Points.NO_MATCHES.value
-
-    prediction_results = {
-        "total_points": 0.0,
-        Result.WINNER: 0,
-        Result.RUNNER_UP: 0,
-        Result.THIRD_PLACE: 0,
-        "prize_winners": 0,
-    }
+        ranked_performances = get_ranked_performances(performances, points)
 
-    for ranked_performance in ranked_performances:
-        performance = ranked_performance.get("performance")
-        if performance:
-            full_hit = [
-                event for event in events
-                if event.result == performance.result
-                and event.team == performance.team
-            ]
-            if full_hit:
-                full_hit[0].points = ranked_performance.get("points")
-                prediction_results["total_points"] += full_hit[0].points
-                prediction_results[performance.result] += 1
-            else:
-                prizes_hit = [
-                    event for event in events
-                    if event.team == performance.team
-                ]
-                if prizes_hit:
-                    prizes_hit[0].points = Points.TEAM_WAS_AWARDED.value
-                    prediction_results["total_points"] += prizes_hit[0].points
-                    prediction_results["prize_winners"] += 1
+    events = list(get_prediction_events(prediction))
+    score_predictions([prediction], events, ranked_performances, points)
 
+    now = timezone.now()
     for event in events:
-        event.save()
+        event.updated_at = now
+    prediction.is_stale = False
+    with transaction.atomic():
+        PredictionEvent.objects.bulk_update(events, ["points", "updated_at"])
+        prediction.save(
+            update_fields=(*PREDICTION_RESULTS_FIELDS, "is_stale")
+        )
+
+    if standings:
+        update_standings([prediction.game_id], [prediction.predictor_id])
 
-    save_prediction_results(prediction, prediction_results)
 
+def score_game_predictions(
+    game: Game,
+    predictions: QuerySet[Prediction],
+    events: QuerySet[PredictionEvent],
+    points: ScoringPoints,
+) -> list[Prediction]:
+    """Scores the predictions of the game in memory and writes
+    the results back with bulk updates in one transaction.
 
-def calculate_game_predictions(game: Game) -> None:
+    events are the prediction events of the predictions. The predictions
+    are no longer stale afterwards. Returns the scored predictions.
+    """
     performances = get_not_null_performances_for_game(game)
-    ranked_performances = get_ranked_performances(performances)
-    predictions = get_game_predictions(game)
+    ranked_performances = get_ranked_performances(performances, points)
+    predictions = list(predictions)
+    prediction_ids = {prediction.pk for prediction in predictions}
+    events = [event for event in events if event.prediction_id in prediction_ids]
+    score_predictions(predictions, events, ranked_performances, points)
 
+    now = timezone.now()
     for prediction in predictions:
-        calculate_prediction(prediction, ranked_performances)
+        prediction.is_stale = False
+        prediction.updated_at = now
+    for event in events:
+        event.updated_at = now
+
+    with transaction.atomic():
+        PredictionEvent.objects.bulk_update(events, ["points", "updated_at"])
+        Prediction.objects.bulk_update(
+            predictions, (*PREDICTION_RESULTS_FIELDS, "is_stale")
+        )
+    return predictions
+
+
+def calculate_game_predictions(
+    game: Game,
+    standings: bool = True,
+    points: ScoringPoints | None = None,
+) -> None:
+    """Calculates all predictions for the game in one pass.
 
+    All prediction events of the game are loaded with a single query
+    and scored in memory, the results are written back with bulk updates
+    in one transaction. The number of queries does not depend
+    on the number of predictions.
 
-def calculate_tournament_predictions(tournament: Tournament) -> None:
-    games = get_tournament_games(tournament)
-    for game in games:
-        calculate_game_predictions(game)
+    The points of the tournament of the game are used unless points
+    are given.
+    """
+    if points is None:
+        points = get_tournament_points(game.tournament_id)
+    with transaction.atomic():
+        Game.objects.filter(pk=game.pk).update(is_stale=False)
+        score_game_predictions(
+            game,
+            get_game_predictions(game),
+            get_game_prediction_events(game),
+            points,
+        )
+        if standings:
+            update_standings([game.pk])
 
 
-def reset_prediction(prediction: Prediction) -> None:
-    prediction_events = get_prediction_events(prediction)
-    for event in prediction_events:
-        event.points = Points.NO_MATCHES.value
-        event.save()
-    save_prediction_results(prediction)
+def calculate_tournament_predictions(
+    tournament: Tournament, progress: ProgressCallback | None = None
+) -> None:
+    """Calculates predictions for all games of the tournament.
 
+    If progress is given, it is called with the number of calculated
+    games and the total number of games after each game.
+    """
+    games = list(get_tournament_games(tournament))
+    points = get_tournament_points(tournament.pk)
+    for done, game in enumerate(games, start=1):
+        calculate_game_predictions(game, standings=False, points=points)
+        if progress:
+            progress(done, len(games))
+    update_standings([game.pk for game in games])
+
+
+RESET_PREDICTION_RESULTS = {
+    "total_points": 0.0,
+    "winners": 0,
+    "runners_up": 0,
+    "third_places": 0,
+    "prize_winners": 0,
+}
+
+
+def reset_predictions(
+    predictions: QuerySet[Prediction], events: QuerySet[PredictionEvent]
+) -> tuple[int, int]:
+    """Resets the results of the predictions and the points of their
+    events with one UPDATE statement each, in one transaction.
 
-def reset_game_predictions(game: Game) -> None:
-    predictions = get_game_predictions(game)
-    for prediction in predictions:
-        reset_prediction(prediction)
+    events are the prediction events of the predictions, filtered
+    by the same scope. Returns the numbers of reset events
+    and predictions.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        events_count = events.update(
+            points=Points.NO_MATCHES.value, updated_at=now
+        )
+        predictions_count = predictions.update(
+            **RESET_PREDICTION_RESULTS, updated_at=now
+        )
+    return events_count, predictions_count
 
 
-def reset_tournament_predictions(tournament: Tournament) -> None:
-    games = get_tournament_games(tournament)
-    for game in games:
-        reset_game_predictions(game)
+def reset_prediction(
+    prediction: Prediction, standings: bool = True
+) -> tuple[int, int]:
+    counts = reset_predictions(
+        Prediction.objects.filter(pk=prediction.pk),
+        PredictionEvent.objects.filter(prediction=prediction),
+    )
+    for field, value in RESET_PREDICTION_RESULTS.items():
+        setattr(prediction, field, value)
+
+    if standings:
+        update_standings([prediction.game_id], [prediction.predictor_id])
+    return counts
+
+
+def reset_game_predictions(
+    game: Game, standings: bool = True
+) -> tuple[int, int]:
+    counts = reset_predictions(
+        Prediction.objects.filter(game=game),
+        PredictionEvent.objects.filter(prediction__game=game),
+    )
+
+    if standings:
+        update_standings([game.pk])
+    return counts
+
+
+def reset_tournament_predictions(
+    tournament: Tournament, progress: ProgressCallback | None = None
+) -> tuple[int, int]:
+    """Resets predictions for all games of the tournament.
+
+    If progress is given, it is called with the number of reset
+    predictions when they are reset.
+    """
+    counts = reset_predictions(
+        Prediction.objects.filter(tournament=tournament),
+        PredictionEvent.objects.filter(prediction__tournament=tournament),
+    )
+    if progress:
+        progress(counts[1], counts[1])
+    update_standings(
+        get_tournament_games(tournament).values_list("pk", flat=True)
+    )
+    return counts
+
+
+# Stale predictions
+
+def mark_stale_predictions(predictions: QuerySet[Prediction]) -> int:
+    """Marks the predictions and their games as stale, so that they are
+    recalculated by calculate_stale_predictions.
+
+    Returns the number of marked predictions.
+    """
+    game_ids = set(predictions.values_list("game_id", flat=True))
+    if not game_ids:
+        return 0
+    with transaction.atomic():
+        count = predictions.update(is_stale=True)
+        Game.objects.filter(pk__in=game_ids).update(is_stale=True)
+    return count
+
+
+def get_results_by_team(
+    ranked_performances: RankedPerformances
+) -> dict[Any, set[int]]:
+    """Returns podium places of the teams by team id."""
+    results = defaultdict(set)
+    for place in ranked_performances:
+        if place:
+            results[place.team_id].add(place.result)
+    return results
+
+
+def mark_game_performances_changed(
+    game: Game, old_ranked_performances: RankedPerformances
+) -> int:
+    """Marks as stale the predictions of the game whose points
+    may have changed after the podium was edited.
+
+    Points of a prediction depend only on the places of its teams,
+    so only predictions of the teams whose places changed are marked.
+    Returns the number of marked predictions.
+    """
+    old_results = get_results_by_team(old_ranked_performances)
+    new_results = get_results_by_team(
+        get_ranked_performances(get_not_null_performances_for_game(game))
+    )
+    team_ids = {
+        team_id for team_id in old_results.keys() | new_results.keys()
+        if old_results.get(team_id) != new_results.get(team_id)
+    }
+    if not team_ids:
+        return 0
+    return mark_stale_predictions(
+        Prediction.objects.filter(
+            game=game,
+            pk__in=PredictionEvent.objects.filter(
+                prediction__game=game, team_id__in=team_ids
+            ).values("prediction_id"),
+        )
+    )
+
+
+def calculate_stale_predictions(
+    games: QuerySet[Game] = None,
+    progress: ProgressCallback | None = None,
+) -> int:
+    """Recalculates only the stale predictions of the stale games
+    (of all games by default) and updates the affected standings.
+
+    If progress is given, it is called with the number of calculated
+    games and the total number of games after each game.
+
+    Returns the number of recalculated predictions.
+    """
+    if games is None:
+        games = Game.objects.all()
+    games = list(games.filter(is_stale=True))
+    points = get_tournaments_points({game.tournament_id for game in games})
+
+    count = 0
+    predictor_ids = set()
+    for done, game in enumerate(games, start=1):
+        with transaction.atomic():
+            Game.objects.filter(pk=game.pk).update(is_stale=False)
+            predictions = score_game_predictions(
+                game,
+                Prediction.objects.filter(game=game, is_stale=True),
+                PredictionEvent.objects.filter(
+                    prediction__game=game, prediction__is_stale=True
+                ),
+                points[game.tournament_id],
+            )
+        count += len(predictions)
+        predictor_ids |= {prediction.predictor_id for prediction in predictions}
+        if progress:
+            progress(done, len(games))
+
+    if predictor_ids:
+        update_standings([game.pk for game in games], predictor_ids)
+    return count
@@ -0,0 +1,132 @@
+import os
+import subprocess
+import sys
+import time
+from urllib.request import urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+from predictions.benchmarks import get_page_paths, run_http_load
+from sovabet.settings import BASE_DIR
+
+
+SERVERS = {
+    "wsgi": {
+        "args": ["sovabet.wsgi:application"],
+        "env": {"ASYNC_VIEWS": "0"},
+    },
+    "asgi": {
+        "args": [
+            "sovabet.asgi:application",
+            "--worker-class",
+            "uvicorn.workers.UvicornWorker",
+        ],
+        "env": {"ASYNC_VIEWS": "1"},
+    },
+}
+SERVER_START_TIMEOUT = 30
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает пропускную способность публичных страниц под gunicorn"
+        " с синхронными воркерами (WSGI) и с воркерами uvicorn (ASGI)."
+        " Серверы запускаются с одинаковым числом воркеров"
+        " на текущей базе данных."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=50,
+            help="Количество одновременных клиентов.",
+        )
+        parser.add_argument("--port", type=int, default=8100)
+        parser.add_argument(
+            "--url",
+            action="append",
+            metavar="NAME=URL",
+            help=(
+                "Нагрузить уже запущенный сервер вместо запуска своих."
+                " Можно указать несколько раз."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        paths = get_page_paths()
+        if len(paths) == 1:
+            raise CommandError("Нет данных для страниц. Запустите seed_data.")
+        self.stdout.write(f"Страницы: {' '.join(paths)}")
+
+        if options["url"]:
+            for target in options["url"]:
+                name, _, url = target.partition("=")
+                self.load(name, url, paths, options)
+            return
+
+        for number, (name, server) in enumerate(SERVERS.items()):
+            port = options["port"] + number
+            process = self.start_server(server, port, options["workers"])
+            try:
+                url = f"http://127.0.0.1:{port}"
+                self.wait_for_server(url, process)
+                self.load(name, url, paths, options)
+            finally:
+                process.terminate()
+                process.wait()
+
+    def start_server(self, server, port, workers):
+        allowed_hosts = os.environ.get("DJANGO_ALLOWED_HOSTS", "")
+        env = {
+            **os.environ,
+            **server["env"],
+            "DJANGO_ALLOWED_HOSTS": f"{allowed_hosts} 127.0.0.1",
+        }
+        return subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "gunicorn",
+                *server["args"],
+                "--workers",
+                str(workers),
+                "--bind",
+                f"127.0.0.1:{port}",
+                "--log-level",
+                "warning",
+            ],
+            cwd=BASE_DIR,
+            env=env,
+        )
+
+    def wait_for_server(self, url, process):
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f"Сервер {url} завершился при запуске")
+            try:
+                with urlopen(url, timeout=5) as response:
+                    response.read()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f"Сервер {url} не запустился")
+
+    def load(self, name, url, paths, options):
+        result = run_http_load(
+            name,
+            url,
+            paths,
+            requests=options["requests"],
+            concurrency=options["concurrency"],
+        )
+        self.stdout.write(
+            f"{result.name:<6} {result.requests_per_second:8.1f} запросов/с"
+            f"  p50 {result.get_latency(50):7.1f} мс"
+            f"  p95 {result.get_latency(95):7.1f} мс"
+            f"  p99 {result.get_latency(99):7.1f} мс"
+            f"  ошибок {result.errors}"
+        )
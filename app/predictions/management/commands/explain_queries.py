@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from predictions.logic import aggregate_standings
+from predictions.models import (
+    Game,
+    Performance,
+    Prediction,
+    PredictionEvent,
+    Result,
+)
+from predictions.seeding import SeedOptions, seed_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Показывает планы выполнения горячих запросов."
+        " С --seed предварительно заполняет базу синтетическими данными"
+        " и откатывает их после вывода планов."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            action="store_true",
+            help="Заполнить базу синтетическими данными на время проверки.",
+        )
+        parser.add_argument("--predictors", type=int, default=1000)
+        parser.add_argument("--games", type=int, default=10)
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="Выполнить запросы (EXPLAIN ANALYZE в PostgreSQL).",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options["seed"]:
+                counts = seed_database(
+                    SeedOptions(
+                        predictors=options["predictors"],
+                        games=options["games"],
+                    )
+                )
+                self.stdout.write(f"Создано: {counts}")
+                if connection.vendor == "postgresql":
+                    with connection.cursor() as cursor:
+                        cursor.execute("ANALYZE")
+            self.explain_queries(options["analyze"])
+            if options["seed"]:
+                transaction.set_rollback(True)
+
+    def explain_queries(self, analyze):
+        game = Game.objects.order_by("-started_at").first()
+        prediction = Prediction.objects.filter(game=game).first()
+        if game is None or prediction is None:
+            self.stderr.write("Нет игр с прогнозами. Запустите с --seed.")
+            return
+
+        queries = {
+            "Турнирная таблица игры (game, is_active)":
+                aggregate_standings({"game_id": game.pk}),
+            "Проверка дубликата прогноза (predictor, game)":
+                Prediction.objects.filter(
+                    game=game, predictor_id=prediction.predictor_id
+                ),
+            "Призёры игры (game, result)":
+                Performance.objects.filter(game=game, result=Result.WINNER),
+            "События прогноза (prediction, result)":
+                PredictionEvent.objects.filter(
+                    prediction=prediction
+                ).order_by("result"),
+        }
+        explain_options = {}
+        if analyze and connection.vendor == "postgresql":
+            explain_options = {"analyze": True, "buffers": True}
+
+        for title, queryset in queries.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write("")
@@ -0,0 +1,84 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from predictions.logic import get_tournaments_points
+from predictions.models import Game, Performance, PredictionEvent
+from predictions.scoring import (
+    EVENT_COLUMNS,
+    GAME_POINTS_COLUMNS,
+    PERFORMANCE_COLUMNS,
+    write_table,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгружает события прогнозов, выступления команд и баллы игр"
+        " в CSV или Parquet для расчёта баллов вне базы командой score_dump."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Каталог для файлов выгрузки.")
+        parser.add_argument(
+            "--format",
+            choices=("csv", "parquet"),
+            default="csv",
+            help="Формат файлов, для Parquet нужен пакет pyarrow.",
+        )
+        parser.add_argument("--season", help="ID сезона.")
+        parser.add_argument("--tournament", help="ID турнира.")
+
+    def handle(self, *args, **options):
+        events = PredictionEvent.objects.all()
+        performances = Performance.objects.filter(result__isnull=False)
+        games = Game.objects.all()
+        if options["season"]:
+            events = events.filter(prediction__season_id=options["season"])
+            performances = performances.filter(
+                game__tournament__season_id=options["season"]
+            )
+            games = games.filter(tournament__season_id=options["season"])
+        if options["tournament"]:
+            events = events.filter(
+                prediction__tournament_id=options["tournament"]
+            )
+            performances = performances.filter(
+                game__tournament_id=options["tournament"]
+            )
+            games = games.filter(tournament_id=options["tournament"])
+
+        directory = Path(options["directory"])
+        directory.mkdir(parents=True, exist_ok=True)
+        extension = options["format"]
+        events_count = write_table(
+            directory / f"events.{extension}",
+            EVENT_COLUMNS,
+            events.values_list(
+                "prediction__game_id", "prediction_id", "team_id", "result"
+            ).iterator(),
+        )
+        performances_count = write_table(
+            directory / f"performances.{extension}",
+            PERFORMANCE_COLUMNS,
+            performances.values_list("game_id", "team_id", "result").iterator(),
+        )
+        games = list(games.values_list("pk", "tournament_id"))
+        points = get_tournaments_points(
+            {tournament_id for _, tournament_id in games}
+        )
+        games_count = write_table(
+            directory / f"games.{extension}",
+            GAME_POINTS_COLUMNS,
+            (
+                (game_id, *points[tournament_id])
+                for game_id, tournament_id in games
+            ),
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Выгружено событий: {events_count},"
+                f" выступлений: {performances_count},"
+                f" игр: {games_count}"
+            )
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from predictions.logic import rebuild_standings
+
+
+class Command(BaseCommand):
+    help = "Перестраивает турнирные таблицы сезонов, турниров и игр с нуля."
+
+    def handle(self, *args, **options):
+        count = rebuild_standings()
+        self.stdout.write(
+            self.style.SUCCESS(f"Турнирные таблицы перестроены. Строк: {count}")
+        )
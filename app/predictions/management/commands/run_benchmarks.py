@@ -0,0 +1,88 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from predictions.benchmarks import (
+    find_regressions,
+    load_baseline,
+    run_benchmarks,
+    save_baseline,
+)
+from predictions.seeding import SeedOptions, seed_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет время, количество запросов и пиковую память расчёта"
+        " прогнозов, обработки сырых прогнозов, турнирных таблиц и страниц."
+        " Сравнивает результаты с сохранённым эталоном."
+        " Изменения данных откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed-data",
+            action="store_true",
+            help="Заполнить базу синтетическими данными на время замеров.",
+        )
+        SeedOptions.add_arguments(parser)
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="Количество повторов, берётся лучшее время.",
+        )
+        parser.add_argument(
+            "--only",
+            nargs="+",
+            help="Названия замеров, которые нужно выполнить.",
+        )
+        parser.add_argument(
+            "--baseline",
+            help="JSON с эталонными результатами для сравнения.",
+        )
+        parser.add_argument(
+            "--save-baseline",
+            help="Сохранить результаты как эталон в JSON.",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Допустимый рост времени и памяти относительно эталона.",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options["seed_data"]:
+                counts = seed_database(SeedOptions.from_options(options))
+                self.stdout.write(f"Создано: {counts}")
+            results = run_benchmarks(
+                repeat=options["repeat"],
+                names=options["only"],
+                callback=self.write_result,
+            )
+            transaction.set_rollback(True)
+
+        if not results:
+            raise CommandError("Нет данных для замеров. Запустите с --seed-data.")
+
+        if options["save_baseline"]:
+            save_baseline(options["save_baseline"], results)
+            self.stdout.write(f"Эталон сохранён в {options['save_baseline']}")
+
+        if options["baseline"]:
+            regressions = find_regressions(
+                results, load_baseline(options["baseline"]), options["tolerance"]
+            )
+            if regressions:
+                raise CommandError(
+                    "Результаты хуже эталона:\n" + "\n".join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS("Результаты не хуже эталона"))
+
+    def write_result(self, result):
+        self.stdout.write(
+            f"{result.name:<40} {result.seconds * 1000:10.1f} мс"
+            f" {result.queries:6} запросов"
+            f" {result.peak_memory / 1024:10.1f} КиБ"
+        )
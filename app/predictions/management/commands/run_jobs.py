@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import InterfaceError, OperationalError, close_old_connections
+
+from predictions.jobs import claim_job, run_job
+
+
+class Command(BaseCommand):
+    help = "Выполняет фоновые задачи из очереди."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Выполнить задачи, которые есть в очереди, и завершиться.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=2.0,
+            help="Пауза в секундах между проверками пустой очереди.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            try:
+                job = claim_job()
+                if job is not None:
+                    self.stdout.write(
+                        f"Задача {job.pk}: {job.get_kind_display()}"
+                    )
+                    run_job(job)
+                    self.stdout.write(
+                        f"Задача {job.pk}: {job.get_status_display()}"
+                    )
+            except (InterfaceError, OperationalError) as error:
+                # The broken connection is replaced on the next iteration,
+                # an interrupted job is taken again after the timeout
+                self.stderr.write(f"Ошибка соединения с базой: {error}")
+                job = None
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["sleep"])
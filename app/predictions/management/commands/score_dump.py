@@ -0,0 +1,79 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from predictions.scoring import (
+    DEFAULT_POINTS,
+    EVENT_COLUMNS,
+    GAME_POINTS_COLUMNS,
+    PERFORMANCE_COLUMNS,
+    RESULT_COLUMNS,
+    iter_result_rows,
+    read_table,
+    score_tables,
+    write_table,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Рассчитывает баллы прогнозов из выгрузки export_scoring_data"
+        " в CSV или Parquet, не обращаясь к базе."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("events", help="Файл событий прогнозов.")
+        parser.add_argument("performances", help="Файл выступлений команд.")
+        parser.add_argument(
+            "games",
+            nargs="?",
+            help=(
+                "Файл баллов игр. Без него игры считаются с баллами"
+                " по умолчанию."
+            ),
+        )
+        parser.add_argument(
+            "--points",
+            type=float,
+            nargs=4,
+            metavar=("WINNER", "RUNNER_UP", "THIRD_PLACE", "AWARDED"),
+            help=(
+                "Баллы за угаданные места и за попадание в призёры"
+                " для всех игр вместо баллов из файла игр."
+            ),
+        )
+        parser.add_argument(
+            "--output", help="Файл для результатов прогнозов."
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        events = read_table(options["events"], EVENT_COLUMNS)
+        performances = read_table(
+            options["performances"], PERFORMANCE_COLUMNS
+        )
+        games_points = None
+        if options["games"] and not options["points"]:
+            games_points = read_table(options["games"], GAME_POINTS_COLUMNS)
+        loaded = time.perf_counter()
+        scores = score_tables(
+            events,
+            performances,
+            options["points"] or DEFAULT_POINTS,
+            games_points,
+        )
+        scored = time.perf_counter()
+
+        if options["output"]:
+            write_table(
+                options["output"], RESULT_COLUMNS, iter_result_rows(scores)
+            )
+        self.stdout.write(
+            f"Событий: {scores.points.size},"
+            f" прогнозов: {scores.prediction_ids.size},"
+            f" сумма баллов: {scores.total_points.sum():g}"
+        )
+        self.stdout.write(
+            f"Загрузка: {loaded - started:.2f} с,"
+            f" расчёт: {scored - loaded:.2f} с"
+        )
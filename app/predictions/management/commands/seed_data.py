@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from predictions.logic import (
+    calculate_tournament_predictions,
+    rebuild_standings,
+)
+from predictions.models import Tournament
+from predictions.seeding import SeedOptions, seed_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу синтетическими сезонами, турнирами, играми,"
+        " командами, прогнозистами, прогнозами и сырыми прогнозами."
+    )
+
+    def add_arguments(self, parser):
+        SeedOptions.add_arguments(parser)
+        parser.add_argument(
+            "--calculate",
+            action="store_true",
+            help="Рассчитать прогнозы всех турниров после заполнения.",
+        )
+
+    def handle(self, *args, **options):
+        counts = seed_database(SeedOptions.from_options(options))
+        for name, count in counts.items():
+            self.stdout.write(f"{name}: {count}")
+
+        if options["calculate"]:
+            tournaments = Tournament.objects\
+                .filter(games__predictions__isnull=False)\
+                .distinct()
+            for tournament in tournaments:
+                calculate_tournament_predictions(tournament)
+                self.stdout.write(f"Рассчитан турнир {tournament}")
+        else:
+            rebuild_standings()
+        self.stdout.write(self.style.SUCCESS("База заполнена"))
@@ -0,0 +1,88 @@
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from predictions.logic import STANDINGS_ORDERING
+from predictions.models import Season, Tournament
+from predictions.simulation import simulate_standings
+
+
+class Command(BaseCommand):
+    help = (
+        "Показывает, какой была бы турнирная таблица сезона или турнира"
+        " при других баллах или другом порядке сортировки."
+        " Ничего не записывает в базу."
+    )
+
+    def add_arguments(self, parser):
+        scope = parser.add_mutually_exclusive_group(required=True)
+        scope.add_argument("--season", help="ID сезона.")
+        scope.add_argument("--tournament", help="ID турнира.")
+        parser.add_argument(
+            "--points",
+            type=float,
+            nargs=4,
+            metavar=("WINNER", "RUNNER_UP", "THIRD_PLACE", "AWARDED"),
+            help=(
+                "Баллы за угаданные места и за попадание в призёры."
+                " По умолчанию - схемы баллов турниров."
+            ),
+        )
+        parser.add_argument(
+            "--ordering",
+            nargs="+",
+            default=STANDINGS_ORDERING,
+            help=(
+                "Поля сортировки таблицы, с минусом по убыванию."
+                f" По умолчанию: {' '.join(STANDINGS_ORDERING)}"
+            ),
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=20,
+            help="Количество строк вывода, 0 - все.",
+        )
+
+    def handle(self, *args, **options):
+        if options["season"]:
+            model, pk = Season, options["season"]
+        else:
+            model, pk = Tournament, options["tournament"]
+        try:
+            object = model.objects.get(pk=pk)
+        except (model.DoesNotExist, ValidationError, ValueError):
+            raise CommandError(f"Не найден объект с ID {pk}")
+
+        started = time.perf_counter()
+        try:
+            standings = simulate_standings(
+                object, options["points"], options["ordering"]
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        elapsed = time.perf_counter() - started
+
+        moved = sum(
+            row["position"] != row["current_position"] for row in standings
+        )
+        self.stdout.write(
+            f"{object}: прогнозистов {len(standings)},"
+            f" изменили место {moved}, расчёт {elapsed:.2f} с"
+        )
+        rows = standings[:options["limit"]] if options["limit"] else standings
+        for row in rows:
+            current_position = row["current_position"]
+            if current_position is None:
+                change = "нов"
+            else:
+                change = f"{current_position - row['position']:+d}"
+            current_points = row["current_total_points"]
+            self.stdout.write(
+                f"{row['position']:>4} {change:>5}"
+                f"  {row['predictor__name']:<30}"
+                f" {row['count']:>4}"
+                f" {row['total_points']:>7g}"
+                f" (было {'-' if current_points is None else f'{current_points:g}'})"
+            )
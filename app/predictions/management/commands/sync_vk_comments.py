@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db.models.query_utils import Q
+
+from predictions.logic import is_valid_uuid, sync_vk_comments
+from predictions.models import Game
+from predictions.vk_api import get_vk_client
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает новые комментарии к постам игр из VK"
+        " и сохраняет их как сырые прогнозы."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "games",
+            nargs="*",
+            help="ID или названия игр. По умолчанию все активные игры.",
+        )
+
+    def handle(self, *args, **options):
+        games = Game.objects.filter(vk_post_id__isnull=False)
+        if options["games"]:
+            games = games.filter(
+                Q(pk__in=[
+                    game for game in options["games"] if is_valid_uuid(game)
+                ])
+                | Q(name__in=options["games"])
+            )
+        else:
+            games = games.filter(is_active=True)
+
+        client = get_vk_client()
+        stats_before = client.stats
+        created = sync_vk_comments(games)
+        self.stdout.write(
+            self.style.SUCCESS(f"Создано сырых прогнозов: {created}")
+        )
+        stats = {
+            name: count - stats_before[name]
+            for name, count in client.stats.items()
+        }
+        self.stdout.write(
+            f"Вызовов VK API: {stats['calls']}, повторов: {stats['retries']},"
+            f" ошибок: {stats['failures']}"
+        )
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+from predictions.models import RequestSample
+from predictions.request_stats import (
+    QueryRecorder,
+    current_recorder,
+    install_query_recorder,
+    request_samples,
+)
+from sovabet.settings import REQUEST_STATS_ENABLED
+
+
+class RequestStatsMiddleware:
+    """Records latency, the number of SQL queries, SQL time and slow
+    queries of every request by URL name.
+
+    Requests not matching any URL are skipped. Works both under WSGI
+    and ASGI, so async views are not pushed back into a thread.
+    The recorder of the request is kept in a context variable, which
+    sync_to_async carries over to the thread running the queries.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not REQUEST_STATS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # Connections opened before the receiver was connected
+        for connection in connections.all():
+            install_query_recorder(None, connection)
+        if asyncio.iscoroutinefunction(self.get_response):
+            # Mark the instance as a coroutine function for the handler.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        created_at = timezone.now()
+        started = time.perf_counter()
+        token = current_recorder.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        self.add_sample(request, response, recorder, created_at, started)
+        request_samples.flush()
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        created_at = timezone.now()
+        started = time.perf_counter()
+        token = current_recorder.set(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        self.add_sample(request, response, recorder, created_at, started)
+        if request_samples.is_due():
+            await sync_to_async(request_samples.flush)()
+        return response
+
+    def add_sample(self, request, response, recorder, created_at, started):
+        duration = (time.perf_counter() - started) * 1000
+        match = request.resolver_match
+        if match is None:
+            return
+        request_samples.add(
+            RequestSample(
+                view_name=match.view_name[:200],
+                method=request.method[:10],
+                status_code=response.status_code,
+                duration=duration,
+                queries=recorder.count,
+                sql_duration=recorder.duration,
+                slow_queries=recorder.slow_queries,
+                created_at=created_at,
+            )
+        )
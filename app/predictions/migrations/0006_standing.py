@@ -0,0 +1,129 @@
+# Generated by Django 4.0.10 on 2026-10-18 00:18
+
+from django.db import migrations, models
+from django.db.models.aggregates import Count, Sum
+import django.db.models.deletion
+
+
+STANDINGS_FIELDS = (
+    'count',
+    'prize_winners',
+    'third_places',
+    'runners_up',
+    'winners',
+    'total_points',
+)
+STANDINGS_ORDERING = (
+    '-total_points',
+    'count',
+    '-winners',
+    '-runners_up',
+    '-third_places',
+    '-prize_winners',
+    'predictor__name',
+)
+
+
+def fill_standings(apps, schema_editor):
+    """Fills standings of all seasons, tournaments and games
+    from the existing predictions.
+    """
+    Game = apps.get_model('predictions', 'Game')
+    Prediction = apps.get_model('predictions', 'Prediction')
+    Season = apps.get_model('predictions', 'Season')
+    Standing = apps.get_model('predictions', 'Standing')
+    Tournament = apps.get_model('predictions', 'Tournament')
+    scopes = [
+        ('season_id', 'game__tournament__season_id', pk)
+        for pk in Season.objects.values_list('pk', flat=True)
+    ] + [
+        ('tournament_id', 'game__tournament_id', pk)
+        for pk in Tournament.objects.values_list('pk', flat=True)
+    ] + [
+        ('game_id', 'game_id', pk)
+        for pk in Game.objects.values_list('pk', flat=True)
+    ]
+
+    for scope_field, lookup, scope_id in scopes:
+        rows = Prediction.objects\
+            .filter(**{lookup: scope_id}, is_active=True)\
+            .values('predictor__id', 'predictor__name')\
+            .annotate(
+                count=Count('pk'),
+                prize_winners=Sum('prize_winners'),
+                third_places=Sum('third_places'),
+                runners_up=Sum('runners_up'),
+                winners=Sum('winners'),
+                total_points=Sum('total_points'),
+            ).order_by(*STANDINGS_ORDERING)
+        Standing.objects.bulk_create([
+            Standing(
+                **{scope_field: scope_id},
+                predictor_id=row['predictor__id'],
+                position=position,
+                **{field: row[field] for field in STANDINGS_FIELDS},
+            )
+            for position, row in enumerate(rows, start=1)
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictions', '0005_game_vk_post_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Standing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(default=0, verbose_name='место')),
+                ('count', models.IntegerField(default=0, verbose_name='количество прогнозов')),
+                ('total_points', models.FloatField(default=0.0, verbose_name='сумма баллов')),
+                ('winners', models.IntegerField(default=0, verbose_name='угадано победителей')),
+                ('runners_up', models.IntegerField(default=0, verbose_name='угадано вторых призёров')),
+                ('third_places', models.IntegerField(default=0, verbose_name='угадано третьих призёров')),
+                ('prize_winners', models.IntegerField(default=0, verbose_name='угадано попаданий в призёры')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='изменение')),
+                ('game', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='predictions.game', verbose_name='игра')),
+                ('predictor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='predictions.predictor', verbose_name='прогнозист')),
+                ('season', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='predictions.season', verbose_name='сезон')),
+                ('tournament', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='predictions.tournament', verbose_name='турнир')),
+            ],
+            options={
+                'verbose_name': 'позиция в турнирной таблице',
+                'verbose_name_plural': 'турнирные таблицы',
+                'ordering': ('position',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='standing',
+            index=models.Index(fields=['season', 'position'], name='standing_season_position_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='standing',
+            index=models.Index(fields=['tournament', 'position'], name='standing_tournament_pos_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='standing',
+            index=models.Index(fields=['game', 'position'], name='standing_game_position_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='standing',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('game__isnull', True), ('season__isnull', False), ('tournament__isnull', True)), models.Q(('game__isnull', True), ('season__isnull', True), ('tournament__isnull', False)), models.Q(('game__isnull', False), ('season__isnull', True), ('tournament__isnull', True)), _connector='OR'), name='standing_has_one_scope'),
+        ),
+        migrations.AddConstraint(
+            model_name='standing',
+            constraint=models.UniqueConstraint(condition=models.Q(('season__isnull', False)), fields=('season', 'predictor'), name='unique_season_standing'),
+        ),
+        migrations.AddConstraint(
+            model_name='standing',
+            constraint=models.UniqueConstraint(condition=models.Q(('tournament__isnull', False)), fields=('tournament', 'predictor'), name='unique_tournament_standing'),
+        ),
+        migrations.AddConstraint(
+            model_name='standing',
+            constraint=models.UniqueConstraint(condition=models.Q(('game__isnull', False)), fields=('game', 'predictor'), name='unique_game_standing'),
+        ),
+        migrations.RunPython(fill_standings, migrations.RunPython.noop),
+    ]
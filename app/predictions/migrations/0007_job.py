@@ -0,0 +1,40 @@
+# Generated by Django 4.0.10 on 2026-10-18 00:21
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictions', '0006_standing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('calculate_tournament', 'Расчёт турнира'), ('reset_tournament', 'Сброс турнира'), ('calculate_game', 'Расчёт игры'), ('reset_game', 'Сброс игры'), ('process_raw_predictions', 'Обработка сырых прогнозов')], max_length=50, verbose_name='тип')),
+                ('object_id', models.CharField(blank=True, max_length=50, verbose_name='ID объекта')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='параметры')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Выполнена'), ('failed', 'Ошибка')], default='pending', max_length=20, verbose_name='статус')),
+                ('progress', models.IntegerField(default=0, verbose_name='выполнено')),
+                ('total', models.IntegerField(default=0, verbose_name='всего')),
+                ('message', models.TextField(blank=True, verbose_name='сообщение')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='создание')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='изменение')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='начало')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='окончание')),
+            ],
+            options={
+                'verbose_name': 'задача',
+                'verbose_name_plural': 'задачи',
+                'ordering': ('-created_at',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', 'created_at'], name='job_status_created_at_idx'),
+        ),
+    ]
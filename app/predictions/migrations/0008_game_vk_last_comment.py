@@ -0,0 +1,27 @@
+# Generated by Django 4.0.10 on 2026-10-18 00:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictions', '0007_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='vk_last_comment_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='дата последнего комментария'),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='vk_last_comment_id',
+            field=models.IntegerField(blank=True, null=True, verbose_name='ID последнего комментария'),
+        ),
+        migrations.AddIndex(
+            model_name='rawprediction',
+            index=models.Index(fields=['game', 'vk_id'], name='rawprediction_game_vk_id_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.0.10 on 2026-10-18 00:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictions', '0008_game_vk_last_comment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='версия'),
+        ),
+        migrations.AddField(
+            model_name='season',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='версия'),
+        ),
+        migrations.AddField(
+            model_name='tournament',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='версия'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.0.10 on 2026-10-18 00:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictions', '0009_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='changed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='изменение данных'),
+        ),
+        migrations.AddField(
+            model_name='season',
+            name='changed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='изменение данных'),
+        ),
+        migrations.AddField(
+            model_name='tournament',
+            name='changed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='изменение данных'),
+        ),
+    ]
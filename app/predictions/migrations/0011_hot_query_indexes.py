@@ -0,0 +1,67 @@
+# Generated by Django 4.0.10 on 2026-10-18 00:27
+
+from django.db import migrations, models
+from django.db.models.aggregates import Count
+import django.db.models.functions.text
+
+
+def check_duplicate_predictions(apps, schema_editor):
+    """Stops the migration if a predictor has several predictions
+    for one game, since the unique constraint can't be created then.
+    """
+    Prediction = apps.get_model('predictions', 'Prediction')
+    duplicates = Prediction.objects\
+        .values('predictor_id', 'game_id')\
+        .annotate(count=Count('pk'))\
+        .filter(count__gt=1)\
+        .order_by()
+    if duplicates:
+        lines = '\n'.join(
+            f"predictor {row['predictor_id']}, game {row['game_id']}: {row['count']}"
+            for row in duplicates
+        )
+        raise RuntimeError(
+            'Remove duplicate predictions before applying the migration:\n'
+            + lines
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictions', '0010_changed_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='game_lower_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='performance',
+            index=models.Index(fields=['game', 'result'], name='performance_game_result_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prediction',
+            index=models.Index(fields=['game', 'is_active'], name='prediction_game_is_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='predictionevent',
+            index=models.Index(fields=['prediction', 'result'], name='event_prediction_result_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='predictor',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='predictor_lower_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='team',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='team_lower_name_idx'),
+        ),
+        migrations.RunPython(
+            check_duplicate_predictions, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='prediction',
+            constraint=models.UniqueConstraint(fields=('predictor', 'game'), name='unique_prediction_predictor_game'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.0.10 on 2026-10-18 00:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_prediction_scopes(apps, schema_editor):
+    Game = apps.get_model('predictions', 'Game')
+    Prediction = apps.get_model('predictions', 'Prediction')
+    games = Game.objects.values_list(
+        'pk', 'tournament_id', 'tournament__season_id'
+    )
+    for game_id, tournament_id, season_id in games:
+        Prediction.objects.filter(game_id=game_id).update(
+            tournament_id=tournament_id, season_id=season_id
+        )
+
+
+class Migration(migrations.Migration):
+    # On PostgreSQL the NOT NULL constraints can't be added in the same
+    # transaction as the updates of the new foreign keys ("pending trigger
+    # events"), so the copy is committed in its own transaction first
+    atomic = False
+
+    dependencies = [
+        ('predictions', '0011_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prediction',
+            name='season',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='predictions', to='predictions.season', verbose_name='сезон'),
+        ),
+        migrations.AddField(
+            model_name='prediction',
+            name='tournament',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='predictions', to='predictions.tournament', verbose_name='турнир'),
+        ),
+        migrations.RunPython(
+            copy_prediction_scopes, migrations.RunPython.noop, atomic=True
+        ),
+        migrations.AlterField(
+            model_name='prediction',
+            name='season',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='predictions', to='predictions.season', verbose_name='сезон'),
+        ),
+        migrations.AlterField(
+            model_name='prediction',
+            name='tournament',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='predictions', to='predictions.tournament', verbose_name='турнир'),
+        ),
+        migrations.AddIndex(
+            model_name='prediction',
+            index=models.Index(fields=['tournament', 'is_active'], name='prediction_tourn_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prediction',
+            index=models.Index(fields=['season', 'is_active'], name='prediction_season_active_idx'),
+        ),
+    ]
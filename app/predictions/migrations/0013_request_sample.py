@@ -0,0 +1,41 @@
+# Generated by Django 4.0.10 on 2026-10-18 00:35
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictions', '0012_prediction_scope'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('view_name', models.CharField(max_length=200, verbose_name='представление')),
+                ('method', models.CharField(max_length=10, verbose_name='метод')),
+                ('status_code', models.PositiveSmallIntegerField(verbose_name='код ответа')),
+                ('duration', models.FloatField(verbose_name='время, мс')),
+                ('queries', models.PositiveIntegerField(verbose_name='запросов SQL')),
+                ('sql_duration', models.FloatField(verbose_name='время SQL, мс')),
+                ('slow_queries', models.JSONField(blank=True, default=list, verbose_name='медленные запросы')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='время запроса')),
+            ],
+            options={
+                'verbose_name': 'замер запроса',
+                'verbose_name_plural': 'замеры запросов',
+                'ordering': ('-created_at',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='requestsample',
+            index=models.Index(fields=['created_at'], name='requestsample_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='requestsample',
+            index=models.Index(fields=['view_name', 'created_at'], name='requestsample_view_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.0.10 on 2026-10-18 00:42
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def seed_vk_profiles(apps, schema_editor):
+    """Fills the profile cache with names of predictors with VK IDs."""
+    Predictor = apps.get_model('predictions', 'Predictor')
+    VkProfile = apps.get_model('predictions', 'VkProfile')
+    now = django.utils.timezone.now()
+    VkProfile.objects.bulk_create(
+        (
+            VkProfile(vk_id=vk_id, name=name, fetched_at=now)
+            for vk_id, name in Predictor.objects
+            .filter(vk_id__isnull=False)
+            .values_list('vk_id', 'name')
+            .iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictions', '0013_request_sample'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VkProfile',
+            fields=[
+                ('vk_id', models.IntegerField(primary_key=True, serialize=False, verbose_name='VK ID')),
+                ('name', models.CharField(max_length=100, verbose_name='имя')),
+                ('fetched_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='загружен')),
+            ],
+            options={
+                'verbose_name': 'профиль VK',
+                'verbose_name_plural': 'профили VK',
+                'ordering': ('name',),
+            },
+        ),
+        migrations.RunPython(seed_vk_profiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.0.10 on 2026-10-18 00:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictions', '0014_vk_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Alias',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='создание')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='изменение')),
+                ('is_active', models.BooleanField(default=True, verbose_name='актив?')),
+                ('name', models.CharField(max_length=50, verbose_name='название')),
+                ('game', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='predictions.game', verbose_name='игра')),
+                ('predictor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='predictions.predictor', verbose_name='прогнозист')),
+                ('team', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='predictions.team', verbose_name='команда')),
+            ],
+            options={
+                'verbose_name': 'псевдоним',
+                'verbose_name_plural': 'псевдонимы',
+                'ordering': ('name',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='alias',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('game__isnull', True), ('predictor__isnull', True), ('team__isnull', False)), models.Q(('game__isnull', False), ('predictor__isnull', True), ('team__isnull', True)), models.Q(('game__isnull', True), ('predictor__isnull', False), ('team__isnull', True)), _connector='OR'), name='alias_has_one_object'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.0.10 on 2026-10-18 00:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictions', '0015_alias'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rawprediction',
+            name='prediction',
+            field=models.OneToOneField(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='raw_prediction', to='predictions.prediction', verbose_name='прогноз'),
+        ),
+    ]
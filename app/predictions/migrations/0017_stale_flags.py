@@ -0,0 +1,36 @@
+# Generated by Django 4.0.10 on 2026-10-18 00:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictions', '0016_raw_prediction_link'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='is_stale',
+            field=models.BooleanField(default=False, editable=False, verbose_name='требует пересчёта'),
+        ),
+        migrations.AddField(
+            model_name='prediction',
+            name='is_stale',
+            field=models.BooleanField(default=False, editable=False, verbose_name='требует пересчёта'),
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(choices=[('calculate_tournament', 'Расчёт турнира'), ('reset_tournament', 'Сброс турнира'), ('calculate_game', 'Расчёт игры'), ('reset_game', 'Сброс игры'), ('process_raw_predictions', 'Обработка сырых прогнозов'), ('calculate_stale', 'Пересчёт изменённых прогнозов')], max_length=50, verbose_name='тип'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(condition=models.Q(('is_stale', True)), fields=['is_stale'], name='game_is_stale_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prediction',
+            index=models.Index(condition=models.Q(('is_stale', True)), fields=['game', 'is_stale'], name='prediction_game_is_stale_idx'),
+        ),
+    ]
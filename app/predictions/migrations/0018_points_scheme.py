@@ -0,0 +1,40 @@
+# Generated by Django 4.0.10 on 2026-10-18 01:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictions', '0017_stale_flags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointsScheme',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='создание')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='изменение')),
+                ('is_active', models.BooleanField(default=True, verbose_name='актив?')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='название')),
+                ('info', models.TextField(blank=True, verbose_name='информация')),
+                ('winner', models.FloatField(default=4, verbose_name='баллы за победителя')),
+                ('runner_up', models.FloatField(default=3, verbose_name='баллы за второе место')),
+                ('third_place', models.FloatField(default=3, verbose_name='баллы за третье место')),
+                ('awarded', models.FloatField(default=2, verbose_name='баллы за попадание в призёры')),
+            ],
+            options={
+                'verbose_name': 'схема баллов',
+                'verbose_name_plural': 'схемы баллов',
+                'ordering': ('name',),
+            },
+        ),
+        migrations.AddField(
+            model_name='tournament',
+            name='points_scheme',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='tournaments', to='predictions.pointsscheme', verbose_name='схема баллов'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.0.10 on 2026-10-18 01:21
+
+from django.db import migrations, models
+
+
+def fill_vk_post_ids(apps, schema_editor):
+    """Links the raw predictions synced from VK to the posts
+    of their games by the game names they were saved with.
+    """
+    Game = apps.get_model('predictions', 'Game')
+    RawPrediction = apps.get_model('predictions', 'RawPrediction')
+    games = Game.objects\
+        .filter(vk_post_id__isnull=False)\
+        .values_list('name', 'vk_post_id')
+    for name, vk_post_id in games:
+        RawPrediction.objects.filter(
+            game=name, vk_id__isnull=False, vk_post_id__isnull=True
+        ).update(vk_post_id=vk_post_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictions', '0018_points_scheme'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='rawprediction',
+            name='rawprediction_game_vk_id_idx',
+        ),
+        migrations.AddField(
+            model_name='rawprediction',
+            name='vk_comment_id',
+            field=models.IntegerField(blank=True, editable=False, null=True, verbose_name='ID комментария'),
+        ),
+        migrations.AddField(
+            model_name='rawprediction',
+            name='vk_post_id',
+            field=models.IntegerField(blank=True, editable=False, null=True, verbose_name='ID поста'),
+        ),
+        migrations.AddIndex(
+            model_name='rawprediction',
+            index=models.Index(fields=['vk_post_id', 'vk_id'], name='rawprediction_post_vk_id_idx'),
+        ),
+        migrations.RunPython(fill_vk_post_ids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.0.10 on 2026-10-18 01:44
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictions', '0019_raw_prediction_vk_comment'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='game',
+            name='game_lower_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='predictor',
+            name='predictor_lower_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='team',
+            name='team_lower_name_idx',
+        ),
+    ]
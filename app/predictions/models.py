@@ -2,6 +2,9 @@ import uuid
 
 from django.db import models
 from django.urls import reverse
+from django.utils import timezone
+
+from predictions.scoring import DEFAULT_POINTS, ScoringPoints
 
 
 class Result(models.IntegerChoices):
@@ -34,6 +37,12 @@ class GeneralInfoAbstractModel(BaseAbstractModel):
 
 class StartedAtAbstractModel(GeneralInfoAbstractModel):
     started_at = models.DateTimeField("начало", blank=True, null=True)
+    version = models.PositiveIntegerField(
+        "версия", default=0, editable=False
+    )
+    changed_at = models.DateTimeField(
+        "изменение данных", blank=True, null=True, editable=False
+    )
 
     class Meta:
         abstract = True
@@ -52,6 +61,37 @@ class Season(StartedAtAbstractModel):
         )
 
 
+class PointsScheme(GeneralInfoAbstractModel):
+    """Points for guessed places and awarded teams in the games
+    of the tournaments with the scheme.
+
+    Tournaments without an active scheme are scored with
+    the default points.
+    """
+    winner = models.FloatField(
+        "баллы за победителя", default=DEFAULT_POINTS.winner
+    )
+    runner_up = models.FloatField(
+        "баллы за второе место", default=DEFAULT_POINTS.runner_up
+    )
+    third_place = models.FloatField(
+        "баллы за третье место", default=DEFAULT_POINTS.third_place
+    )
+    awarded = models.FloatField(
+        "баллы за попадание в призёры", default=DEFAULT_POINTS.awarded
+    )
+
+    class Meta:
+        verbose_name = "схема баллов"
+        verbose_name_plural = "схемы баллов"
+        ordering = ("name", )
+
+    def get_points(self) -> ScoringPoints:
+        return ScoringPoints(
+            self.winner, self.runner_up, self.third_place, self.awarded
+        )
+
+
 class Tournament(StartedAtAbstractModel):
     season = models.ForeignKey(
         Season,
@@ -59,6 +99,14 @@ class Tournament(StartedAtAbstractModel):
         related_name="tournaments",
         verbose_name="сезон",
     )
+    points_scheme = models.ForeignKey(
+        PointsScheme,
+        on_delete=models.PROTECT,
+        related_name="tournaments",
+        verbose_name="схема баллов",
+        blank=True,
+        null=True,
+    )
 
     class Meta:
         verbose_name = "турнир"
@@ -92,10 +140,26 @@ class Game(StartedAtAbstractModel):
         through="Performance",
     )
     vk_post_id = models.IntegerField("ID поста", blank=True, null=True, unique=True)
+    vk_last_comment_id = models.IntegerField(
+        "ID последнего комментария", blank=True, null=True
+    )
+    vk_last_comment_at = models.DateTimeField(
+        "дата последнего комментария", blank=True, null=True
+    )
+    is_stale = models.BooleanField(
+        "требует пересчёта", default=False, editable=False
+    )
 
     class Meta:
         verbose_name = "игра"
         verbose_name_plural = "игры"
+        indexes = [
+            models.Index(
+                fields=("is_stale", ),
+                name="game_is_stale_idx",
+                condition=models.Q(is_stale=True),
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.name} :: {self.tournament}"
@@ -127,6 +191,12 @@ class Performance(BaseAbstractModel):
     class Meta:
         verbose_name = "выступление"
         verbose_name_plural = "выступления"
+        indexes = [
+            models.Index(
+                fields=("game", "result"),
+                name="performance_game_result_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         output = f"#{self.pk}. Команда {self.team} в игре {self.game}"
@@ -145,6 +215,21 @@ class Predictor(GeneralInfoAbstractModel):
         ordering = ("name", )
 
 
+class VkProfile(models.Model):
+    """Cached name of a VK user, refreshed after VK_PROFILE_TTL_DAYS."""
+    vk_id = models.IntegerField("VK ID", primary_key=True)
+    name = models.CharField("имя", max_length=100)
+    fetched_at = models.DateTimeField("загружен", default=timezone.now)
+
+    class Meta:
+        verbose_name = "профиль VK"
+        verbose_name_plural = "профили VK"
+        ordering = ("name", )
+
+    def __str__(self) -> str:
+        return f"{self.name} ({self.vk_id})"
+
+
 class Prediction(BaseAbstractModel):
     predictor = models.ForeignKey(
         Predictor,
@@ -158,6 +243,20 @@ class Prediction(BaseAbstractModel):
         related_name="predictions",
         verbose_name="игра",
     )
+    tournament = models.ForeignKey(
+        Tournament,
+        on_delete=models.CASCADE,
+        related_name="predictions",
+        verbose_name="турнир",
+        editable=False,
+    )
+    season = models.ForeignKey(
+        Season,
+        on_delete=models.CASCADE,
+        related_name="predictions",
+        verbose_name="сезон",
+        editable=False,
+    )
     datetime = models.DateTimeField("дата и время", blank=True, null=True)
     total_points = models.FloatField("сумма баллов", default=0.0)
     winners = models.IntegerField("угадано победителей", default=0)
@@ -166,15 +265,55 @@ class Prediction(BaseAbstractModel):
     prize_winners = models.IntegerField(
         "угадано попаданий в призёры", default=0
     )
+    is_stale = models.BooleanField(
+        "требует пересчёта", default=False, editable=False
+    )
 
     class Meta:
         verbose_name = "прогноз"
         verbose_name_plural = "прогнозы"
         ordering = ("-datetime", "-created_at")
+        constraints = [
+            models.UniqueConstraint(
+                fields=("predictor", "game"),
+                name="unique_prediction_predictor_game",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=("game", "is_active"),
+                name="prediction_game_is_active_idx",
+            ),
+            models.Index(
+                fields=("tournament", "is_active"),
+                name="prediction_tourn_active_idx",
+            ),
+            models.Index(
+                fields=("season", "is_active"),
+                name="prediction_season_active_idx",
+            ),
+            models.Index(
+                fields=("game", "is_stale"),
+                name="prediction_game_is_stale_idx",
+                condition=models.Q(is_stale=True),
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"Прогноз {self.predictor} на игру {self.game}"
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "game" in update_fields:
+            self.set_scope()
+        super().save(*args, **kwargs)
+
+    def set_scope(self) -> None:
+        """Copies the tournament and the season from the game."""
+        self.tournament_id, self.season_id = Game.objects\
+            .values_list("tournament_id", "tournament__season_id")\
+            .get(pk=self.game_id)
+
 
 class PredictionEvent(BaseAbstractModel):
     prediction = models.ForeignKey(
@@ -198,6 +337,12 @@ class PredictionEvent(BaseAbstractModel):
     class Meta:
         verbose_name = "событие прогноза"
         verbose_name_plural = "события прогноза"
+        indexes = [
+            models.Index(
+                fields=("prediction", "result"),
+                name="event_prediction_result_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.team} >> {self.result}"
@@ -216,10 +361,284 @@ class RawPrediction(BaseAbstractModel):
     runner_up = models.CharField("второй призёр", max_length=50, blank=True)
     third_place = models.CharField("третий призёр", max_length=50, blank=True)
     note = models.TextField("примечание", blank=True)
+    vk_post_id = models.IntegerField(
+        "ID поста", blank=True, null=True, editable=False
+    )
+    vk_comment_id = models.IntegerField(
+        "ID комментария", blank=True, null=True, editable=False
+    )
+    prediction = models.OneToOneField(
+        Prediction,
+        on_delete=models.SET_NULL,
+        related_name="raw_prediction",
+        verbose_name="прогноз",
+        blank=True,
+        null=True,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = "сырой прогноз"
         verbose_name_plural = "сырые прогнозы"
+        indexes = [
+            models.Index(
+                fields=("vk_post_id", "vk_id"),
+                name="rawprediction_post_vk_id_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"Сырой прогноз {self.name} на игру {self.game}"
+
+
+class Alias(BaseAbstractModel):
+    """Another spelling of a team, game or predictor name,
+    such as a nickname or an old name.
+
+    Exactly one of team, game and predictor is set.
+    """
+    name = models.CharField("название", max_length=50)
+    team = models.ForeignKey(
+        Team,
+        on_delete=models.CASCADE,
+        related_name="aliases",
+        verbose_name="команда",
+        blank=True,
+        null=True,
+    )
+    game = models.ForeignKey(
+        Game,
+        on_delete=models.CASCADE,
+        related_name="aliases",
+        verbose_name="игра",
+        blank=True,
+        null=True,
+    )
+    predictor = models.ForeignKey(
+        Predictor,
+        on_delete=models.CASCADE,
+        related_name="aliases",
+        verbose_name="прогнозист",
+        blank=True,
+        null=True,
+    )
+
+    class Meta:
+        verbose_name = "псевдоним"
+        verbose_name_plural = "псевдонимы"
+        ordering = ("name", )
+        constraints = [
+            models.CheckConstraint(
+                check=(
+                    models.Q(
+                        team__isnull=False,
+                        game__isnull=True,
+                        predictor__isnull=True,
+                    )
+                    | models.Q(
+                        team__isnull=True,
+                        game__isnull=False,
+                        predictor__isnull=True,
+                    )
+                    | models.Q(
+                        team__isnull=True,
+                        game__isnull=True,
+                        predictor__isnull=False,
+                    )
+                ),
+                name="alias_has_one_object",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.name} → {self.team or self.game or self.predictor}"
+
+
+class Standing(models.Model):
+    """Precomputed standings row of a predictor.
+
+    Exactly one of season, tournament and game is set.
+    """
+    season = models.ForeignKey(
+        Season,
+        on_delete=models.CASCADE,
+        related_name="standings",
+        verbose_name="сезон",
+        blank=True,
+        null=True,
+    )
+    tournament = models.ForeignKey(
+        Tournament,
+        on_delete=models.CASCADE,
+        related_name="standings",
+        verbose_name="турнир",
+        blank=True,
+        null=True,
+    )
+    game = models.ForeignKey(
+        Game,
+        on_delete=models.CASCADE,
+        related_name="standings",
+        verbose_name="игра",
+        blank=True,
+        null=True,
+    )
+    predictor = models.ForeignKey(
+        Predictor,
+        on_delete=models.CASCADE,
+        related_name="standings",
+        verbose_name="прогнозист",
+    )
+    position = models.PositiveIntegerField("место", default=0)
+    count = models.IntegerField("количество прогнозов", default=0)
+    total_points = models.FloatField("сумма баллов", default=0.0)
+    winners = models.IntegerField("угадано победителей", default=0)
+    runners_up = models.IntegerField("угадано вторых призёров", default=0)
+    third_places = models.IntegerField("угадано третьих призёров", default=0)
+    prize_winners = models.IntegerField(
+        "угадано попаданий в призёры", default=0
+    )
+    updated_at = models.DateTimeField("изменение", auto_now=True)
+
+    class Meta:
+        verbose_name = "позиция в турнирной таблице"
+        verbose_name_plural = "турнирные таблицы"
+        ordering = ("position", )
+        constraints = [
+            models.CheckConstraint(
+                check=(
+                    models.Q(
+                        season__isnull=False,
+                        tournament__isnull=True,
+                        game__isnull=True,
+                    )
+                    | models.Q(
+                        season__isnull=True,
+                        tournament__isnull=False,
+                        game__isnull=True,
+                    )
+                    | models.Q(
+                        season__isnull=True,
+                        tournament__isnull=True,
+                        game__isnull=False,
+                    )
+                ),
+                name="standing_has_one_scope",
+            ),
+            models.UniqueConstraint(
+                fields=("season", "predictor"),
+                condition=models.Q(season__isnull=False),
+                name="unique_season_standing",
+            ),
+            models.UniqueConstraint(
+                fields=("tournament", "predictor"),
+                condition=models.Q(tournament__isnull=False),
+                name="unique_tournament_standing",
+            ),
+            models.UniqueConstraint(
+                fields=("game", "predictor"),
+                condition=models.Q(game__isnull=False),
+                name="unique_game_standing",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=("season", "position"),
+                name="standing_season_position_idx",
+            ),
+            models.Index(
+                fields=("tournament", "position"),
+                name="standing_tournament_pos_idx",
+            ),
+            models.Index(
+                fields=("game", "position"),
+                name="standing_game_position_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.position}. {self.predictor}"
+
+
+class Job(models.Model):
+    """Background job processed by the run_jobs worker."""
+
+    class Kind(models.TextChoices):
+        CALCULATE_TOURNAMENT = "calculate_tournament", "Расчёт турнира"
+        RESET_TOURNAMENT = "reset_tournament", "Сброс турнира"
+        CALCULATE_GAME = "calculate_game", "Расчёт игры"
+        RESET_GAME = "reset_game", "Сброс игры"
+        PROCESS_RAW_PREDICTIONS = (
+            "process_raw_predictions", "Обработка сырых прогнозов"
+        )
+        CALCULATE_STALE = "calculate_stale", "Пересчёт изменённых прогнозов"
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "В очереди"
+        RUNNING = "running", "Выполняется"
+        DONE = "done", "Выполнена"
+        FAILED = "failed", "Ошибка"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField("тип", max_length=50, choices=Kind.choices)
+    object_id = models.CharField("ID объекта", max_length=50, blank=True)
+    payload = models.JSONField("параметры", default=dict, blank=True)
+    status = models.CharField(
+        "статус",
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+    progress = models.IntegerField("выполнено", default=0)
+    total = models.IntegerField("всего", default=0)
+    message = models.TextField("сообщение", blank=True)
+    created_at = models.DateTimeField("создание", auto_now_add=True)
+    updated_at = models.DateTimeField("изменение", auto_now=True)
+    started_at = models.DateTimeField("начало", blank=True, null=True)
+    finished_at = models.DateTimeField("окончание", blank=True, null=True)
+
+    class Meta:
+        verbose_name = "задача"
+        verbose_name_plural = "задачи"
+        ordering = ("-created_at", )
+        indexes = [
+            models.Index(
+                fields=("status", "created_at"),
+                name="job_status_created_at_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.get_kind_display()} ({self.get_status_display()})"
+
+
+class RequestSample(models.Model):
+    """Latency and SQL statistics of a single request,
+    recorded by RequestStatsMiddleware.
+    """
+    view_name = models.CharField("представление", max_length=200)
+    method = models.CharField("метод", max_length=10)
+    status_code = models.PositiveSmallIntegerField("код ответа")
+    duration = models.FloatField("время, мс")
+    queries = models.PositiveIntegerField("запросов SQL")
+    sql_duration = models.FloatField("время SQL, мс")
+    slow_queries = models.JSONField("медленные запросы", default=list, blank=True)
+    created_at = models.DateTimeField("время запроса", default=timezone.now)
+
+    class Meta:
+        verbose_name = "замер запроса"
+        verbose_name_plural = "замеры запросов"
+        ordering = ("-created_at", )
+        indexes = [
+            models.Index(
+                fields=("created_at", ),
+                name="requestsample_created_at_idx",
+            ),
+            models.Index(
+                fields=("view_name", "created_at"),
+                name="requestsample_view_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.method} {self.view_name} ({self.duration:.0f} мс)"
@@ -0,0 +1,297 @@
+"""Extraction of podium picks from the text of VK comments."""
+
+import re
+from collections import defaultdict, namedtuple
+from difflib import SequenceMatcher, get_close_matches
+from typing import Any, Iterable
+
+from predictions.models import Alias, Game, Performance, RawPrediction, Team
+
+
+TRANSLITERATION = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e",
+    "ж": "zh", "з": "z", "и": "i", "й": "i", "к": "k", "л": "l", "м": "m",
+    "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "h", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sch",
+    "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+})
+# Latin spellings of the same sound are brought to one form.
+LATIN_SPELLINGS = (
+    ("kh", "h"), ("ck", "k"), ("x", "ks"), ("c", "k"), ("q", "k"),
+    ("w", "v"), ("j", "i"), ("y", "i"),
+)
+STOP_WORDS = {"komanda", "team", "the"}
+MEDALS = {"🥇": "\n1 ", "🥈": "\n2 ", "🥉": "\n3 "}
+SEGMENT_SEPARATORS = re.compile(
+    r"[\n,;/|]+|\s[-–—]+\s|\s(?=[1-3]\s*[.)]\s)"
+)
+SEGMENT_PREFIX = re.compile(
+    r"^\s*(?:[1-3]\s*(?:[.):\-–—]|место|mesto)?|i{1,3}\s*[.)]"
+    r"|(?:первое|второе|третье|1-?е|2-?е|3-?е)\s+место"
+    r"|победитель|победят?|второй|третий|призер)\s*[:\-–—]?\s*",
+    re.IGNORECASE,
+)
+REPEATED_LETTERS = re.compile(r"([^\W\d_])\1+")
+NOT_WORD = re.compile(r"[\W_]+")
+
+EXACT_CONFIDENCE = 1.0
+ABBREVIATION_CONFIDENCE = 0.9
+WORD_CONFIDENCE = 0.85
+WORD_MIN_LENGTH = 4
+FUZZY_MIN_CONFIDENCE = 0.8
+
+# Matches by a distinctive word or a misspelled name are guesses,
+# which are suggested for review rather than taken as picks
+TeamMatch = namedtuple(
+    "TeamMatch", ("team", "confidence", "is_guess"), defaults=(False, )
+)
+Picks = namedtuple("Picks", ("teams", "names", "confidence"))
+
+
+def normalize_name(name: str) -> str:
+    """Returns the name lowercased, transliterated to Latin letters,
+    with one spelling of similar sounds, without punctuation
+    and repeated letters.
+    """
+    name = name.lower().translate(TRANSLITERATION)
+    for spelling, replacement in LATIN_SPELLINGS:
+        name = name.replace(spelling, replacement)
+    name = NOT_WORD.sub(" ", name)
+    return REPEATED_LETTERS.sub(r"\1", " ".join(name.split()))
+
+
+def get_name_keys(name: str) -> tuple[list[str], list[str]]:
+    """Returns normalized keys of the name and its abbreviations."""
+    normalized = normalize_name(name)
+    words = normalized.split()
+    significant_words = [word for word in words if word not in STOP_WORDS]
+    keys = [normalized]
+    if significant_words and significant_words != words:
+        keys.append(" ".join(significant_words))
+    abbreviations = []
+    if len(significant_words) > 1:
+        abbreviations.append("".join(word[0] for word in significant_words))
+    return keys, abbreviations
+
+
+def add_unique_key(index: dict, key: str, value: Any) -> None:
+    """Adds the key to the index, or marks it ambiguous with None
+    if it already refers to another value.
+    """
+    if not key:
+        return
+    if key in index and index[key] != value:
+        index[key] = None
+    else:
+        index[key] = value
+
+
+class TeamNameIndex:
+    """Index of team names by normalized name, abbreviation and
+    distinctive word, with fuzzy matching of misspelled names.
+
+    Keys matching several teams are ambiguous and match nothing.
+    """
+
+    def __init__(self, names: Iterable[tuple[str, Any]]) -> None:
+        self.exact = {}
+        self.abbreviations = {}
+        self.words = {}
+        for name, team in names:
+            keys, abbreviations = get_name_keys(name)
+            for key in keys:
+                add_unique_key(self.exact, key, team)
+            for abbreviation in abbreviations:
+                add_unique_key(self.abbreviations, abbreviation, team)
+            for word in set(keys[-1].split()):
+                if len(word) >= WORD_MIN_LENGTH:
+                    add_unique_key(self.words, word, team)
+        for key in self.exact:
+            self.abbreviations.pop(key, None)
+            self.words.pop(key, None)
+        self.keys = [key for key, team in self.exact.items() if team]
+        self.max_words = max((len(key.split()) for key in self.keys), default=0)
+        self.matches = {}
+
+    @classmethod
+    def from_teams(
+        cls, teams: Iterable[Team], aliases: dict[Any, list[str]] | None = None
+    ) -> "TeamNameIndex":
+        """Returns the index of the teams' names and aliases by team id."""
+        aliases = aliases or {}
+        return cls(
+            (name, team)
+            for team in teams
+            for name in (team.name, *aliases.get(team.pk, ()))
+        )
+
+    def match(self, text: str) -> list[TeamMatch]:
+        """Returns the teams named in the text in order of mention
+        with the confidence of each match.
+
+        Results are cached by normalized text, since the same
+        spellings repeat from comment to comment.
+        """
+        key = normalize_name(text)
+        if key not in self.matches:
+            self.matches[key] = self.match_key(key)
+        return self.matches[key]
+
+    def match_key(self, key: str) -> list[TeamMatch]:
+        if not key:
+            return []
+        team = self.exact.get(key)
+        if team:
+            return [TeamMatch(team, EXACT_CONFIDENCE)]
+        team = self.abbreviations.get(key.replace(" ", ""))
+        if team:
+            return [TeamMatch(team, ABBREVIATION_CONFIDENCE)]
+
+        matches = self.match_words(key.split())
+        if matches:
+            return matches
+
+        close_keys = get_close_matches(
+            key, self.keys, n=1, cutoff=FUZZY_MIN_CONFIDENCE
+        )
+        if close_keys:
+            confidence = SequenceMatcher(None, key, close_keys[0]).ratio()
+            return [TeamMatch(
+                self.exact[close_keys[0]], round(confidence, 2), True
+            )]
+        return []
+
+    def match_words(self, words: list[str]) -> list[TeamMatch]:
+        """Finds team names among other words, the longest names first
+        at each position.
+        """
+        matches = []
+        start = 0
+        while start < len(words):
+            for length in range(min(self.max_words, len(words) - start), 0, -1):
+                phrase = " ".join(words[start:start + length])
+                match = TeamMatch(self.exact.get(phrase), EXACT_CONFIDENCE)
+                if not match.team and length == 1:
+                    match = TeamMatch(
+                        self.words.get(phrase), WORD_CONFIDENCE, True
+                    )
+                if match.team:
+                    matches.append(match)
+                    start += length
+                    break
+            else:
+                start += 1
+        return matches
+
+
+def get_text_segments(text: str) -> list[str]:
+    """Splits the comment into parts naming one team each,
+    without numbering and words like "победитель".
+    """
+    for medal, replacement in MEDALS.items():
+        text = text.replace(medal, replacement)
+    segments = []
+    for segment in SEGMENT_SEPARATORS.split(text):
+        segment = SEGMENT_PREFIX.sub("", segment, count=1).strip()
+        if segment:
+            segments.append(segment)
+    return segments
+
+
+def parse_picks(text: str, index: TeamNameIndex) -> Picks:
+    """Returns up to three distinct teams named in the text in order
+    of mention, padded with None, their names for the pick fields
+    and the lowest confidence of the matches, which is 0 if nothing
+    matched.
+
+    Teams matched by a guess are named as written in the text,
+    so they are not taken for the guessed team without a review.
+    """
+    max_length = RawPrediction._meta.get_field("winner").max_length
+    teams = []
+    names = []
+    confidences = []
+    for segment in get_text_segments(text):
+        for match in index.match(segment):
+            if match.team in teams:
+                continue
+            teams.append(match.team)
+            if match.is_guess:
+                names.append(segment[:max_length])
+            else:
+                names.append(match.team.name)
+            confidences.append(match.confidence)
+            if len(teams) == 3:
+                break
+        if len(teams) == 3:
+            break
+    teams += [None] * (3 - len(teams))
+    names += [""] * (3 - len(names))
+    return Picks(teams, names, min(confidences, default=0))
+
+
+def get_team_indexes(games: Iterable[Game]) -> dict[Any, TeamNameIndex]:
+    """Returns team name indexes by game id.
+
+    A game is indexed by the names and aliases of the teams playing it,
+    games without teams yet by those of all active teams.
+    """
+    game_ids = {game.pk for game in games}
+    teams_by_game_id = {game_id: [] for game_id in game_ids}
+    for performance in Performance.objects\
+            .filter(game_id__in=game_ids)\
+            .select_related("team"):
+        teams_by_game_id[performance.game_id].append(performance.team)
+
+    aliases = defaultdict(list)
+    for team_id, name in Alias.objects\
+            .filter(is_active=True, team__isnull=False)\
+            .values_list("team_id", "name"):
+        aliases[team_id].append(name)
+
+    indexes = {}
+    active_teams_index = None
+    for game_id, teams in teams_by_game_id.items():
+        if teams:
+            indexes[game_id] = TeamNameIndex.from_teams(teams, aliases)
+            continue
+        if active_teams_index is None:
+            active_teams_index = TeamNameIndex.from_teams(
+                Team.objects.filter(is_active=True), aliases
+            )
+        indexes[game_id] = active_teams_index
+    return indexes
+
+
+def fill_raw_prediction_picks(
+    raw_prediction: RawPrediction, index: TeamNameIndex
+) -> bool:
+    """Fills empty picks of the raw prediction with the teams named
+    in its text and notes the confidence.
+
+    Returns whether any pick was filled.
+    """
+    if raw_prediction.winner or raw_prediction.runner_up \
+            or raw_prediction.third_place:
+        return False
+    picks = parse_picks(raw_prediction.text, index)
+    if not any(picks.teams):
+        return False
+    raw_prediction.winner, raw_prediction.runner_up, \
+        raw_prediction.third_place = picks.names
+    suggestions = [
+        f"«{name}» - «{team.name}»"
+        for team, name in zip(picks.teams, picks.names)
+        if team and name != team.name
+    ]
+    if suggestions:
+        raw_prediction.note = (
+            f"Требует проверки: возможно, {', '.join(suggestions)},"
+            f" уверенность {picks.confidence:.2f}"
+        )
+    else:
+        raw_prediction.note = (
+            "Призёры распознаны автоматически,"
+            f" уверенность {picks.confidence:.2f}"
+        )
+    return True
@@ -0,0 +1,191 @@
+"""Per-view request statistics: latency, number of SQL queries
+and SQL time.
+
+Samples are collected by RequestStatsMiddleware into an in-process
+buffer and flushed to the RequestSample table in bulk, when the buffer
+is full or the flush interval has passed.
+
+Queries are recorded by an execute wrapper installed on every database
+connection when it is opened. It reports to the recorder of the current
+request found in a context variable, so queries of async views made
+through sync_to_async in another thread are recorded too.
+"""
+
+import atexit
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from datetime import timedelta
+from typing import Any
+
+from django.db import DatabaseError
+from django.utils import timezone
+
+from predictions.models import RequestSample
+from sovabet.settings import (
+    REQUEST_STATS_FLUSH_INTERVAL,
+    REQUEST_STATS_FLUSH_SIZE,
+    REQUEST_STATS_RETENTION_DAYS,
+    REQUEST_STATS_SLOW_QUERY_MS,
+)
+
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERIES_PER_REQUEST = 5
+SLOW_QUERY_SQL_LENGTH = 2000
+PURGE_INTERVAL = 3600
+PERCENTILES = (50, 95, 99)
+
+
+class QueryRecorder:
+    """Database execute wrapper counting queries and their time.
+
+    Keeps the slowest queries over the threshold as samples.
+    """
+
+    def __init__(self, slow_query_ms: float = REQUEST_STATS_SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self.count = 0
+        self.duration = 0.0
+        self.slow_queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            self.count += 1
+            self.duration += duration
+            if duration >= self.slow_query_ms:
+                self.add_slow_query(sql, duration)
+
+    def add_slow_query(self, sql: str, duration: float) -> None:
+        self.slow_queries.append(
+            {"sql": sql[:SLOW_QUERY_SQL_LENGTH], "duration": round(duration, 1)}
+        )
+        self.slow_queries.sort(key=lambda query: query["duration"], reverse=True)
+        del self.slow_queries[SLOW_QUERIES_PER_REQUEST:]
+
+
+class RequestSampleBuffer:
+    """Thread-safe in-process buffer of request samples."""
+
+    def __init__(
+        self,
+        flush_size: int = REQUEST_STATS_FLUSH_SIZE,
+        flush_interval: float = REQUEST_STATS_FLUSH_INTERVAL,
+    ):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.samples = []
+        self.lock = threading.Lock()
+        self.flushed_at = time.monotonic()
+        self.purged_at = None
+
+    def add(self, sample: RequestSample) -> None:
+        with self.lock:
+            self.samples.append(sample)
+
+    def is_due(self) -> bool:
+        return (
+            len(self.samples) >= self.flush_size
+            or time.monotonic() - self.flushed_at >= self.flush_interval
+        )
+
+    def flush(self, force: bool = False) -> int:
+        """Saves the buffered samples if the buffer is full or the flush
+        interval has passed, and deletes samples older than the retention
+        period once an hour.
+
+        Returns the number of saved samples. Database errors are logged,
+        the samples are dropped then, so a broken table never breaks
+        requests.
+        """
+        with self.lock:
+            if not self.samples or not (force or self.is_due()):
+                return 0
+            samples = self.samples
+            self.samples = []
+            self.flushed_at = time.monotonic()
+
+        try:
+            RequestSample.objects.bulk_create(samples)
+            self.purge()
+        except DatabaseError:
+            logger.exception("Failed to save %d request samples", len(samples))
+            return 0
+        return len(samples)
+
+    def purge(self) -> None:
+        now = time.monotonic()
+        if self.purged_at is not None and now - self.purged_at < PURGE_INTERVAL:
+            return
+        self.purged_at = now
+        RequestSample.objects.filter(
+            created_at__lt=timezone.now()
+            - timedelta(days=REQUEST_STATS_RETENTION_DAYS)
+        ).delete()
+
+
+request_samples = RequestSampleBuffer()
+atexit.register(request_samples.flush, force=True)
+
+# Recorder of the request being processed, None outside requests
+current_recorder: ContextVar[QueryRecorder | None] = ContextVar(
+    "current_recorder", default=None
+)
+
+
+def record_query(execute, sql, params, many, context):
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs) -> None:
+    """connection_created receiver adding record_query to the execute
+    wrappers of the connection, once per connection object.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def get_percentile(values: list[float], percent: float) -> float:
+    """Returns the nearest-rank percentile of sorted values."""
+    if not values:
+        return 0
+    rank = math.ceil(percent / 100 * len(values))
+    return values[max(rank, 1) - 1]
+
+
+def get_request_stats(since) -> list[dict[str, Any]]:
+    """Returns latency, query count and SQL time percentiles by view
+    for the samples since the given time, slowest views first.
+    """
+    samples = defaultdict(lambda: {"duration": [], "queries": [], "sql_duration": []})
+    for view_name, duration, queries, sql_duration in RequestSample.objects\
+            .filter(created_at__gte=since)\
+            .values_list("view_name", "duration", "queries", "sql_duration")\
+            .iterator():
+        view_samples = samples[view_name]
+        view_samples["duration"].append(duration)
+        view_samples["queries"].append(queries)
+        view_samples["sql_duration"].append(sql_duration)
+
+    stats = []
+    for view_name, view_samples in samples.items():
+        row = {"view_name": view_name, "count": len(view_samples["duration"])}
+        for field, values in view_samples.items():
+            values.sort()
+            for percent in PERCENTILES:
+                row[f"{field}_p{percent}"] = get_percentile(values, percent)
+            row[f"{field}_max"] = values[-1]
+        stats.append(row)
+    stats.sort(key=lambda row: row["duration_p95"], reverse=True)
+    return stats
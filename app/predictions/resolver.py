@@ -0,0 +1,117 @@
+"""In-memory resolution of raw names of games, teams and predictors."""
+
+import uuid
+from collections import defaultdict
+from typing import Iterable
+
+from predictions.models import Alias, Game, Predictor, Team
+from predictions.parsing import TeamNameIndex, add_unique_key, normalize_name
+
+
+def normalize_person_name(name: str) -> str:
+    """Returns the name casefolded, with е instead of ё and single spaces.
+
+    Person names are not transliterated, unlike team and game names,
+    so that different people are not merged.
+    """
+    return " ".join(name.casefold().replace("ё", "е").split())
+
+
+class NameResolver:
+    """Resolves raw names to games, teams and predictors with dictionary
+    lookups. Names and aliases are loaded once, when the resolver
+    is created, so one resolver serves a whole processing run.
+
+    Names matching several objects are ambiguous and resolve to nothing.
+    Teams resolve only by exact normalized name or alias; misspelled
+    names are only suggested, to be fixed by hand or with an alias.
+    """
+
+    def __init__(self) -> None:
+        aliases = defaultdict(list)
+        for name, team_id, game_id, predictor_id in Alias.objects\
+                .filter(is_active=True)\
+                .values_list("name", "team_id", "game_id", "predictor_id"):
+            aliases[team_id or game_id or predictor_id].append(name)
+
+        self.games_by_pk = {}
+        self.games_by_name = {}
+        for game in Game.objects.select_related("tournament"):
+            self.games_by_pk[game.pk] = game
+            for name in (game.name, *aliases[game.pk]):
+                add_unique_key(self.games_by_name, normalize_name(name), game)
+
+        team_names = [
+            (name, team)
+            for team in Team.objects.only("id", "name")
+            for name in (team.name, *aliases[team.pk])
+        ]
+        self.teams_by_name = {}
+        for name, team in team_names:
+            add_unique_key(self.teams_by_name, normalize_name(name), team)
+        self.teams = TeamNameIndex(team_names)
+
+        self.predictors_by_vk_id = {}
+        self.predictors_by_name = defaultdict(list)
+        for predictor in Predictor.objects.only("id", "name", "vk_id"):
+            self.add_predictor(predictor, aliases[predictor.pk])
+
+    def get_game(self, value: str) -> Game | None:
+        """Returns the game by UUID, name or alias."""
+        try:
+            return self.games_by_pk.get(uuid.UUID(value))
+        except ValueError:
+            return self.games_by_name.get(normalize_name(value))
+
+    def get_team(self, name: str) -> Team | None:
+        """Returns the team by exact name or alias."""
+        return self.teams_by_name.get(normalize_name(name))
+
+    def suggest_team(self, name: str) -> Team | None:
+        """Returns the only team the misspelled name may refer to."""
+        matches = self.teams.match(name)
+        if len(matches) == 1:
+            return matches[0].team
+        return None
+
+    def get_predictor(
+        self, name: str, vk_id: int | None
+    ) -> tuple[Predictor | None, bool]:
+        """Returns the predictor by VK ID, then by name or alias,
+        and whether the predictor is new.
+
+        A new unsaved predictor is created when none is found,
+        and it is found by the following lookups. If several
+        predictors have the name, returns None.
+        """
+        if vk_id and vk_id in self.predictors_by_vk_id:
+            return self.predictors_by_vk_id[vk_id], False
+
+        predictors = self.predictors_by_name[normalize_person_name(name)]
+        if len(predictors) == 1:
+            return predictors[0], False
+        if predictors:
+            return None, False
+
+        predictor = Predictor(name=name, vk_id=vk_id)
+        self.add_predictor(predictor)
+        return predictor, True
+
+    def add_predictor(
+        self, predictor: Predictor, aliases: Iterable[str] = ()
+    ) -> None:
+        if predictor.vk_id:
+            self.predictors_by_vk_id[predictor.vk_id] = predictor
+        names = {
+            normalize_person_name(name) for name in (predictor.name, *aliases)
+        }
+        for name in names:
+            self.predictors_by_name[name].append(predictor)
+
+    def forget_predictor(self, predictor: Predictor) -> None:
+        """Removes a new predictor that was not saved."""
+        if self.predictors_by_vk_id.get(predictor.vk_id) is predictor:
+            del self.predictors_by_vk_id[predictor.vk_id]
+        predictors = self.predictors_by_name[normalize_person_name(predictor.name)]
+        if predictor in predictors:
+            predictors.remove(predictor)
@@ -0,0 +1,337 @@
+"""Vectorized scoring of prediction events with NumPy.
+
+The kernel works on plain arrays and knows nothing about models,
+so the same rules score predictions loaded from the database
+and CSV or Parquet dumps of historical predictions.
+
+Teams and predictions are identified by integer codes. Events
+of a prediction are matched against the podium of its game
+in the order of their results:
+    - the first event naming the team in its place gets the points
+      of the place;
+    - otherwise the first event naming the team gets the points
+      for a team that was awarded.
+"""
+
+import csv
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+
+PLACES = 3
+NO_TEAM = -1
+
+ScoringPoints = namedtuple(
+    "ScoringPoints", ("winner", "runner_up", "third_place", "awarded")
+)
+DEFAULT_POINTS = ScoringPoints(4, 3, 3, 2)
+
+
+class EventScores(
+    namedtuple(
+        "EventScores",
+        ("points", "prediction_ids", "total_points", "counters"),
+    )
+):
+    """Scores of prediction events.
+
+    points are the points of the events in the order of the input.
+    prediction_ids are the sorted distinct prediction ids, total_points
+    and counters are aligned with them. Columns of counters are numbers
+    of guessed winners, runners-up, third places and awarded teams.
+    """
+    __slots__ = ()
+
+
+EVENT_COLUMNS = ("game_id", "prediction_id", "team_id", "result")
+PERFORMANCE_COLUMNS = ("game_id", "team_id", "result")
+POINTS_COLUMNS = ScoringPoints._fields
+GAME_POINTS_COLUMNS = ("game_id", *POINTS_COLUMNS)
+RESULT_COLUMNS = (
+    "prediction_id",
+    "total_points",
+    "winners",
+    "runners_up",
+    "third_places",
+    "prize_winners",
+)
+
+
+def get_first_in_group(mask: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """Returns indices of the first true value of the mask in each
+    group. groups must be sorted.
+    """
+    indices = np.flatnonzero(mask)
+    if indices.size < 2:
+        return indices
+    group_ids = groups[indices]
+    is_first = np.empty(indices.size, dtype=bool)
+    is_first[0] = True
+    np.not_equal(group_ids[1:], group_ids[:-1], out=is_first[1:])
+    return indices[is_first]
+
+
+def score_events(
+    prediction_ids,
+    team_ids,
+    results,
+    podiums,
+    points=DEFAULT_POINTS,
+) -> EventScores:
+    """Scores prediction events in one vectorized pass.
+
+    prediction_ids, team_ids and results describe the events.
+    podiums are team ids of the winner, the runner-up and the third
+    place, NO_TEAM if the place is not set: one row of three for all
+    events, or a row per event. points are the points for each place
+    and for an awarded team: one row of four or a row per event.
+    """
+    team_ids = np.asarray(team_ids, dtype=np.int64)
+    results = np.asarray(results, dtype=np.int64)
+    size = team_ids.size
+    podiums = np.broadcast_to(np.asarray(podiums, dtype=np.int64), (size, PLACES))
+    points = np.broadcast_to(
+        np.asarray(points, dtype=np.float64), (size, PLACES + 1)
+    )
+    predictions, prediction_index = np.unique(
+        np.asarray(prediction_ids), return_inverse=True
+    )
+    prediction_index = prediction_index.reshape(-1)
+
+    order = np.lexsort((results, prediction_index))
+    sorted_predictions = prediction_index[order]
+    sorted_teams = team_ids[order]
+    sorted_results = results[order]
+    sorted_podiums = podiums[order]
+    sorted_points = points[order]
+
+    event_points = np.zeros(size)
+    total_points = np.zeros(predictions.size)
+    counters = np.zeros((predictions.size, PLACES + 1), dtype=np.int64)
+    for place in range(PLACES):
+        place_teams = sorted_podiums[:, place]
+        names_place_team = (sorted_teams == place_teams) & (place_teams != NO_TEAM)
+
+        full_hits = get_first_in_group(
+            names_place_team & (sorted_results == place + 1),
+            sorted_predictions,
+        )
+        hit_predictions = sorted_predictions[full_hits]
+        event_points[full_hits] = sorted_points[full_hits, place]
+        total_points[hit_predictions] += sorted_points[full_hits, place]
+        counters[hit_predictions, place] += 1
+
+        has_full_hit = np.zeros(predictions.size, dtype=bool)
+        has_full_hit[hit_predictions] = True
+        prize_hits = get_first_in_group(
+            names_place_team & ~has_full_hit[sorted_predictions],
+            sorted_predictions,
+        )
+        hit_predictions = sorted_predictions[prize_hits]
+        event_points[prize_hits] = sorted_points[prize_hits, PLACES]
+        total_points[hit_predictions] += sorted_points[prize_hits, PLACES]
+        counters[hit_predictions, PLACES] += 1
+
+    scored_points = np.empty(size)
+    scored_points[order] = event_points
+    return EventScores(scored_points, predictions, total_points, counters)
+
+
+def get_podiums(
+    game_ids: np.ndarray,
+    team_ids: np.ndarray,
+    results: np.ndarray,
+    games_count: int,
+) -> np.ndarray:
+    """Returns podiums of the games from their performances, a row
+    of three team ids for each game id from 0 to games_count - 1.
+
+    If several teams share a place, the first one is taken.
+    """
+    podiums = np.full((games_count, PLACES), NO_TEAM, dtype=np.int64)
+    for place in range(PLACES):
+        indices = np.flatnonzero(results == place + 1)
+        games, first = np.unique(game_ids[indices], return_index=True)
+        podiums[games, place] = team_ids[indices[first]]
+    return podiums
+
+
+def encode(values) -> tuple[list, np.ndarray]:
+    """Returns the distinct values in order of appearance and codes
+    of the values, their indices in the distinct values.
+
+    A dictionary is faster than sorting long string ids.
+    """
+    values = values.tolist() if isinstance(values, np.ndarray) else list(values)
+    distinct = list(dict.fromkeys(values))
+    codes = {value: code for code, value in enumerate(distinct)}
+    encoded = np.fromiter(
+        map(codes.__getitem__, values), dtype=np.int64, count=len(values)
+    )
+    return distinct, encoded
+
+
+def get_games_points(
+    game_ids: list,
+    games_points: dict[str, np.ndarray],
+    points=DEFAULT_POINTS,
+) -> np.ndarray:
+    """Returns a row of points for each of the game ids from the table
+    of points of the games. Games missing from the table get points.
+    """
+    rows = np.tile(np.asarray(points, dtype=np.float64), (len(game_ids), 1))
+    codes = {game_id: code for code, game_id in enumerate(game_ids)}
+    for game_id, *values in zip(
+        games_points["game_id"].tolist(),
+        *(games_points[column] for column in POINTS_COLUMNS),
+    ):
+        if game_id in codes:
+            rows[codes[game_id]] = values
+    return rows
+
+
+def score_tables(
+    events: dict[str, np.ndarray],
+    performances: dict[str, np.ndarray],
+    points=DEFAULT_POINTS,
+    games_points: dict[str, np.ndarray] | None = None,
+) -> EventScores:
+    """Scores events of any games against the performances,
+    both with ids of any type, as read by read_table.
+
+    Games are scored with their points from games_points if it is
+    given, games missing from it and all games otherwise with points.
+    Prediction ids of the result are the original ids.
+    """
+    events_count = len(events["team_id"])
+    teams = encode(
+        np.concatenate((events["team_id"], performances["team_id"]))
+    )[1]
+    game_ids, games = encode(
+        np.concatenate((events["game_id"], performances["game_id"]))
+    )
+    podiums = get_podiums(
+        games[events_count:],
+        teams[events_count:],
+        performances["result"],
+        len(game_ids),
+    )
+    if games_points is not None:
+        points = get_games_points(game_ids, games_points, points)[
+            games[:events_count]
+        ]
+    prediction_ids, predictions = encode(events["prediction_id"])
+    scores = score_events(
+        predictions,
+        teams[:events_count],
+        events["result"],
+        podiums[games[:events_count]],
+        points,
+    )
+    return scores._replace(
+        prediction_ids=np.array(prediction_ids)[scores.prediction_ids]
+    )
+
+
+# Dumps
+
+def is_parquet(path: str | Path) -> bool:
+    return Path(path).suffix == ".parquet"
+
+
+def import_parquet():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as error:
+        raise ImportError(
+            "Для чтения и записи Parquet установите пакет pyarrow."
+        ) from error
+    return pyarrow
+
+
+def get_results_array(values: np.ndarray) -> np.ndarray:
+    """Returns results as integers, 0 for empty ones."""
+    if values.dtype.kind in "iuf":
+        return np.nan_to_num(values).astype(np.int64)
+    values = values.astype(str)
+    values[(values == "") | (values == "None")] = "0"
+    return values.astype(np.float64).astype(np.int64)
+
+
+def read_table(
+    path: str | Path, columns: tuple[str, ...]
+) -> dict[str, np.ndarray]:
+    """Reads the columns of a CSV or Parquet file (by the .parquet
+    extension) into arrays. Ids are kept as read, strings for CSV,
+    the "result" column is read as integers and columns of points
+    as floats.
+    """
+    if is_parquet(path):
+        table = import_parquet().parquet.read_table(path, columns=list(columns))
+        values = {
+            column: table.column(column).to_numpy(zero_copy_only=False)
+            for column in columns
+        }
+    else:
+        with open(path, newline="") as file:
+            reader = csv.reader(file)
+            header = next(reader)
+            indices = [header.index(column) for column in columns]
+            rows = [[row[index] for index in indices] for row in reader]
+        values = {
+            column: np.array(
+                [row[i] for row in rows], dtype=object
+            )
+            for i, column in enumerate(columns)
+        }
+
+    if "result" in values:
+        values["result"] = get_results_array(values["result"])
+    for column in POINTS_COLUMNS:
+        if column in values:
+            values[column] = values[column].astype(np.float64)
+    return values
+
+
+def get_parquet_value(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return str(value)
+
+
+def write_table(path: str | Path, columns: tuple[str, ...], rows) -> int:
+    """Writes rows to a CSV or Parquet file (by the .parquet extension).
+
+    Returns the number of rows.
+    """
+    if is_parquet(path):
+        pyarrow = import_parquet()
+        rows = [tuple(map(get_parquet_value, row)) for row in rows]
+        columns_values = list(zip(*rows)) or [()] * len(columns)
+        pyarrow.parquet.write_table(
+            pyarrow.table(dict(zip(columns, map(list, columns_values)))),
+            path,
+        )
+        return len(rows)
+
+    count = 0
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def iter_result_rows(scores: EventScores):
+    """Yields rows of RESULT_COLUMNS for the scored predictions."""
+    for prediction_id, total_points, counters in zip(
+        scores.prediction_ids.tolist(),
+        scores.total_points.tolist(),
+        scores.counters.tolist(),
+    ):
+        yield (prediction_id, total_points, *counters)
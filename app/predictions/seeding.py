@@ -0,0 +1,272 @@
+"""Synthetic data for benchmarks and query plan checks."""
+
+import random
+from dataclasses import dataclass, fields
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from predictions.models import (
+    Game,
+    Performance,
+    Prediction,
+    PredictionEvent,
+    Predictor,
+    RawPrediction,
+    Result,
+    Season,
+    Team,
+    Tournament,
+)
+
+
+BULK_BATCH_SIZE = 2000
+
+SEED_OPTIONS_HELP = {
+    "seasons": "Количество сезонов.",
+    "tournaments": "Количество турниров в сезоне.",
+    "games": "Количество игр в турнире.",
+    "teams": "Количество команд.",
+    "teams_per_game": "Количество команд в игре.",
+    "predictors": "Количество прогнозистов.",
+    "raw_predictions": "Количество необработанных сырых прогнозов.",
+    "seed": "Начальное значение генератора случайных чисел.",
+}
+
+
+@dataclass
+class SeedOptions:
+    seasons: int = 2
+    tournaments: int = 10
+    games: int = 10
+    teams: int = 60
+    teams_per_game: int = 25
+    predictors: int = 1000
+    raw_predictions: int = 0
+    seed: int = 0
+
+    @classmethod
+    def add_arguments(cls, parser) -> None:
+        """Adds an option for each field to a management command parser."""
+        for field in fields(cls):
+            parser.add_argument(
+                f"--{field.name.replace('_', '-')}",
+                type=int,
+                default=field.default,
+                help=SEED_OPTIONS_HELP[field.name],
+            )
+
+    @classmethod
+    def from_options(cls, options: dict) -> "SeedOptions":
+        return cls(**{field.name: options[field.name] for field in fields(cls)})
+
+
+def pick_weighted(
+    rnd: random.Random, population: list, weights: list[float], k: int
+) -> list:
+    """Picks k distinct items, favouring items with bigger weights."""
+    keyed = sorted(
+        zip(population, weights),
+        key=lambda item: rnd.random() ** (1 / item[1]),
+        reverse=True,
+    )
+    return [item for item, _ in keyed[:k]]
+
+
+def get_raw_team_name(rnd: random.Random, team: Team) -> str:
+    """Returns the team name the way predictors type it in comments."""
+    if rnd.random() < 0.2:
+        return team.name.lower()
+    return team.name
+
+
+def make_raw_prediction(
+    rnd: random.Random,
+    game: Game,
+    game_teams: list[Team],
+    game_strengths: list[float],
+    predictors: list[Predictor],
+    number: int,
+    prefix: str,
+) -> RawPrediction:
+    """Returns an unsaved raw prediction as if it came from a VK comment.
+
+    Most of them come from new predictors, some from known ones and
+    may duplicate their predictions. A few come after the game start
+    or miss a prize winner.
+    """
+    if rnd.random() < 0.7 or not predictors:
+        name = f"{prefix} newcomer {number}"
+        vk_id = rnd.randrange(10 ** 9, 2 * 10 ** 9)
+    else:
+        predictor = rnd.choice(predictors)
+        name = predictor.name
+        vk_id = predictor.vk_id
+
+    picks = pick_weighted(rnd, game_teams, game_strengths, 3)
+    team_names = [
+        get_raw_team_name(rnd, team) if rnd.random() > 0.05 else ""
+        for team in picks
+    ]
+    created_at = game.started_at - timedelta(minutes=rnd.randrange(1, 600))
+    if rnd.random() < 0.05:
+        created_at = game.started_at + timedelta(minutes=rnd.randrange(1, 60))
+
+    return RawPrediction(
+        name=name,
+        vk_id=vk_id,
+        timestamp=created_at.timestamp(),
+        text="\n".join(
+            f"{place}. {team_name}"
+            for place, team_name in enumerate(team_names, start=1)
+        ),
+        game=game.name,
+        winner=team_names[0],
+        runner_up=team_names[1],
+        third_place=team_names[2],
+    )
+
+
+@transaction.atomic
+def seed_database(options: SeedOptions) -> dict[str, int]:
+    """Fills the database with synthetic seasons, tournaments, games,
+    teams, predictors, predictions and their events, and unprocessed
+    raw predictions for random games.
+
+    Team strength follows a long-tail distribution, so the same teams
+    make the podium and the picks more often. Predictor activity is
+    skewed too: a few regulars predict almost every game, most
+    predictors come now and then.
+
+    Returns the number of created objects by model name.
+    """
+    rnd = random.Random(options.seed)
+    now = timezone.now()
+    prefix = f"seed-{options.seed}-{rnd.getrandbits(32):08x}"
+
+    teams = [
+        Team(name=f"{prefix} team {number}")
+        for number in range(options.teams)
+    ]
+    strengths = [1 / (rank + 1) ** 0.8 for rank in range(options.teams)]
+    predictors = [
+        Predictor(
+            name=f"{prefix} predictor {number}",
+            vk_id=rnd.randrange(10 ** 9),
+        )
+        for number in range(options.predictors)
+    ]
+    activity = [rnd.betavariate(0.6, 1.4) for _ in predictors]
+
+    seasons = []
+    tournaments = []
+    games = []
+    performances = []
+    predictions = []
+    events = []
+    game_teams_by_game = []
+    started_at = now - timedelta(days=7 * options.seasons * options.tournaments)
+    for season_number in range(options.seasons):
+        season = Season(
+            name=f"{prefix} season {season_number}", started_at=started_at
+        )
+        seasons.append(season)
+        for tournament_number in range(options.tournaments):
+            tournament = Tournament(
+                name=f"{prefix} tournament {season_number}-{tournament_number}",
+                season=season,
+                started_at=started_at,
+            )
+            tournaments.append(tournament)
+            for game_number in range(options.games):
+                started_at += timedelta(hours=12)
+                game = Game(
+                    name=(
+                        f"{prefix} game {season_number}-{tournament_number}"
+                        f"-{game_number}"
+                    ),
+                    tournament=tournament,
+                    started_at=started_at,
+                )
+                games.append(game)
+
+                game_teams = pick_weighted(
+                    rnd, teams, strengths, options.teams_per_game
+                )
+                game_strengths = [
+                    strengths[teams.index(team)] for team in game_teams
+                ]
+                game_teams_by_game.append((game, game_teams, game_strengths))
+                podium = pick_weighted(rnd, game_teams, game_strengths, 3)
+                for team in game_teams:
+                    result = None
+                    if team in podium:
+                        result = podium.index(team) + 1
+                    performances.append(
+                        Performance(game=game, team=team, result=result)
+                    )
+
+                for predictor, predictor_activity in zip(predictors, activity):
+                    if rnd.random() > predictor_activity:
+                        continue
+                    prediction = Prediction(
+                        game=game,
+                        tournament=tournament,
+                        season=season,
+                        predictor=predictor,
+                        datetime=started_at - timedelta(
+                            minutes=rnd.randrange(1, 600)
+                        ),
+                        is_active=rnd.random() > 0.03,
+                    )
+                    predictions.append(prediction)
+                    picks = pick_weighted(
+                        rnd, game_teams, game_strengths, 3
+                    )
+                    for team, result in zip(picks, Result.values):
+                        events.append(
+                            PredictionEvent(
+                                prediction=prediction, team=team, result=result
+                            )
+                        )
+
+    raw_predictions = []
+    for number in range(options.raw_predictions):
+        game, game_teams, game_strengths = rnd.choice(game_teams_by_game)
+        raw_predictions.append(
+            make_raw_prediction(
+                rnd,
+                game,
+                game_teams,
+                game_strengths,
+                predictors,
+                number,
+                prefix,
+            )
+        )
+
+    for model, objects in (
+        (Team, teams),
+        (Predictor, predictors),
+        (Season, seasons),
+        (Tournament, tournaments),
+        (Game, games),
+        (Performance, performances),
+        (Prediction, predictions),
+        (PredictionEvent, events),
+        (RawPrediction, raw_predictions),
+    ):
+        model.objects.bulk_create(objects, batch_size=BULK_BATCH_SIZE)
+
+    return {
+        "seasons": len(seasons),
+        "tournaments": len(tournaments),
+        "games": len(games),
+        "teams": len(teams),
+        "predictors": len(predictors),
+        "performances": len(performances),
+        "predictions": len(predictions),
+        "prediction_events": len(events),
+        "raw_predictions": len(raw_predictions),
+    }
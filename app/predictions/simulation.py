@@ -0,0 +1,199 @@
+"""What-if simulation of standings under other points and tie-breaks.
+
+Predictions of a season, a tournament or a game are loaded in bulk,
+scored with the scoring kernel and ranked in memory. Nothing is written
+to the database, so the current scores and standings stay as they are.
+"""
+
+from operator import itemgetter
+from typing import Any, Iterable
+
+import numpy as np
+
+from predictions.logic import (
+    STANDINGS_FIELDS,
+    STANDINGS_ORDERING,
+    get_standings_scope,
+    get_tournaments_points,
+)
+from predictions.models import (
+    Game,
+    Performance,
+    Prediction,
+    PredictionEvent,
+    Season,
+    Standing,
+    Tournament,
+)
+from predictions.scoring import (
+    PLACES,
+    encode,
+    get_podiums,
+    score_events,
+)
+
+
+ORDERING_FIELDS = {*STANDINGS_FIELDS, "predictor__name"}
+# Columns of the scoring counters
+COUNTER_FIELDS = ("winners", "runners_up", "third_places", "prize_winners")
+
+
+def check_ordering(ordering: Iterable[str]) -> list[str]:
+    """Returns the ordering as a list.
+
+    Raises ValueError if it has fields standings can't be ordered by.
+    """
+    ordering = list(ordering)
+    for field in ordering:
+        if field.lstrip("-") not in ORDERING_FIELDS:
+            raise ValueError(
+                f"Неизвестное поле сортировки: {field}."
+                f" Допустимы: {', '.join(sorted(ORDERING_FIELDS))}"
+            )
+    return ordering
+
+
+def sort_standings(
+    standings: list[dict[str, Any]], ordering: Iterable[str]
+) -> None:
+    """Sorts standings rows in place like order_by(*ordering)."""
+    for field in reversed(list(ordering)):
+        standings.sort(
+            key=itemgetter(field.lstrip("-")), reverse=field.startswith("-")
+        )
+
+
+def simulate_standings(
+    object: Season | Tournament | Game,
+    points: Iterable[float] | None = None,
+    ordering: Iterable[str] = STANDINGS_ORDERING,
+) -> list[dict[str, Any]]:
+    """Returns the standings of the object as they would be with other
+    points for the winner, the runner-up, the third place and an awarded
+    team, and with other ordering of the rows.
+
+    Without points each tournament is scored with its points scheme.
+
+    Rows have the fields of ranked standings, the current position
+    and the current total points of the predictor (None if the predictor
+    is not in the current standings). The data is read with four queries,
+    five without points.
+    """
+    ordering = check_ordering(ordering)
+    if points is not None:
+        points = np.asarray(list(points), dtype=np.float64)
+        if points.shape != (PLACES + 1, ):
+            raise ValueError("Нужно четыре значения баллов.")
+    scope = get_standings_scope(object)
+
+    predictions = list(
+        Prediction.objects
+        .filter(**scope, is_active=True)
+        .values_list(
+            "pk",
+            "game_id",
+            "predictor_id",
+            "predictor__name",
+            "predictor__vk_id",
+            "tournament_id",
+        )
+    )
+    prediction_codes = {row[0]: code for code, row in enumerate(predictions)}
+    game_ids, prediction_games = encode([row[1] for row in predictions])
+    predictor_ids, prediction_predictors = encode(
+        [row[2] for row in predictions]
+    )
+    game_codes = {game_id: code for code, game_id in enumerate(game_ids)}
+
+    events = list(
+        PredictionEvent.objects
+        .filter(
+            **{f"prediction__{field}": id for field, id in scope.items()},
+            prediction__is_active=True,
+        )
+        .values_list("prediction_id", "team_id", "result")
+    )
+    performances = list(
+        Performance.objects
+        .filter(game_id__in=game_ids, result__isnull=False)
+        .values_list("game_id", "team_id", "result")
+    )
+    teams = encode(
+        [row[1] for row in events] + [row[1] for row in performances]
+    )[1]
+    podiums = get_podiums(
+        np.array([game_codes[row[0]] for row in performances], dtype=np.int64),
+        teams[len(events):],
+        np.array([row[2] for row in performances], dtype=np.int64),
+        len(game_ids),
+    )
+    event_predictions = np.array(
+        [prediction_codes[row[0]] for row in events], dtype=np.int64
+    )
+    if points is None:
+        tournament_ids, prediction_tournaments = encode(
+            [row[5] for row in predictions]
+        )
+        tournaments_points = get_tournaments_points(tournament_ids)
+        points = np.array(
+            [tournaments_points[pk] for pk in tournament_ids],
+            dtype=np.float64,
+        ).reshape(-1, PLACES + 1)
+        points = points[prediction_tournaments[event_predictions]]
+    scores = score_events(
+        event_predictions,
+        teams[:len(events)],
+        np.array([row[2] for row in events], dtype=np.int64),
+        podiums[prediction_games[event_predictions]],
+        points,
+    )
+
+    total_points = np.zeros(len(predictions))
+    total_points[scores.prediction_ids] = scores.total_points
+    counters = np.zeros((len(predictions), len(COUNTER_FIELDS)), dtype=np.int64)
+    counters[scores.prediction_ids] = scores.counters
+
+    sums = {
+        "count": np.bincount(
+            prediction_predictors, minlength=len(predictor_ids)
+        ),
+        "total_points": np.bincount(
+            prediction_predictors,
+            weights=total_points,
+            minlength=len(predictor_ids),
+        ),
+    }
+    for column, field in enumerate(COUNTER_FIELDS):
+        sums[field] = np.bincount(
+            prediction_predictors,
+            weights=counters[:, column],
+            minlength=len(predictor_ids),
+        ).astype(np.int64)
+
+    current_standings = {
+        predictor_id: (position, current_points)
+        for predictor_id, position, current_points in Standing.objects
+        .filter(**scope)
+        .values_list("predictor_id", "position", "total_points")
+    }
+    predictors = {row[2]: row[3:5] for row in predictions}
+    sums = {field: values.tolist() for field, values in sums.items()}
+    standings = []
+    for code, predictor_id in enumerate(predictor_ids):
+        name, vk_id = predictors[predictor_id]
+        current_position, current_points = current_standings.get(
+            predictor_id, (None, None)
+        )
+        standings.append({
+            "predictor__id": predictor_id,
+            "predictor__name": name,
+            "predictor__vk_id": vk_id,
+            **{field: sums[field][code] for field in STANDINGS_FIELDS},
+            "current_position": current_position,
+            "current_total_points": current_points,
+        })
+
+    sort_standings(standings, ordering)
+    for position, row in enumerate(standings, start=1):
+        row["position"] = position
+    return standings
@@ -1,3 +1,1180 @@
-from django.test import TestCase
+import random
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+from django.utils import timezone
+
+from predictions import urls as predictions_urls
+from predictions.caching import get_home_cache_key
+from predictions.jobs import claim_job, enqueue_job, requeue_jobs
+from predictions.logic import (
+    STANDINGS_FIELDS,
+    aggregate_standings,
+    bump_object_versions,
+    bump_versions,
+    calculate_prediction,
+    calculate_game_predictions,
+    calculate_stale_predictions,
+    calculate_tournament_predictions,
+    get_not_null_performances_for_game,
+    get_points_for_object,
+    get_ranked_performances,
+    get_tournaments_points,
+    mark_game_performances_changed,
+    process_raw_predictions,
+    reset_game_predictions,
+    reset_prediction,
+    reset_tournament_predictions,
+    sync_vk_comments,
+)
+from predictions.models import (
+    Alias,
+    Game,
+    Job,
+    Performance,
+    PointsScheme,
+    Prediction,
+    PredictionEvent,
+    Predictor,
+    RawPrediction,
+    RequestSample,
+    Result,
+    Season,
+    Standing,
+    Team,
+    Tournament,
+)
+from predictions.parsing import (
+    FUZZY_MIN_CONFIDENCE,
+    fill_raw_prediction_picks,
+    get_team_indexes,
+    parse_picks,
+)
+from predictions.request_stats import request_samples
+from predictions.resolver import NameResolver
+from predictions.scoring import (
+    DEFAULT_POINTS,
+    NO_TEAM,
+    ScoringPoints,
+    score_events,
+    score_tables,
+)
+from predictions.simulation import simulate_standings
+from predictions.views import GameDetailView
+from sovabet.settings import JOB_TIMEOUT_MINUTES
+
+
+DUMMY_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+}
+LOCMEM_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "predictions-tests",
+    },
+}
+
+# Public pages with the async game view, as served with ASYNC_VIEWS
+urlpatterns = [
+    path("", include((
+        [
+            path(
+                "game/<str:pk>/",
+                GameDetailView.as_async_view(),
+                name="game_detail",
+            ),
+            *predictions_urls.urlpatterns,
+        ],
+        "predictions",
+    ))),
+]
+
+
+def create_game(name: str = "Игра", teams_count: int = 4) -> Game:
+    season = Season.objects.create(name=f"Сезон {name}", started_at=timezone.now())
+    tournament = Tournament.objects.create(
+        name=f"Турнир {name}", season=season, started_at=timezone.now()
+    )
+    game = Game.objects.create(
+        name=name, tournament=tournament, started_at=timezone.now()
+    )
+    for number in range(teams_count):
+        team = Team.objects.create(name=f"{name} команда {number + 1}")
+        Performance.objects.create(
+            game=game,
+            team=team,
+            result=number + 1 if number < len(Result) else None,
+        )
+    return game
+
+
+def create_prediction(game: Game, predictor: Predictor, teams) -> Prediction:
+    prediction = Prediction.objects.create(game=game, predictor=predictor)
+    for result, team in enumerate(teams, start=1):
+        if team is not None:
+            PredictionEvent.objects.create(
+                prediction=prediction, team=team, result=result
+            )
+    return prediction
+
+
+@override_settings(CACHES=DUMMY_CACHES, ROOT_URLCONF="predictions.tests")
+class RequestStatsTest(TestCase):
+
+    def setUp(self):
+        self.game = create_game()
+        predictor = Predictor.objects.create(name="Прогнозист", vk_id=1)
+        create_prediction(self.game, predictor, self.game.teams.all()[:3])
+        request_samples.flush(force=True)
+        RequestSample.objects.all().delete()
+
+    def get_recorded_queries(self) -> list[int]:
+        request_samples.flush(force=True)
+        return list(
+            RequestSample.objects
+            .filter(view_name="predictions:game_detail")
+            .values_list("queries", flat=True)
+        )
+
+    def test_sync_request_queries_are_recorded(self):
+        response = self.client.get(f"/game/{self.game.pk}/")
+        self.assertEqual(response.status_code, 200)
+        queries, = self.get_recorded_queries()
+        self.assertGreater(queries, 0)
+
+    async def test_async_request_queries_are_recorded(self):
+        # Under ASGI the queries of the view run in another thread
+        await sync_to_async(self.client.get)(f"/game/{self.game.pk}/")
+        sync_queries, = await sync_to_async(self.get_recorded_queries)()
+        await sync_to_async(RequestSample.objects.all().delete)()
+
+        response = await self.async_client.get(f"/game/{self.game.pk}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            await sync_to_async(self.get_recorded_queries)(), [sync_queries]
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PageCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.game = create_game()
+        self.tournament = self.game.tournament
+
+    def test_page_is_cached_until_version_is_bumped(self):
+        url = self.tournament.get_absolute_url()
+        self.assertContains(self.client.get(url), "Игра")
+
+        Game.objects.filter(pk=self.game.pk).update(name="Новое название")
+        self.assertNotContains(self.client.get(url), "Новое название")
+
+        bump_object_versions([self.game], [self.game])
+        self.assertContains(self.client.get(url), "Новое название")
+
+    def test_home_key_changes_when_tournament_is_replaced(self):
+        season = self.tournament.season
+        keys = [get_home_cache_key()]
+        tournament = Tournament.objects.create(name="Турнир 2", season=season)
+        keys.append(get_home_cache_key())
+        tournament.delete()
+        Tournament.objects.create(name="Турнир 3", season=season)
+        keys.append(get_home_cache_key())
+        self.assertEqual(len(set(keys)), 3)
+
+
+@override_settings(CACHES=DUMMY_CACHES)
+class ConditionalGetTest(TestCase):
+
+    def setUp(self):
+        self.game = create_game()
+        self.url = self.game.get_absolute_url()
+
+    def test_validators_are_sent(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["ETag"], f'"game-{self.game.pk}-{self.game.version}"'
+        )
+        self.assertIn("Last-Modified", response)
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_unchanged_page_is_not_modified(self):
+        response = self.client.get(self.url)
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(
+                self.url, HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified["ETag"], response["ETag"])
+
+        not_modified = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_changed_page_is_sent_again(self):
+        etag = self.client.get(self.url)["ETag"]
+        bump_versions(game_ids=[self.game.pk])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_unknown_page_is_not_found(self):
+        for pk in ("abc", "00000000-0000-0000-0000-000000000000"):
+            with self.subTest(pk=pk):
+                response = self.client.get(f"/game/{pk}/")
+                self.assertEqual(response.status_code, 404)
+                self.assertNotIn("ETag", response)
+
+    @override_settings(ROOT_URLCONF="predictions.tests")
+    async def test_async_view(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        # The async client of Django 4.0 takes headers by their names
+        not_modified = await self.async_client.get(
+            self.url, **{"If-None-Match": response["ETag"]}
+        )
+        self.assertEqual(not_modified.status_code, 304)
+        response = await self.async_client.get("/game/abc/")
+        self.assertEqual(response.status_code, 404)
+
+
+def score_by_original_rules(events, podium, points):
+    """Scores the events of one prediction event by event, as scoring
+    worked before the kernel. Returns the points of the events, the total
+    points and the counters of guessed places and awarded teams.
+    """
+    event_points = [0] * len(events)
+    total_points = 0
+    counters = [0, 0, 0, 0]
+    ordered = sorted(range(len(events)), key=lambda index: events[index][1])
+    for place, team in enumerate(podium):
+        if team == NO_TEAM:
+            continue
+        full_hits = [
+            index for index in ordered
+            if events[index] == (team, place + 1)
+        ]
+        prize_hits = [
+            index for index in ordered if events[index][0] == team
+        ]
+        if full_hits:
+            event_points[full_hits[0]] = points[place]
+            total_points += points[place]
+            counters[place] += 1
+        elif prize_hits:
+            event_points[prize_hits[0]] = points[-1]
+            total_points += points[-1]
+            counters[-1] += 1
+    return event_points, total_points, counters
+
+
+class ScoringKernelTest(SimpleTestCase):
+
+    def assertScoredByOriginalRules(self, predictions, podium, points):
+        """predictions are lists of (team, result) events."""
+        events = [
+            (code, team, result)
+            for code, prediction in enumerate(predictions)
+            for team, result in prediction
+        ]
+        random.Random(len(events)).shuffle(events)
+        scores = score_events(*zip(*events), podium, points) if events \
+            else score_events([], [], [], podium, points)
+
+        for code, prediction_events in enumerate(predictions):
+            if not prediction_events:
+                self.assertNotIn(code, scores.prediction_ids.tolist())
+                continue
+            indices = [
+                index for index, event in enumerate(events)
+                if event[0] == code
+            ]
+            event_points, total_points, counters = score_by_original_rules(
+                [events[index][1:] for index in indices], podium, points
+            )
+            row = scores.prediction_ids.tolist().index(code)
+            self.assertEqual(scores.points[indices].tolist(), event_points)
+            self.assertEqual(scores.total_points[row], total_points)
+            self.assertEqual(scores.counters[row].tolist(), counters)
+
+    def test_examples(self):
+        podium = (1, 2, 3)
+        for prediction in (
+            [(1, 1), (2, 2), (3, 3)],
+            [(3, 1), (1, 2), (2, 3)],
+            # Duplicate teams
+            [(1, 1), (1, 2), (1, 3)],
+            [(2, 1), (2, 2), (4, 3)],
+            # Empty places of the prediction
+            [(2, 2)],
+            [],
+        ):
+            with self.subTest(prediction=prediction):
+                self.assertScoredByOriginalRules(
+                    [prediction], podium, DEFAULT_POINTS
+                )
+
+    def test_empty_places_of_podium(self):
+        for podium in ((1, NO_TEAM, 3), (NO_TEAM, NO_TEAM, NO_TEAM)):
+            with self.subTest(podium=podium):
+                self.assertScoredByOriginalRules(
+                    [[(1, 1), (3, 2), (NO_TEAM, 3)]], podium, DEFAULT_POINTS
+                )
+
+    def test_shared_places(self):
+        # A team taking several places is scored for each of them
+        self.assertScoredByOriginalRules(
+            [[(1, 1)], [(1, 1), (1, 2)], [(2, 3)]], (1, 1, 2), (5, 4, 3, 1)
+        )
+
+    def test_random_predictions(self):
+        rnd = random.Random(0)
+        for _ in range(300):
+            teams = rnd.randint(1, 5)
+            podium = [
+                rnd.randrange(teams) if rnd.random() < 0.8 else NO_TEAM
+                for _ in range(3)
+            ]
+            points = [rnd.randint(0, 6) for _ in range(4)]
+            predictions = [
+                [
+                    (rnd.randrange(teams), rnd.randint(1, 3))
+                    for _ in range(rnd.randint(0, 4))
+                ]
+                for _ in range(rnd.randint(1, 6))
+            ]
+            self.assertScoredByOriginalRules(predictions, podium, points)
+
+
+class StandingsTest(TestCase):
+
+    def setUp(self):
+        self.game = create_game()
+        self.tournament = self.game.tournament
+        self.other_game = Game.objects.create(
+            name="Другая игра",
+            tournament=self.tournament,
+            started_at=timezone.now(),
+        )
+        teams = list(self.game.teams.order_by("name"))
+        for team, result in zip(teams, (2, 1, None, 3)):
+            Performance.objects.create(
+                game=self.other_game, team=team, result=result
+            )
+        self.predictors = [
+            Predictor.objects.create(name=f"Прогнозист {number}")
+            for number in range(4)
+        ]
+        for game in (self.game, self.other_game):
+            for number, predictor in enumerate(self.predictors):
+                create_prediction(game, predictor, teams[number:number + 3])
+
+    def assertStandingsAggregated(self):
+        for scope in (
+            {"season_id": self.tournament.season_id},
+            {"tournament_id": self.tournament.pk},
+            {"game_id": self.game.pk},
+            {"game_id": self.other_game.pk},
+        ):
+            standings = Standing.objects\
+                .filter(**scope)\
+                .order_by("position")\
+                .values_list("predictor_id", *STANDINGS_FIELDS)
+            aggregated = aggregate_standings(scope)\
+                .values_list("predictor__id", *STANDINGS_FIELDS)
+            self.assertEqual(list(standings), list(aggregated), scope)
+            positions = Standing.objects\
+                .filter(**scope)\
+                .order_by("position")\
+                .values_list("position", flat=True)
+            self.assertEqual(
+                list(positions), list(range(1, len(positions) + 1)), scope
+            )
+
+    def test_standings_after_calculation_and_reset(self):
+        calculate_tournament_predictions(self.tournament)
+        self.assertStandingsAggregated()
+        Performance.objects.filter(game=self.game, result=1).update(result=3)
+        calculate_game_predictions(self.game)
+        self.assertStandingsAggregated()
+        reset_prediction(Prediction.objects.filter(game=self.game).first())
+        self.assertStandingsAggregated()
+        reset_tournament_predictions(self.tournament)
+        self.assertStandingsAggregated()
+
+    def test_standings_after_deleting_in_admin(self):
+        game = Game.objects.create(
+            name="Игра без результатов",
+            tournament=self.tournament,
+            started_at=timezone.now(),
+        )
+        for predictor in self.predictors[:2]:
+            create_prediction(game, predictor, [])
+        calculate_tournament_predictions(self.tournament)
+        self.client.force_login(
+            User.objects.create_superuser("admin", "", "password")
+        )
+
+        response = self.client.post(
+            reverse("admin:predictions_game_delete", args=(game.pk, )),
+            {"post": "yes"},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Game.objects.filter(pk=game.pk).exists())
+        self.assertStandingsAggregated()
+
+        response = self.client.post(
+            reverse("admin:predictions_predictor_changelist"),
+            {
+                "action": "delete_selected",
+                "_selected_action": [self.predictors[0].pk],
+                "post": "yes",
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(
+            Standing.objects.filter(predictor=self.predictors[0]).exists()
+        )
+        self.assertStandingsAggregated()
+
+    def test_standings_after_processing_raw_predictions(self):
+        calculate_tournament_predictions(self.tournament)
+        RawPrediction.objects.create(
+            name="Новый прогнозист",
+            vk_id=10,
+            game=self.game.name,
+            winner="Игра команда 1",
+        )
+        self.assertEqual(process_raw_predictions(), (1, 1))
+        self.assertStandingsAggregated()
+
+
+class CalculatePredictionTest(TestCase):
+
+    def test_events_are_updated_in_bulk(self):
+        game = create_game()
+        first, second, third = game.teams.order_by("name")[:3]
+        prediction = create_prediction(
+            game,
+            Predictor.objects.create(name="Прогнозист"),
+            [first, third, second],
+        )
+        with CaptureQueriesContext(connection) as queries:
+            calculate_prediction(prediction, standings=False)
+
+        event_updates = [
+            query for query in queries.captured_queries
+            if query["sql"].startswith('UPDATE "predictions_predictionevent"')
+        ]
+        self.assertEqual(len(event_updates), 1)
+        self.assertEqual(
+            list(
+                prediction.prediction_events
+                .order_by("result")
+                .values_list("points", flat=True)
+            ),
+            [4, 2, 2],
+        )
+        prediction.refresh_from_db()
+        self.assertEqual(prediction.total_points, 8)
+        self.assertEqual(prediction.prize_winners, 2)
+
+
+class RawPredictionsTest(TestCase):
+
+    def setUp(self):
+        self.game = create_game()
+
+    def create_raw_prediction(self, **kwargs) -> RawPrediction:
+        return RawPrediction.objects.create(
+            name="Прогнозист", vk_id=1, game=self.game.name, **kwargs
+        )
+
+    def test_raw_prediction_is_processed_once(self):
+        raw_prediction = self.create_raw_prediction(
+            winner="Игра команда 1", runner_up="Игра команда 2"
+        )
+        self.assertEqual(process_raw_predictions(), (1, 1))
+        RawPrediction.objects.update(is_active=True)
+        self.assertEqual(process_raw_predictions(), (0, 1))
+
+        prediction, = Prediction.objects.all()
+        raw_prediction.refresh_from_db()
+        self.assertEqual(raw_prediction.prediction, prediction)
+        self.assertEqual(prediction.prediction_events.count(), 2)
+
+    def test_resolver_rejects_near_miss_team_names(self):
+        team = Team.objects.get(name="Игра команда 1")
+        resolver = NameResolver()
+        self.assertEqual(resolver.get_team("игра  команда 1!"), team)
+        for name in ("Игра команда 7", "Игра комнда 1", "Команда 1"):
+            with self.subTest(name=name):
+                self.assertIsNone(resolver.get_team(name))
+
+        Alias.objects.create(name="Команда 1", team=team)
+        self.assertEqual(NameResolver().get_team("Команда 1"), team)
+
+    def test_near_miss_team_name_is_left_for_review(self):
+        raw_prediction = self.create_raw_prediction(
+            winner="Игра команда 2", runner_up="Игра комнда 1"
+        )
+        self.assertEqual(process_raw_predictions(), (0, 1))
+        raw_prediction.refresh_from_db()
+        self.assertTrue(raw_prediction.is_active)
+        self.assertIsNone(raw_prediction.prediction)
+        self.assertIn("«Игра команда 1»", raw_prediction.note)
+        self.assertFalse(Prediction.objects.exists())
+
+
+class CommentPicksTest(TestCase):
+
+    def setUp(self):
+        self.game = create_game()
+        self.index = get_team_indexes([self.game])[self.game.pk]
+
+    def create_raw_prediction(self, text: str) -> RawPrediction:
+        raw_prediction = RawPrediction(
+            name="Прогнозист", vk_id=1, game=self.game.name, text=text
+        )
+        self.assertTrue(fill_raw_prediction_picks(raw_prediction, self.index))
+        raw_prediction.save()
+        return raw_prediction
+
+    def test_exact_names_and_aliases_are_filled(self):
+        Alias.objects.create(
+            name="Вторые", team=Team.objects.get(name="Игра команда 2")
+        )
+        self.index = get_team_indexes([self.game])[self.game.pk]
+        raw_prediction = self.create_raw_prediction(
+            "1. игра команда 1\n2. Вторые\n3. ИГРА КОМАНДА 3"
+        )
+        self.assertEqual(
+            [
+                raw_prediction.winner,
+                raw_prediction.runner_up,
+                raw_prediction.third_place,
+            ],
+            ["Игра команда 1", "Игра команда 2", "Игра команда 3"],
+        )
+        self.assertEqual(
+            raw_prediction.note,
+            "Призёры распознаны автоматически, уверенность 1.00",
+        )
+        self.assertEqual(process_raw_predictions(), (1, 1))
+
+    def test_near_miss_name_is_left_for_review(self):
+        raw_prediction = self.create_raw_prediction(
+            "1. Игра команда 7\n2. Игра команда 2"
+        )
+        self.assertEqual(raw_prediction.winner, "Игра команда 7")
+        self.assertEqual(raw_prediction.runner_up, "Игра команда 2")
+        self.assertTrue(raw_prediction.note.startswith("Требует проверки"))
+
+        self.assertEqual(process_raw_predictions(), (0, 1))
+        raw_prediction.refresh_from_db()
+        self.assertTrue(raw_prediction.is_active)
+        self.assertFalse(Prediction.objects.exists())
+
+    def test_confidence_threshold(self):
+        picks = parse_picks("1. Игра команда 7", self.index)
+        self.assertGreaterEqual(picks.confidence, FUZZY_MIN_CONFIDENCE)
+        self.assertEqual(picks.names, ["Игра команда 7", "", ""])
+
+        picks = parse_picks("1. Ира кмнд 7", self.index)
+        self.assertEqual(picks.teams, [None] * 3)
+
+        picks = parse_picks("Сегодня без прогноза", self.index)
+        self.assertEqual(picks, ([None] * 3, [""] * 3, 0))
+
+
+async def post_through_asgi(path: str, data: dict, cookies: dict) -> tuple:
+    """Posts the form through the ASGI handler, as the server does,
+    and returns the status and the body sent.
+    """
+    body = urlencode(data, doseq=True).encode()
+    csrf_token = "a" * 32
+    cookies = {**cookies, "csrftoken": csrf_token}
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": path,
+        "query_string": b"",
+        "server": ("testserver", 80),
+        "headers": [
+            (b"host", b"testserver"),
+            (b"content-type", b"application/x-www-form-urlencoded"),
+            (b"x-csrftoken", csrf_token.encode()),
+            (
+                b"cookie",
+                "; ".join(f"{k}={v}" for k, v in cookies.items()).encode(),
+            ),
+        ],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    # The test transaction must keep its connection, as with the test client
+    request_started.disconnect(close_old_connections)
+    request_finished.disconnect(close_old_connections)
+    try:
+        await ASGIHandler()(scope, receive, send)
+    finally:
+        request_started.connect(close_old_connections)
+        request_finished.connect(close_old_connections)
+    status = messages[0]["status"]
+    content = b"".join(message.get("body", b"") for message in messages[1:])
+    return status, content
+
+
+@override_settings(CACHES=DUMMY_CACHES)
+class CommentsCsvExportTest(TestCase):
+
+    def setUp(self):
+        self.game = create_game()
+        Game.objects.filter(pk=self.game.pk).update(vk_post_id=100)
+        user = User.objects.create_superuser("admin", "", "password")
+        self.client.force_login(user)
+
+    async def test_export_through_asgi(self):
+        comments = {"items": [
+            {"id": 1, "from_id": 7, "date": 1, "text": "1. Игра команда 2"},
+        ]}
+        users = [{"id": 7, "first_name": "Иван", "last_name": "Петров"}]
+        with mock.patch(
+            "predictions.logic.get_posts_vk_comments",
+            return_value=[(100, comments)],
+        ), mock.patch("predictions.logic.get_vk_users", return_value=users):
+            status, content = await post_through_asgi(
+                "/admin/predictions/game/",
+                {
+                    "action": "create_csv_from_vk",
+                    "_selected_action": [str(self.game.pk)],
+                },
+                {"sessionid": self.client.cookies["sessionid"].value},
+            )
+
+        self.assertEqual(status, 200)
+        header, row = content.decode().splitlines()
+        self.assertTrue(header.startswith("game,name,vk_id"))
+        self.assertEqual(
+            row, "Игра,Иван Петров,7,1,1. Игра команда 2,Игра команда 2,,,"
+        )
+
+
+class JobQueueTest(TestCase):
+
+    def create_job(self, status=Job.Status.PENDING, age_minutes=0) -> Job:
+        job = Job.objects.create(
+            kind=Job.Kind.CALCULATE_STALE, object_id=Job.objects.count()
+        )
+        at = timezone.now() - timedelta(minutes=age_minutes)
+        Job.objects.filter(pk=job.pk).update(
+            status=status, created_at=at, started_at=at, updated_at=at
+        )
+        return Job.objects.get(pk=job.pk)
+
+    def test_enqueue_returns_waiting_job(self):
+        job = enqueue_job(Job.Kind.CALCULATE_GAME, 1)
+        self.assertEqual(enqueue_job(Job.Kind.CALCULATE_GAME, 1), job)
+        self.assertNotEqual(enqueue_job(Job.Kind.CALCULATE_GAME, 2), job)
+
+    def test_claim_oldest_pending_job(self):
+        newer = self.create_job(age_minutes=1)
+        older = self.create_job(age_minutes=2)
+        self.create_job(Job.Status.DONE, age_minutes=3)
+
+        job = claim_job()
+        self.assertEqual(job, older)
+        self.assertEqual(job.status, Job.Status.RUNNING)
+        self.assertIsNotNone(job.started_at)
+        self.assertEqual(
+            Job.objects.get(pk=older.pk).status, Job.Status.RUNNING
+        )
+        self.assertEqual(claim_job(), newer)
+        self.assertIsNone(claim_job())
+
+    def test_claim_abandoned_job(self):
+        self.create_job(Job.Status.RUNNING, age_minutes=1)
+        progressing = self.create_job(
+            Job.Status.RUNNING, age_minutes=JOB_TIMEOUT_MINUTES + 2
+        )
+        Job.objects.filter(pk=progressing.pk).update(updated_at=timezone.now())
+        abandoned = self.create_job(
+            Job.Status.RUNNING, age_minutes=JOB_TIMEOUT_MINUTES + 1
+        )
+
+        job = claim_job()
+        self.assertEqual(job, abandoned)
+        self.assertGreater(
+            job.started_at,
+            timezone.now() - timedelta(minutes=JOB_TIMEOUT_MINUTES),
+        )
+        self.assertIsNone(claim_job())
+
+    def test_requeue_failed_and_abandoned_jobs(self):
+        failed = self.create_job(Job.Status.FAILED, age_minutes=1)
+        abandoned = self.create_job(
+            Job.Status.RUNNING, age_minutes=JOB_TIMEOUT_MINUTES + 1
+        )
+        running = self.create_job(Job.Status.RUNNING, age_minutes=1)
+        done = self.create_job(Job.Status.DONE, age_minutes=1)
+        Job.objects.filter(pk=failed.pk).update(
+            progress=3, total=5, message="Traceback"
+        )
+
+        self.assertEqual(requeue_jobs(Job.objects.all()), 2)
+        for job in (failed, abandoned):
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.Status.PENDING)
+            self.assertEqual((job.progress, job.total, job.message), (0, 0, ""))
+            self.assertIsNone(job.started_at)
+        running.refresh_from_db()
+        done.refresh_from_db()
+        self.assertEqual(running.status, Job.Status.RUNNING)
+        self.assertEqual(done.status, Job.Status.DONE)
+        self.assertEqual(requeue_jobs(Job.objects.all()), 0)
+
+
+class VkCommentsSyncTest(TestCase):
+
+    def setUp(self):
+        self.game = create_game()
+        self.game.vk_post_id = 100
+        self.game.save()
+
+    def sync(self, comments):
+        users = [
+            {"id": vk_id, "first_name": "Пользователь", "last_name": vk_id}
+            for vk_id in {comment["from_id"] for comment in comments}
+        ]
+        with mock.patch(
+            "predictions.logic.get_posts_vk_comments",
+            return_value=[(100, {"items": comments})],
+        ) as get_comments, mock.patch(
+            "predictions.logic.get_vk_users", return_value=users
+        ) as get_users:
+            created = sync_vk_comments(Game.objects.all())
+        self.game.refresh_from_db()
+        return created, get_comments.call_args, get_users.call_args
+
+    def test_incremental_sync(self):
+        created, call, _ = self.sync([
+            {"id": 1, "from_id": 7, "date": 10, "text": "1. Игра команда 2"},
+            {"id": 2, "from_id": 8, "date": 20, "text": "1. Игра команда 1"},
+            {"id": 3, "from_id": 7, "date": 30, "text": "1. Игра команда 3"},
+        ])
+        self.assertEqual(created, 2)
+        self.assertEqual(call.kwargs["start_comment_ids"], {})
+        self.assertEqual(self.game.vk_last_comment_id, 3)
+        self.assertEqual(self.game.vk_last_comment_at.timestamp(), 30)
+        raw_prediction = RawPrediction.objects.get(vk_id=7)
+        self.assertEqual(raw_prediction.vk_comment_id, 1)
+        self.assertEqual(raw_prediction.name, "Пользователь 7")
+        self.assertEqual(raw_prediction.winner, "Игра команда 2")
+
+        # VK returns comments starting from the last seen one
+        created, call, users_call = self.sync([
+            {"id": 3, "from_id": 7, "date": 30, "text": "1. Игра команда 3"},
+            {"id": 4, "from_id": 8, "date": 40, "text": "1. Игра команда 4"},
+            {"id": 5, "from_id": 9, "date": 50, "text": "1. Игра команда 4"},
+        ])
+        self.assertEqual(created, 1)
+        self.assertEqual(call.kwargs["start_comment_ids"], {100: 3})
+        self.assertEqual(users_call.args[0], [9])
+        self.assertEqual(self.game.vk_last_comment_id, 5)
+        self.assertEqual(
+            list(RawPrediction.objects.order_by("vk_comment_id")
+                 .values_list("vk_comment_id", flat=True)),
+            [1, 2, 5],
+        )
+
+    def test_renamed_game_is_not_imported_again(self):
+        comments = [
+            {"id": 1, "from_id": 7, "date": 10, "text": "1. Игра команда 2"},
+        ]
+        self.assertEqual(self.sync(comments)[0], 1)
+        Game.objects.filter(pk=self.game.pk).update(
+            name="Новая игра", vk_last_comment_id=None
+        )
+
+        self.assertEqual(self.sync(comments)[0], 0)
+        self.assertEqual(RawPrediction.objects.count(), 1)
+        self.assertEqual(self.game.vk_last_comment_id, 1)
+
+
+class SimulateStandingsTest(TestCase):
+
+    def setUp(self):
+        self.game = create_game()
+        self.season = self.game.tournament.season
+        teams = list(self.game.teams.order_by("name"))
+        for number in range(4):
+            create_prediction(
+                self.game,
+                Predictor.objects.create(name=f"Прогнозист {number}"),
+                teams[number:number + 3],
+            )
+        calculate_tournament_predictions(self.game.tournament)
+
+    def test_current_points_give_current_standings(self):
+        for object in (self.season, self.game.tournament, self.game):
+            with self.assertNumQueries(5):
+                standings = simulate_standings(object)
+            current = Standing.objects\
+                .filter(**{f"{object._meta.model_name}_id": object.pk})\
+                .order_by("position")\
+                .values_list("predictor_id", "position", *STANDINGS_FIELDS)
+            self.assertEqual(
+                [
+                    (
+                        row["predictor__id"],
+                        row["position"],
+                        *(row[field] for field in STANDINGS_FIELDS),
+                    )
+                    for row in standings
+                ],
+                list(current),
+            )
+            for row in standings:
+                self.assertEqual(row["current_position"], row["position"])
+                self.assertEqual(
+                    row["current_total_points"], row["total_points"]
+                )
+
+    def test_other_points_and_ordering(self):
+        total_points = dict(
+            Standing.objects
+            .filter(season=self.season)
+            .values_list("predictor_id", "total_points")
+        )
+        with self.assertNumQueries(4):
+            standings = simulate_standings(
+                self.season,
+                points=(0, 0, 0, 1),
+                ordering=("-total_points", "-predictor__name"),
+            )
+        # Predictors 0 and 3 have no awarded teams out of their places
+        self.assertEqual(
+            [row["predictor__name"] for row in standings],
+            ["Прогнозист 1", "Прогнозист 2", "Прогнозист 3", "Прогнозист 0"],
+        )
+        self.assertEqual(
+            [row["total_points"] for row in standings], [2, 1, 0, 0]
+        )
+        self.assertEqual(
+            [row["position"] for row in standings], [1, 2, 3, 4]
+        )
+        for row in standings:
+            self.assertEqual(row["total_points"], row["prize_winners"])
+            self.assertEqual(
+                row["current_total_points"], total_points[row["predictor__id"]]
+            )
+        # Nothing is written
+        self.assertEqual(
+            dict(
+                Standing.objects
+                .filter(season=self.season)
+                .values_list("predictor_id", "total_points")
+            ),
+            total_points,
+        )
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            simulate_standings(self.season, points=(1, 2, 3))
+        with self.assertRaises(ValueError):
+            simulate_standings(self.season, ordering=("-points", ))
+
+    def test_command(self):
+        stdout = StringIO()
+        call_command(
+            "simulate_standings",
+            "--season", str(self.season.pk),
+            "--points", "0", "0", "0", "1",
+            "--limit", "2",
+            stdout=stdout,
+        )
+        lines = stdout.getvalue().splitlines()
+        self.assertIn("прогнозистов 4", lines[0])
+        self.assertEqual(len(lines), 3)
+        self.assertIn("Прогнозист 1", lines[1])
+
+        for args in (
+            ("--season", "abc"),
+            ("--tournament", "0"),
+            ("--season", str(self.season.pk), "--ordering", "-points"),
+        ):
+            with self.assertRaises(CommandError):
+                call_command("simulate_standings", *args, stdout=StringIO())
+
+
+@override_settings(CACHES=DUMMY_CACHES)
+class PointsSchemeTest(TestCase):
+
+    def setUp(self):
+        self.game = create_game()
+        self.tournament = self.game.tournament
+        self.scheme = PointsScheme.objects.create(
+            name="Схема", winner=10, runner_up=5, third_place=3, awarded=1
+        )
+        first, second, third = self.game.teams.order_by("name")[:3]
+        self.prediction = create_prediction(
+            self.game,
+            Predictor.objects.create(name="Прогнозист"),
+            [first, third, second],
+        )
+
+    def test_tournaments_points(self):
+        other_tournament = Tournament.objects.create(
+            name="Другой турнир",
+            season=self.tournament.season,
+            started_at=timezone.now(),
+            points_scheme=PointsScheme.objects.create(
+                name="Неактивная схема", winner=100, is_active=False
+            ),
+        )
+        self.tournament.points_scheme = self.scheme
+        self.tournament.save()
+
+        with self.assertNumQueries(1):
+            points = get_tournaments_points(
+                [self.tournament.pk, other_tournament.pk]
+            )
+        self.assertEqual(points, {
+            self.tournament.pk: ScoringPoints(10, 5, 3, 1),
+            other_tournament.pk: DEFAULT_POINTS,
+        })
+
+    def test_calculation_with_scheme(self):
+        calculate_tournament_predictions(self.tournament)
+        self.prediction.refresh_from_db()
+        self.assertEqual(self.prediction.total_points, 8)
+
+        self.tournament.points_scheme = self.scheme
+        self.tournament.save()
+        calculate_tournament_predictions(self.tournament)
+        self.prediction.refresh_from_db()
+        self.assertEqual(self.prediction.total_points, 12)
+        self.assertEqual(
+            Standing.objects.get(season=self.tournament.season).total_points,
+            12,
+        )
+
+    def test_standings_note(self):
+        season = self.tournament.season
+        for name, scheme in (("Б", self.scheme), ("В", None)):
+            Tournament.objects.create(
+                name=f"Турнир {name}",
+                season=season,
+                started_at=timezone.now(),
+                points_scheme=scheme,
+            )
+        self.assertEqual(get_points_for_object(season), [
+            (DEFAULT_POINTS, ["Турнир Игра", "Турнир В"]),
+            (ScoringPoints(10, 5, 3, 1), ["Турнир Б"]),
+        ])
+        self.assertEqual(
+            get_points_for_object(self.game), [(DEFAULT_POINTS, ["Турнир Игра"])]
+        )
+
+        self.tournament.points_scheme = self.scheme
+        self.tournament.save()
+        calculate_tournament_predictions(self.tournament)
+        response = self.client.get(
+            reverse(
+                "predictions:tournament_detail", args=(self.tournament.pk, )
+            )
+        )
+        self.assertContains(response, "За точно угаданного победителя — 10")
+        self.assertContains(response, "не под прогнозируемым местом — 1<")
+
+    def test_score_tables_with_games_points(self):
+        events = {
+            "game_id": np.array(["a", "a", "b", "b"]),
+            "prediction_id": np.array([1, 1, 2, 2]),
+            "team_id": np.array([10, 11, 10, 11]),
+            "result": np.array([1, 3, 1, 3]),
+        }
+        performances = {
+            "game_id": np.array(["a", "a", "b", "b"]),
+            "team_id": np.array([10, 11, 10, 11]),
+            "result": np.array([1, 2, 1, 2]),
+        }
+        games_points = {
+            "game_id": np.array(["b", "c"]),
+            **{
+                column: np.array([value, 0.0])
+                for column, value in zip(ScoringPoints._fields, (10, 5, 3, 1))
+            },
+        }
+
+        scores = score_tables(events, performances, games_points=games_points)
+        self.assertEqual(scores.prediction_ids.tolist(), [1, 2])
+        self.assertEqual(scores.total_points.tolist(), [6, 11])
+        scores = score_tables(events, performances)
+        self.assertEqual(scores.total_points.tolist(), [6, 6])
+
+
+class StalePredictionsTest(TestCase):
+
+    def setUp(self):
+        self.game = create_game()
+        self.teams = list(self.game.teams.order_by("name"))
+        self.predictions = [
+            create_prediction(
+                self.game,
+                Predictor.objects.create(name=f"Прогнозист {number}"),
+                [team],
+            )
+            for number, team in enumerate(self.teams)
+        ]
+        calculate_tournament_predictions(self.game.tournament)
+
+    def edit_podium(self, results):
+        old_ranked_performances = get_ranked_performances(
+            get_not_null_performances_for_game(self.game)
+        )
+        for team, result in zip(self.teams, results):
+            Performance.objects.filter(game=self.game, team=team)\
+                .update(result=result)
+        return mark_game_performances_changed(
+            self.game, old_ranked_performances
+        )
+
+    def test_only_predictions_of_moved_teams_are_recalculated(self):
+        # The third and the fourth teams swap
+        self.assertEqual(self.edit_podium((1, 2, None, 3)), 2)
+        self.game.refresh_from_db()
+        self.assertTrue(self.game.is_stale)
+        self.assertEqual(
+            list(
+                Prediction.objects
+                .filter(is_stale=True)
+                .order_by("predictor__name")
+                .values_list("pk", flat=True)
+            ),
+            [self.predictions[2].pk, self.predictions[3].pk],
+        )
+
+        self.assertEqual(calculate_stale_predictions(), 2)
+        self.game.refresh_from_db()
+        self.assertFalse(self.game.is_stale)
+        self.assertFalse(Prediction.objects.filter(is_stale=True).exists())
+        self.assertEqual(
+            [
+                Prediction.objects.get(pk=prediction.pk).total_points
+                for prediction in self.predictions
+            ],
+            [4, 2, 0, 2],
+        )
+        self.assertEqual(
+            list(
+                Standing.objects
+                .filter(game=self.game)
+                .order_by("position")
+                .values_list("predictor__name", "total_points")
+            ),
+            [
+                ("Прогнозист 0", 4),
+                ("Прогнозист 1", 2),
+                ("Прогнозист 3", 2),
+                ("Прогнозист 2", 0),
+            ],
+        )
+        self.assertEqual(calculate_stale_predictions(), 0)
+
+    def test_unchanged_podium_marks_nothing(self):
+        self.assertEqual(self.edit_podium((1, 2, 3, None)), 0)
+        self.game.refresh_from_db()
+        self.assertFalse(self.game.is_stale)
+        self.assertEqual(calculate_stale_predictions(), 0)
+
+
+class ResetPredictionsTest(TestCase):
+
+    def setUp(self):
+        self.game = create_game()
+        self.tournament = self.game.tournament
+        self.other_game = create_game("Другая игра")
+        for game in (self.game, self.other_game):
+            teams = list(game.teams.order_by("name"))
+            for number in range(3):
+                create_prediction(
+                    game,
+                    Predictor.objects.create(
+                        name=f"{game.name} прогнозист {number}"
+                    ),
+                    teams[number:number + 2],
+                )
+        calculate_tournament_predictions(self.tournament)
+        calculate_tournament_predictions(self.other_game.tournament)
+
+    def assertReset(self, game, is_reset=True):
+        points = [
+            *Prediction.objects
+            .filter(game=game)
+            .values_list("total_points", flat=True),
+            *PredictionEvent.objects
+            .filter(prediction__game=game)
+            .values_list("points", flat=True),
+        ]
+        self.assertEqual(len(points), 9)
+        self.assertEqual(not any(points), is_reset)
+
+    def test_reset_tournament(self):
+        progress = mock.Mock()
+        with CaptureQueriesContext(connection) as queries:
+            counts = reset_tournament_predictions(
+                self.tournament, progress=progress
+            )
+        self.assertEqual(counts, (6, 3))
+        progress.assert_called_once_with(3, 3)
+        # One UPDATE per table whatever the number of predictions
+        for table in ("predictions_predictionevent", "predictions_prediction"):
+            updates = [
+                query for query in queries.captured_queries
+                if query["sql"].startswith(f'UPDATE "{table}"')
+            ]
+            self.assertEqual(len(updates), 1, table)
+        self.assertReset(self.game)
+        self.assertReset(self.other_game, False)
+        self.assertEqual(
+            Standing.objects
+            .filter(tournament=self.tournament, total_points__gt=0)
+            .count(),
+            0,
+        )
+
+    def test_reset_game_and_prediction(self):
+        self.assertEqual(reset_game_predictions(self.other_game), (6, 3))
+        self.assertReset(self.other_game)
+        self.assertReset(self.game, False)
+
+        prediction = Prediction.objects.filter(game=self.game).first()
+        self.assertEqual(reset_prediction(prediction), (2, 1))
+        self.assertEqual(prediction.total_points, 0)
+        self.assertEqual(
+            Prediction.objects.filter(game=self.game, total_points=0).count(),
+            1,
+        )
@@ -6,28 +6,41 @@ from predictions.views import (
     SeasonListView,
     TournamentDetailView,
     TournamentListView,
+    async_home_view,
     home_view,
 )
+from sovabet.settings import ASYNC_VIEWS
 
 
+if ASYNC_VIEWS:
+    home = async_home_view
+    season_detail = SeasonDetailView.as_async_view()
+    tournament_detail = TournamentDetailView.as_async_view()
+    game_detail = GameDetailView.as_async_view()
+else:
+    home = home_view
+    season_detail = SeasonDetailView.as_view()
+    tournament_detail = TournamentDetailView.as_view()
+    game_detail = GameDetailView.as_view()
+
 app_name = "predictions"
 urlpatterns = [
-    path("", home_view, name="home"),
+    path("", home, name="home"),
     path(
         "season/<str:pk>/",
-        SeasonDetailView.as_view(),
+        season_detail,
         name="season_detail"
     ),
     path("season/", SeasonListView.as_view(), name="season_list"),
     path(
         "tournament/<str:pk>/",
-        TournamentDetailView.as_view(),
+        tournament_detail,
         name="tournament_detail"
     ),
     path("tournament/", TournamentListView.as_view(), name="tournament_list"),
     path(
         "game/<str:pk>/",
-        GameDetailView.as_view(),
+        game_detail,
         name="game_detail"
     ),
 ]
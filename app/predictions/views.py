@@ -1,18 +1,37 @@
 from typing import Any, Dict
 
+from asgiref.sync import sync_to_async
+from django.http import Http404
 from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django.views.generic import DetailView, ListView
+from predictions.caching import (
+    cache_page,
+    get_cached_page,
+    get_home_cache_key,
+    get_object_validators,
+    get_page_cache_key,
+    get_standings_cache_key,
+)
 from predictions.logic import (
     get_not_null_performances_for_game,
+    get_points_for_object,
+    get_ranked_standings_for_object,
     get_season_tournaments,
-    get_standings_for_object,
     get_tournament_games,
 )
 
 from predictions.models import Game, Season, Tournament
+from sovabet.settings import PAGE_CACHE_TIMEOUT
 
 
 def home_view(request):
+    cache_key = get_home_cache_key()
+    response = get_cached_page(cache_key)
+    if response:
+        return response
+
     tournaments = Tournament.objects.filter(is_active=True)\
         .select_related("season").values(
             "pk",
@@ -23,7 +42,93 @@ def home_view(request):
             "season__name",
     )
     context = {"tournaments": tournaments}
-    return render(request, "predictions/home.html", context)
+    return cache_page(
+        cache_key, render(request, "predictions/home.html", context)
+    )
+
+
+async def async_home_view(request):
+    return await sync_to_async(home_view)(request)
+
+
+def get_not_modified_response(request, validators):
+    etag, last_modified = validators
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()),
+    )
+
+
+def set_validators(response, validators):
+    etag, last_modified = validators
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified.timestamp())
+    patch_cache_control(response, no_cache=True)
+
+
+class CachedDetailMixin:
+    """Answers conditional requests and caches the rendered page
+    and its standings fragment by the object version.
+
+    Unchanged pages are answered with 304 and missing ones with 404
+    before the object is loaded.
+    """
+
+    def get(self, request, *args, **kwargs):
+        validators = get_object_validators(self.model, kwargs.get("pk"))
+        if validators is None:
+            raise Http404
+        response = get_not_modified_response(request, validators)
+        if response is None:
+            response = self.get_page(request)
+        set_validators(response, validators)
+        return response
+
+    @classmethod
+    def as_async_view(cls):
+        """Returns an async function view for ASGI servers.
+
+        Django 4.0 has neither async class-based views nor async ORM
+        methods, so the queries run in a thread via sync_to_async,
+        while the event loop keeps serving other clients.
+        """
+        async def view(request, pk):
+            validators = await sync_to_async(get_object_validators)(
+                cls.model, pk
+            )
+            if validators is None:
+                raise Http404
+            response = get_not_modified_response(request, validators)
+            if response is None:
+                detail_view = cls()
+                detail_view.setup(request, pk=pk)
+                response = await sync_to_async(detail_view.get_page)(request)
+            set_validators(response, validators)
+            return response
+
+        view.view_class = cls
+        view.__name__ = f"async_{cls.__name__}"
+        return view
+
+    def get_page(self, request):
+        self.object = self.get_object()
+        cache_key = get_page_cache_key(self.object)
+        response = get_cached_page(cache_key)
+        if response:
+            return response
+        context = self.get_context_data(object=self.object)
+        return cache_page(cache_key, self.render_to_response(context))
+
+    def get_context_data(self, **kwargs: Any) -> Dict[str, Any]:
+        context = super().get_context_data(**kwargs)
+        context["standings"] = get_ranked_standings_for_object(self.object)
+        context["standings_points"] = get_points_for_object(self.object)
+        context["standings_cache_key"] = get_standings_cache_key(
+            self.object, context["standings_points"]
+        )
+        context["standings_cache_timeout"] = PAGE_CACHE_TIMEOUT
+        return context
 
 
 class SeasonListView(ListView):
@@ -31,14 +136,12 @@ class SeasonListView(ListView):
     template_name = "predictions/season_list.html"
 
 
-class SeasonDetailView(DetailView):
+class SeasonDetailView(CachedDetailMixin, DetailView):
     model = Season
     template_name = "predictions/season_detail.html"
 
     def get_context_data(self, **kwargs: Any) -> Dict[str, Any]:
         context = super().get_context_data(**kwargs)
-        standings = get_standings_for_object(self.object)
-        context["standings"] = standings
         tournaments = get_season_tournaments(season=self.object)
         context["tournaments"] = tournaments
         return context
@@ -52,27 +155,23 @@ class TournamentListView(ListView):
         return Tournament.objects.all().select_related("season")
 
 
-class TournamentDetailView(DetailView):
+class TournamentDetailView(CachedDetailMixin, DetailView):
     model = Tournament
     template_name = "predictions/tournament_detail.html"
 
     def get_context_data(self, **kwargs: Any) -> Dict[str, Any]:
         context = super().get_context_data(**kwargs)
-        standings = get_standings_for_object(self.object)
-        context["standings"] = standings
         games = get_tournament_games(tournament=self.object)
         context["games"] = games
         return context
 
 
-class GameDetailView(DetailView):
+class GameDetailView(CachedDetailMixin, DetailView):
     model = Game
     template_name = "predictions/game_detail.html"
 
     def get_context_data(self, **kwargs: Any) -> Dict[str, Any]:
         context = super().get_context_data(**kwargs)
-        standings = get_standings_for_object(self.object)
-        context["standings"] = standings
         prize_performances = get_not_null_performances_for_game(self.object)
         context["prize_performances"] = prize_performances
         return context
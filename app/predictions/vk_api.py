@@ -1,56 +1,285 @@
 """The module for working with VK API."""
 
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Iterable
 
+import requests
 import vk
+from requests.adapters import HTTPAdapter
 from vk.exceptions import VkAPIError
 
 from sovabet.settings import (
     VK_ACCESS_TOKEN,
+    VK_API_MAX_RETRIES,
+    VK_API_MAX_WORKERS,
+    VK_API_RATE_LIMIT,
+    VK_API_RETRY_BACKOFF,
+    VK_API_TIMEOUT,
+    VK_API_URL,
     VK_API_VERSION,
     VK_OWNER_ID,
 )
 
 
-def get_vk_api():
-    api = vk.API(access_token=VK_ACCESS_TOKEN, v=VK_API_VERSION)
-    return api
+logger = logging.getLogger(__name__)
+
+VK_COMMENTS_PAGE_SIZE = 100
+VK_USERS_GET_MAX_IDS = 1000
+# Too many requests per second, flood control, internal server error
+VK_RETRY_ERROR_CODES = {6, 9, 10}
+
+
+class VkAPI(vk.API):
+    """VK API client with a configurable API URL,
+    so that it can be pointed at a fake server.
+
+    HTTP connections of the session are pooled for all workers.
+    """
+    API_URL = VK_API_URL
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=max(VK_API_MAX_WORKERS, 1)
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting calls per second.
+
+    Allows bursts of up to capacity calls, then one call
+    per 1 / rate seconds.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blocks until a call is allowed."""
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity,
+                self.tokens + (now - self.updated_at) * self.rate,
+            )
+            self.updated_at = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class VkClient:
+    """Long-lived VK API client shared by all threads.
+
+    Calls are rate limited by a token bucket. Rate limit, flood control
+    and server errors and network failures are retried with exponential
+    backoff. Counts calls, retries and failures.
+    """
+
+    def __init__(
+        self,
+        api: vk.API | None = None,
+        rate: float = VK_API_RATE_LIMIT,
+        max_retries: int = VK_API_MAX_RETRIES,
+        backoff: float = VK_API_RETRY_BACKOFF,
+    ) -> None:
+        self.api = api or VkAPI(
+            access_token=VK_ACCESS_TOKEN,
+            v=VK_API_VERSION,
+            timeout=VK_API_TIMEOUT,
+        )
+        self.bucket = TokenBucket(rate)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.lock = threading.Lock()
+        self.counters = {"calls": 0, "retries": 0, "failures": 0}
+
+    def count(self, counter: str) -> None:
+        with self.lock:
+            self.counters[counter] += 1
+
+    @property
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return dict(self.counters)
+
+    def get_retry_delay(self, attempt: int) -> float:
+        delay = self.backoff * 2 ** attempt
+        return delay + random.uniform(0, delay / 2)
+
+    def call(self, method: str, **params) -> Any:
+        """Calls the API method and returns its response.
+
+        Raises VkAPIError or requests.RequestException when the error
+        is not retried or the retries are exhausted.
+        """
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            self.count("calls")
+            try:
+                return self.api(method)(**params)
+            except (VkAPIError, requests.RequestException) as error:
+                retry = (
+                    not isinstance(error, VkAPIError)
+                    or error.code in VK_RETRY_ERROR_CODES
+                )
+                if not retry or attempt >= self.max_retries:
+                    self.count("failures")
+                    logger.warning(
+                        "VK API %s failed after %d attempts: %s",
+                        method, attempt + 1, error,
+                    )
+                    raise
+            self.count("retries")
+            time.sleep(self.get_retry_delay(attempt))
+            attempt += 1
+
+
+vk_client = None
+vk_client_lock = threading.Lock()
+
+
+def get_vk_client() -> VkClient:
+    """Returns the VK client of the process, creating it on first use."""
+    global vk_client
+    with vk_client_lock:
+        if vk_client is None:
+            vk_client = VkClient()
+        return vk_client
 
 
 def get_vk_comments(
-    post_id: int, api: vk.API = None, extended: bool = True
+    post_id: int,
+    client: VkClient | None = None,
+    extended: bool = True,
+    offset: int = 0,
+    count: int = VK_COMMENTS_PAGE_SIZE,
+    start_comment_id: int | None = None,
 ) -> dict[str, Any] | None:
-    if api is None:
-        api = get_vk_api()
+    """Returns one page of comments to the post, or None if it could
+    not be fetched.
+
+    If start_comment_id is given, the page starts
+    from the comment with this id.
+    """
+    client = client or get_vk_client()
+    params = {
+        "owner_id": VK_OWNER_ID,
+        "post_id": post_id,
+        "offset": offset,
+        "count": count,
+        "sort": "asc",
+        "lang": "ru",
+    }
+    if start_comment_id:
+        params.update(start_comment_id=start_comment_id)
+    if extended:
+        params.update(extended=1, fields="first_name,last_name")
     try:
-        if extended:
-            response = api.wall.getComments(
-                owner_id=VK_OWNER_ID,
-                post_id=post_id,
-                count=100,
-                lang="ru",
-                extended=1,
-                fields="first_name,last_name",
-            )
-        else:
-            response = api.wall.getComments(
-                owner_id=VK_OWNER_ID,
-                post_id=post_id,
-                count=100,
-                lang="ru",
-            )
-    except VkAPIError:
+        return client.call("wall.getComments", **params)
+    except (VkAPIError, requests.RequestException):
         return None
-    return response
+
+
+def get_all_vk_comments(
+    post_id: int,
+    client: VkClient | None = None,
+    extended: bool = True,
+    start_comment_id: int | None = None,
+) -> dict[str, Any] | None:
+    """Returns all comments to the post following the offset pagination.
+
+    If start_comment_id is given, only comments starting from the comment
+    with this id are returned. Items and profiles of all pages are merged
+    into one response. Returns None if any page could not be fetched.
+    """
+    client = client or get_vk_client()
+    items = []
+    profiles = {}
+    while True:
+        response = get_vk_comments(
+            post_id,
+            client=client,
+            extended=extended,
+            offset=len(items),
+            start_comment_id=start_comment_id,
+        )
+        if response is None:
+            logger.warning("Comments to VK post %s were not fetched", post_id)
+            return None
+        page_items = response.get("items", [])
+        items.extend(page_items)
+        for profile in response.get("profiles", []):
+            profiles[profile.get("id")] = profile
+        if len(page_items) < VK_COMMENTS_PAGE_SIZE:
+            break
+        if not start_comment_id and len(items) >= response.get("count", 0):
+            break
+    return {
+        "count": len(items),
+        "items": items,
+        "profiles": list(profiles.values()),
+    }
+
+
+def get_posts_vk_comments(
+    post_ids: Iterable[int],
+    client: VkClient | None = None,
+    extended: bool = True,
+    start_comment_ids: dict[int, int] | None = None,
+) -> Iterable[tuple[int, dict[str, Any] | None]]:
+    """Fetches all comments to the posts concurrently.
+
+    start_comment_ids optionally maps post ids to the comment id
+    to start from. Yields pairs of post id and response in the order
+    of post ids as soon as each post is fetched. The rate of calls
+    is shared by all workers.
+    """
+    client = client or get_vk_client()
+    post_ids = list(post_ids)
+    start_comment_ids = start_comment_ids or {}
+    with ThreadPoolExecutor(max_workers=VK_API_MAX_WORKERS) as executor:
+        responses = executor.map(
+            lambda post_id: get_all_vk_comments(
+                post_id, client, extended, start_comment_ids.get(post_id)
+            ),
+            post_ids,
+        )
+        yield from zip(post_ids, responses)
 
 
 def get_vk_users(
-    user_ids: Iterable[int], api: vk.API = None
+    user_ids: Iterable[int], client: VkClient | None = None
 ) -> list[dict[str, Any]] | None:
-    if api is None:
-        api = get_vk_api()
-    try:
-        users = api.users.get(user_ids=user_ids, lang="ru")
-    except VkAPIError:
-        return None
+    """Returns users by ids, requested in batches of up to
+    VK_USERS_GET_MAX_IDS ids. Returns None if any batch failed.
+    """
+    client = client or get_vk_client()
+    user_ids = list(user_ids)
+    users = []
+    for start in range(0, len(user_ids), VK_USERS_GET_MAX_IDS):
+        try:
+            users.extend(
+                client.call(
+                    "users.get",
+                    user_ids=user_ids[start:start + VK_USERS_GET_MAX_IDS],
+                    lang="ru",
+                )
+            )
+        except (VkAPIError, requests.RequestException):
+            return None
     return users
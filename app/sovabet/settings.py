@@ -43,6 +43,7 @@ if DEBUG:
     INSTALLED_APPS.append('debug_toolbar')
 
 MIDDLEWARE = [
+    'predictions.middleware.RequestStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -89,6 +90,26 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'sovabet'),
+        'TIMEOUT': int(os.environ.get('CACHE_TIMEOUT', default=3600)),
+    }
+}
+
+# Timeout of cached public pages and standings fragments, in seconds
+PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', default=3600))
+
+# Serve the home page and the detail pages with async views,
+# for deployments behind an ASGI server
+ASYNC_VIEWS = int(os.environ.get('ASYNC_VIEWS', default=0))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -133,10 +154,36 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # django-import-export
 IMPORT_EXPORT_USE_TRANSACTIONS = True
 
+# Background jobs: a running job that has not reported progress for this
+# long is considered abandoned by a crashed worker
+JOB_TIMEOUT_MINUTES = int(os.environ.get('JOB_TIMEOUT_MINUTES', default=60))
+
 # VK API
 VK_ACCESS_TOKEN = os.environ.get('VK_ACCESS_TOKEN')
 VK_API_VERSION = os.environ.get('VK_API_VERSION')
 VK_OWNER_ID = os.environ.get('VK_OWNER_ID')
+VK_API_URL = os.environ.get('VK_API_URL', 'https://api.vk.com/method/')
+VK_API_RATE_LIMIT = float(os.environ.get('VK_API_RATE_LIMIT', default=3))
+VK_API_MAX_WORKERS = int(os.environ.get('VK_API_MAX_WORKERS', default=3))
+VK_API_MAX_RETRIES = int(os.environ.get('VK_API_MAX_RETRIES', default=5))
+VK_API_RETRY_BACKOFF = float(os.environ.get('VK_API_RETRY_BACKOFF', default=1))
+VK_API_TIMEOUT = float(os.environ.get('VK_API_TIMEOUT', default=10))
+VK_PROFILE_TTL_DAYS = int(os.environ.get('VK_PROFILE_TTL_DAYS', default=30))
+
+# Request statistics by view: latency, SQL queries and slow query samples
+REQUEST_STATS_ENABLED = int(os.environ.get('REQUEST_STATS_ENABLED', default=1))
+REQUEST_STATS_FLUSH_INTERVAL = int(
+    os.environ.get('REQUEST_STATS_FLUSH_INTERVAL', default=60)
+)
+REQUEST_STATS_FLUSH_SIZE = int(
+    os.environ.get('REQUEST_STATS_FLUSH_SIZE', default=500)
+)
+REQUEST_STATS_SLOW_QUERY_MS = float(
+    os.environ.get('REQUEST_STATS_SLOW_QUERY_MS', default=100)
+)
+REQUEST_STATS_RETENTION_DAYS = int(
+    os.environ.get('REQUEST_STATS_RETENTION_DAYS', default=14)
+)
 
 if DEBUG:
     import socket